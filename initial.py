@@ -1,8 +1,37 @@
+import asyncio
+import os
+
 from config import CAPTCHA_SLOLVER_TOKEN, DB_PATH
-from modules.DatabaceSQLiteController.async_sq_lite_connector import AsyncAdvertsDatabase, AsyncSQLiteConnector
+from modules.DatabaceSQLiteController.async_sq_lite_connector import AsyncAdvertsDatabase, AsyncSQLiteConnector, EmailDatabase
+from modules.DatabaseController.async_base import AsyncDBConnector
+from modules.DatabaseController.async_mysql_connector import AsyncMySQLConnector
+from modules.AIService.research_cache import ResearchCache
+from modules.SnapshotStore.snapshot_store import SnapshotStore
 from modules.WebScraper.web_scraper import WebScraper
 from typess import JobParams, TimeSlot
 
+# Сервер бази даних: "sqlite" (файл на цьому вузлі) або "mysql" (спільна база для кількох вузлів парсера)
+DB_BACKEND = os.getenv("DB_BACKEND", "sqlite").lower()
+
+
+def create_db_connector(sqlite_path: str) -> AsyncDBConnector:
+    """
+    Створює конектор до бази відповідно до DB_BACKEND.
+    :param sqlite_path: Шлях до файлу бази для SQLite (без .db).
+    """
+    if DB_BACKEND == "mysql":
+        return AsyncMySQLConnector(
+            host=os.getenv("MYSQL_HOST", "localhost"),
+            port=int(os.getenv("MYSQL_PORT", "3306")),
+            user=os.getenv("MYSQL_USER", "root"),
+            password=os.getenv("MYSQL_PASSWORD", ""),
+            database=os.getenv("MYSQL_DATABASE", "arbeitsagentur"),
+            pool_size=int(os.getenv("MYSQL_POOL_SIZE", "10")),
+        )
+    if DB_BACKEND != "sqlite":
+        raise ValueError(f"Невідомий DB_BACKEND: {DB_BACKEND!r} (очікується 'sqlite' або 'mysql').")
+    return AsyncSQLiteConnector(sqlite_path)
+
 
 class DBHandler:
     """
@@ -20,7 +49,7 @@ class DBHandler:
 
         Це ізолює логіку ініціалізації, щоб її можна було легко модифікувати.
         """
-        db_connector = AsyncSQLiteConnector(db_path)
+        db_connector = create_db_connector(db_path)
         await db_connector.connect()
         instance = AsyncAdvertsDatabase(db_connector, database_table=self.__db_table_name)
         await instance.table_check()
@@ -40,6 +69,14 @@ class DBHandler:
             self.__db_connector = db_connector
 
         return self.__db_controller_instance
+
+    @classmethod
+    async def get_connector(self) -> AsyncDBConnector:
+        """
+        Повертає спільне підключення до основної бази (створює його за потреби).
+        """
+        await self.get_instance()
+        return self.__db_connector
     
     @classmethod
     async def disconnect_from_BD(self):
@@ -52,12 +89,98 @@ class DBHandler:
             self.__db_controller_instance = None
 
 
+class EmailDBHandler:
+    """
+    Клас для керування доступом до єдиного екземпляра бази відправлених email (синглтон).
+    Одне підключення на весь процес спільне для всіх задач розсилки: записи йдуть через
+    lock підключення-записувача, читання - через пул підключень для читання.
+    Якщо SENT_EMAILS_IN_MAIN_DB=1 або DB_BACKEND=mysql, таблиця sent_emails живе в основній базі
+    разом з adverts (можна робити JOIN), інакше - в окремому файлі SQLite.
+    """
+    __db_connector = None
+    __email_db_instance = None
+    __research_cache = None
+    __db_path = "sent_emails_db"
+    __use_main_db = os.getenv("SENT_EMAILS_IN_MAIN_DB", "0") == "1"
+    __init_lock = asyncio.Lock()
+
+    @classmethod
+    async def get_instance(self) -> EmailDatabase:
+        """
+        Повертає спільний екземпляр EmailDatabase. Якщо екземпляра ще немає, створює його.
+        Одночасні виклики з кількох задач створюють лише одне підключення.
+
+        :return: Екземпляр EmailDatabase.
+        """
+        if self.__email_db_instance is not None:
+            return self.__email_db_instance
+
+        async with self.__init_lock:
+            if self.__email_db_instance is None:
+                if self.__use_main_db or DB_BACKEND != "sqlite":
+                    db_connector = await DBHandler.get_connector()
+                else:
+                    db_connector = AsyncSQLiteConnector(self.__db_path)
+                    await db_connector.connect()
+                    self.__db_connector = db_connector
+                instance = EmailDatabase(db_connector)
+                await instance.init_table()
+                self.__email_db_instance = instance
+
+        return self.__email_db_instance
+
+    @classmethod
+    async def get_research_cache(self) -> ResearchCache:
+        """
+        Повертає спільний кеш досліджень компаній (в тій самій базі, що й sent_emails).
+        TTL записів задається RESEARCH_CACHE_TTL_DAYS (за замовчуванням 30 днів).
+        """
+        email_db = await self.get_instance()
+        async with self.__init_lock:
+            if self.__research_cache is None:
+                research_cache = ResearchCache(
+                    email_db.db_connector, ttl_days=int(os.getenv("RESEARCH_CACHE_TTL_DAYS", "30"))
+                )
+                await research_cache.init_table()
+                await research_cache.purge_expired()
+                self.__research_cache = research_cache
+        return self.__research_cache
+
+    @classmethod
+    async def disconnect_from_BD(self):
+        """
+        Закриває зєднання з базою відправлених email.
+        Спільне підключення до основної бази закриває DBHandler.
+        """
+        if self.__db_connector:
+            await self.__db_connector.disconnect()
+        self.__db_connector = None
+        self.__email_db_instance = None
+        self.__research_cache = None
+
+
 class WebScraperHandler:
     """
     Клас для керування доступом до єдиного екземпляра парсером (синглтон).
     """
     __scraper = None
     __job_params = JobParams(branch="23", time_slot=TimeSlot.TODAY)
+    # Знімки сирого HTML оголошень (для reparser.py) вимкнені за замовчуванням: SCRAPER_SNAPSHOTS=1 вмикає,
+    # SNAPSHOT_DIR - каталог, SNAPSHOT_RETENTION_DAYS - скільки днів зберігати знімки
+    __snapshots_enabled = os.getenv("SCRAPER_SNAPSHOTS", "0") == "1"
+    # Ліміт витрат на капчі за одну сесію парсера в USD (~1000 текстових капч 2Captcha; 0 - без ліміту)
+    __captcha_session_budget = float(os.getenv("CAPTCHA_SESSION_BUDGET", "1.0") or 0) or None
+
+    @classmethod
+    async def get_snapshot_store(self) -> SnapshotStore | None:
+        """
+        Повертає сховище знімків, якщо знімки ввімкнені, попередньо видаливши застарілі.
+        """
+        if not self.__snapshots_enabled:
+            return None
+        store = SnapshotStore(os.getenv("SNAPSHOT_DIR", "data/snapshots"))
+        await asyncio.to_thread(store.purge, float(os.getenv("SNAPSHOT_RETENTION_DAYS", "30")))
+        return store
 
     @classmethod
     async def init_scraper_instance(self, db_controller):
@@ -72,7 +195,9 @@ class WebScraperHandler:
                 db_controller=db_controller,
                 filtr_params=self.__job_params,
                 site_id=1,
-                captcha_token=CAPTCHA_SLOLVER_TOKEN
+                captcha_token=CAPTCHA_SLOLVER_TOKEN,
+                captcha_session_budget=self.__captcha_session_budget,
+                snapshot_store=await self.get_snapshot_store()
             )
         return self.__scraper
     
@@ -1,11 +1,13 @@
 import asyncio
 import logging
+import os
 import sys
 import traceback
 
 from config import CAPTCHA_SLOLVER_TOKEN, DB_PATH, MySQLConfig
-from initial import DBHandler, WebScraperHandler
+from initial import DBHandler, EmailDBHandler, WebScraperHandler
 from modules.DatabaceSQLiteController.async_sq_lite_connector import AsyncAdvertsDatabase, AsyncSQLiteConnector
+from modules.DatabaceSQLiteController.retention import AdvertsArchiver
 from modules.MainLogger.logger import get_loger
 from modules.TelegramBot.bot import start_telegram_bot
 from modules.WebScraper.web_scraper import WebScraper
@@ -14,10 +16,22 @@ from typess import Availability, JobParams, TimeSlot
 logger_main = get_loger()
 
 async def main():
+    retention_task = None
     try:
         # Підключення до Бази даних
         db_controller = await DBHandler.get_instance()
         await db_controller.table_check()
+        # Підключення до бази відправлених email (спільне для всіх задач розсилки)
+        await EmailDBHandler.get_instance()
+        # Архівування старих оголошень та incremental_vacuum за розкладом (лише для SQLite)
+        db_connector = await DBHandler.get_connector()
+        if isinstance(db_connector, AsyncSQLiteConnector):
+            archiver = AdvertsArchiver(
+                db_connector,
+                archive_dir=f"{DB_PATH}/archive",
+                max_age_days=int(os.getenv("ADVERTS_RETENTION_DAYS", "90"))
+            )
+            retention_task = asyncio.create_task(archiver.run_periodically())
         # оголошення парсера
         scraper = await WebScraperHandler.init_scraper_instance(db_controller)
 
@@ -28,7 +42,10 @@ async def main():
         error_message = traceback.format_exc()
         logger_main.critical(f'Помилка в головній функції(main), {error_message}')
     finally:
+        if retention_task:
+            retention_task.cancel()
         await WebScraperHandler.close_scraper()
+        await EmailDBHandler.disconnect_from_BD()
         await DBHandler.disconnect_from_BD()
             
 
@@ -0,0 +1,172 @@
+"""OpenAI Batch API runner: JSONL upload, polling and result mapping."""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from openai.types.chat import ChatCompletion
+
+logger = logging.getLogger(__name__)
+
+CHAT_COMPLETIONS_ENDPOINT = "/v1/chat/completions"
+_FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class BatchRunner:
+    """
+    Runs many chat completion requests through the Batch API.
+
+    Requests are written to a JSONL file (one line per `custom_id`), uploaded, submitted
+    as a batch and polled until the batch reaches a final status. Large inputs are split
+    into several batches that run in parallel. Items that failed or are missing in the
+    output are simply absent from the result, so callers can retry them interactively.
+    """
+
+    def __init__(
+        self,
+        client,
+        work_dir: str = "batch_jobs",
+        poll_interval: Optional[float] = None,
+        completion_window: str = "24h",
+        max_requests_per_batch: int = 50000
+    ):
+        """
+        Initialize batch runner.
+
+        Args:
+            client: AsyncOpenAI client (may point to a local stand-in via base_url)
+            work_dir: Directory for the JSONL input files
+            poll_interval: Seconds between status checks
+                           (default: OPENAI_BATCH_POLL_SECONDS environment variable, 30)
+            completion_window: Batch completion window accepted by the API
+            max_requests_per_batch: Upper bound of lines in one input file (API limit: 50000)
+        """
+        self.client = client
+        self.work_dir = Path(work_dir)
+        self.poll_interval = poll_interval if poll_interval is not None else float(os.getenv("OPENAI_BATCH_POLL_SECONDS", "30"))
+        self.completion_window = completion_window
+        self.max_requests_per_batch = max_requests_per_batch
+
+    def write_jsonl(self, requests: Dict[str, dict], name: str) -> Path:
+        """
+        Write requests to a Batch API input file.
+
+        Args:
+            requests: custom_id -> keyword arguments of `chat.completions.create`
+            name: File name stem
+
+        Returns:
+            Path to the JSONL file
+        """
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        path = self.work_dir / f"{name}.jsonl"
+        with open(path, "w", encoding="utf-8") as f:
+            for custom_id, body in requests.items():
+                line = {"custom_id": custom_id, "method": "POST", "url": CHAT_COMPLETIONS_ENDPOINT, "body": body}
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        return path
+
+    async def submit(self, path: Path, description: str = "") -> str:
+        """
+        Upload an input file and create a batch.
+
+        Returns:
+            Batch id
+        """
+        with open(path, "rb") as f:
+            input_file = await self.client.files.create(file=(path.name, f.read()), purpose="batch")
+        batch = await self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=CHAT_COMPLETIONS_ENDPOINT,
+            completion_window=self.completion_window,
+            metadata={"description": description} if description else None,
+        )
+        logger.info(f"Batch {batch.id} submitted ({path.name})")
+        return batch.id
+
+    async def wait(self, batch_id: str):
+        """
+        Poll a batch until it reaches a final status; cancel it if the caller is cancelled.
+
+        Returns:
+            Final batch object
+        """
+        try:
+            while True:
+                batch = await self.client.batches.retrieve(batch_id)
+                if batch.status in _FINAL_STATUSES:
+                    return batch
+                counts = batch.request_counts
+                if counts:
+                    logger.info(f"Batch {batch_id}: {batch.status}, {counts.completed + counts.failed}/{counts.total}")
+                await asyncio.sleep(self.poll_interval)
+        except asyncio.CancelledError:
+            try:
+                await self.client.batches.cancel(batch_id)
+            except Exception as e:
+                logger.warning(f"Failed to cancel batch {batch_id}: {e}")
+            raise
+
+    async def fetch_results(self, batch) -> Dict[str, ChatCompletion]:
+        """
+        Download the output file of a finished batch.
+
+        Returns:
+            custom_id -> ChatCompletion for successful items
+        """
+        results = {}
+        if batch.error_file_id:
+            errors = await self.client.files.content(batch.error_file_id)
+            logger.warning(f"Batch {batch.id}: {len(errors.text.splitlines())} failed requests")
+        if not batch.output_file_id:
+            logger.warning(f"Batch {batch.id} finished with status {batch.status} and no output")
+            return results
+
+        output = await self.client.files.content(batch.output_file_id)
+        for line in output.text.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            response = item.get("response") or {}
+            if item.get("error") or response.get("status_code") != 200:
+                logger.warning(f"Batch item {item.get('custom_id')} failed: {item.get('error') or response.get('status_code')}")
+                continue
+            try:
+                results[item["custom_id"]] = ChatCompletion.model_validate(response["body"])
+            except Exception as e:
+                logger.warning(f"Batch item {item.get('custom_id')} has an invalid body: {e}")
+        return results
+
+    async def run(self, requests: Dict[str, dict], name: str = "batch") -> Dict[str, ChatCompletion]:
+        """
+        Submit requests, wait for all batches and collect completions.
+
+        Args:
+            requests: custom_id -> keyword arguments of `chat.completions.create`
+            name: Prefix of the input file names
+
+        Returns:
+            custom_id -> ChatCompletion for items that succeeded
+        """
+        if not requests:
+            return {}
+        items = list(requests.items())
+        chunks: List[Dict[str, dict]] = [
+            dict(items[i:i + self.max_requests_per_batch])
+            for i in range(0, len(items), self.max_requests_per_batch)
+        ]
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+
+        async def run_chunk(index: int, chunk: Dict[str, dict]) -> Dict[str, ChatCompletion]:
+            path = self.write_jsonl(chunk, f"{name}_{stamp}_{index}")
+            batch_id = await self.submit(path, description=f"{name} {index + 1}/{len(chunks)}")
+            return await self.fetch_results(await self.wait(batch_id))
+
+        results = {}
+        for chunk_results in await asyncio.gather(*(run_chunk(i, chunk) for i, chunk in enumerate(chunks))):
+            results.update(chunk_results)
+        return results
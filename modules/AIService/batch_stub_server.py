@@ -0,0 +1,228 @@
+"""
+Local stand-in for the OpenAI Files and Batch endpoints, for running batch mode offline.
+
+    python -m modules.AIService.batch_stub_server --port 8787
+    OPENAI_BASE_URL=http://127.0.0.1:8787/v1 OPENAI_BATCH_POLL_SECONDS=1 python main.py
+
+Batches complete immediately (or after `delay` seconds); every request line is answered
+by `responder(body) -> message content`. Interactive /v1/chat/completions calls (template
+processing, fallbacks for failed batch items) are answered the same way.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from typing import Callable, Dict, Optional
+
+from aiohttp import web
+
+_DEFAULT_JSON_ANSWER = {
+    "contact": {"FIRSTNAME": "N/A", "LASTNAME": "N/A", "unsubscribe": "N/A"},
+    "industry": "Unknown",
+    "is_suitable": True,
+    "rejection_reason": "",
+}
+
+
+def _sample(schema: dict, defs: dict):
+    """Minimal value that satisfies a strict JSON schema (strings "N/A", booleans true)."""
+    if "$ref" in schema:
+        return _sample(defs[schema["$ref"].rsplit("/", 1)[-1]], defs)
+    kind = schema.get("type")
+    if kind == "object":
+        return {key: _sample(prop, defs) for key, prop in schema.get("properties", {}).items()}
+    if kind == "array":
+        return []
+    if kind == "boolean":
+        return True
+    if kind in ("integer", "number"):
+        return 0
+    return "N/A"
+
+
+def default_responder(body: dict) -> str:
+    """
+    json_schema requests get a minimal schema-valid answer, json_object requests a neutral
+    research answer, other requests a short text.
+    """
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        schema = response_format["json_schema"]["schema"]
+        return json.dumps(_sample(schema, schema.get("$defs", {})))
+    if response_format.get("type") == "json_object":
+        return json.dumps(_DEFAULT_JSON_ANSWER)
+    return "OK"
+
+
+class BatchStubServer:
+    """In-memory implementation of /v1/files and /v1/batches used by BatchRunner."""
+
+    def __init__(self, responder: Optional[Callable[[dict], str]] = None, delay: float = 0.0):
+        """
+        Initialize stub server.
+
+        Args:
+            responder: Callable(request body) -> assistant message content
+            delay: Seconds a batch stays in_progress before it completes
+        """
+        self.responder = responder or default_responder
+        self.delay = delay
+        self.files: Dict[str, dict] = {}
+        self.batches: Dict[str, dict] = {}
+        self._ids = itertools.count(1)
+        self._runner: Optional[web.AppRunner] = None
+        self.app = web.Application()
+        self.app.add_routes([
+            web.post("/v1/files", self._create_file),
+            web.get("/v1/files/{file_id}/content", self._file_content),
+            web.post("/v1/batches", self._create_batch),
+            web.get("/v1/batches/{batch_id}", self._retrieve_batch),
+            web.post("/v1/batches/{batch_id}/cancel", self._cancel_batch),
+            web.post("/v1/chat/completions", self._chat_completion),
+        ])
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """
+        Start listening.
+
+        Returns:
+            Base URL for AsyncOpenAI(base_url=...)
+        """
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}/v1"
+
+    async def stop(self):
+        """Stop the server."""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _new_id(self, prefix: str) -> str:
+        return f"{prefix}_{next(self._ids):06d}"
+
+    def _store_file(self, content: bytes, filename: str, purpose: str) -> dict:
+        file_id = self._new_id("file")
+        self.files[file_id] = {
+            "object": {
+                "id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                "filename": filename, "purpose": purpose, "status": "processed",
+            },
+            "content": content,
+        }
+        return self.files[file_id]["object"]
+
+    async def _create_file(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        upload = form["file"]
+        return web.json_response(self._store_file(upload.file.read(), upload.filename, form.get("purpose", "batch")))
+
+    async def _file_content(self, request: web.Request) -> web.Response:
+        stored = self.files.get(request.match_info["file_id"])
+        if not stored:
+            raise web.HTTPNotFound()
+        return web.Response(body=stored["content"], content_type="application/octet-stream")
+
+    async def _create_batch(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        if data.get("input_file_id") not in self.files:
+            raise web.HTTPBadRequest(text="unknown input_file_id")
+        batch_id = self._new_id("batch")
+        self.batches[batch_id] = {
+            "id": batch_id, "object": "batch", "endpoint": data.get("endpoint"),
+            "input_file_id": data["input_file_id"], "completion_window": data.get("completion_window", "24h"),
+            "status": "in_progress", "created_at": int(time.time()), "metadata": data.get("metadata"),
+            "output_file_id": None, "error_file_id": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+        }
+        asyncio.get_running_loop().call_later(self.delay, self._complete_batch, batch_id)
+        return web.json_response(self.batches[batch_id])
+
+    async def _retrieve_batch(self, request: web.Request) -> web.Response:
+        batch = self.batches.get(request.match_info["batch_id"])
+        if not batch:
+            raise web.HTTPNotFound()
+        return web.json_response(batch)
+
+    async def _cancel_batch(self, request: web.Request) -> web.Response:
+        batch = self.batches.get(request.match_info["batch_id"])
+        if not batch:
+            raise web.HTTPNotFound()
+        if batch["status"] == "in_progress":
+            batch["status"] = "cancelled"
+        return web.json_response(batch)
+
+    async def _chat_completion(self, request: web.Request) -> web.Response:
+        return web.json_response(self._completion_body(await request.json()))
+
+    def _complete_batch(self, batch_id: str):
+        batch = self.batches[batch_id]
+        if batch["status"] != "in_progress":
+            return
+        lines = self.files[batch["input_file_id"]]["content"].decode("utf-8").splitlines()
+        outputs, errors = [], []
+        for line in filter(str.strip, lines):
+            item = json.loads(line)
+            try:
+                outputs.append(self._answer(item))
+            except Exception as e:
+                errors.append({
+                    "id": self._new_id("batch_req"), "custom_id": item.get("custom_id"), "response": None,
+                    "error": {"code": "stub_error", "message": str(e)},
+                })
+        if outputs:
+            content = "".join(json.dumps(o) + "\n" for o in outputs).encode("utf-8")
+            batch["output_file_id"] = self._store_file(content, f"{batch_id}_output.jsonl", "batch_output")["id"]
+        if errors:
+            content = "".join(json.dumps(e) + "\n" for e in errors).encode("utf-8")
+            batch["error_file_id"] = self._store_file(content, f"{batch_id}_error.jsonl", "batch_output")["id"]
+        batch["request_counts"] = {"total": len(outputs) + len(errors), "completed": len(outputs), "failed": len(errors)}
+        batch["status"] = "completed"
+
+    def _completion_body(self, body: dict) -> dict:
+        content = self.responder(body)
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+        completion_tokens = len(content) // 4
+        return {
+            "id": self._new_id("chatcmpl"), "object": "chat.completion", "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0, "finish_reason": "stop", "logprobs": None,
+                "message": {"role": "assistant", "content": content},
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def _answer(self, item: dict) -> dict:
+        return {
+            "id": self._new_id("batch_req"),
+            "custom_id": item["custom_id"],
+            "response": {"status_code": 200, "request_id": self._new_id("req"), "body": self._completion_body(item["body"])},
+            "error": None,
+        }
+
+
+async def _serve(host: str, port: int, delay: float):
+    server = BatchStubServer(delay=delay)
+    print(f"Batch stub server: {await server.start(host, port)}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI Batch API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds before a batch completes")
+    args = parser.parse_args()
+    asyncio.run(_serve(args.host, args.port, args.delay))
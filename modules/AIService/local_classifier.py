@@ -0,0 +1,360 @@
+"""
+Local (CPU-only) suitability classifier trained on past LLM decisions.
+
+Hashed TF-IDF features of the company name and job title feed a logistic regression.
+Confident predictions skip the LLM, uncertain ones go to it.
+
+Retrain from the filter reports and the research cache:
+
+    python -m modules.AIService.local_classifier train --reports "files/*_zahalnyy_zvit.xlsx" --cache-db sent_emails_db
+    python -m modules.AIService.local_classifier evaluate --reports "files/new_*_zahalnyy_zvit.xlsx"
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import re
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from modules.AIService.research_cache import _fold
+
+DEFAULT_MODEL_PATH = "models/suitability_classifier.npz"
+REPORT_STATUS_COLUMN = "Чому пропущено / статус"
+REPORT_INDUSTRY_COLUMN = "Галузь (знайдено AI)"
+REPORT_RESEARCH_COLUMN = "Спеціалізація / дослідження (AI)"
+REPORT_SUITABLE_STATUS = "Підходить"
+# Statuses of rows the LLM did not actually decide: request, parse and suitability-check failures
+REPORT_FAILURE_MARKERS = ("error", "помилка", "failed to parse")
+LOCAL_SOURCE = "local_classifier"
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _features(company_name: str, job_title: str = "") -> List[str]:
+    """Name words, name character 3-5-grams and job title words (prefixed, so they do not mix)."""
+    name = " ".join(_WORD_RE.findall(_fold(company_name or "")))
+    features = [f"w:{word}" for word in name.split()]
+    padded = f" {name} "
+    for n in (3, 4, 5):
+        features.extend(f"c:{padded[i:i + n]}" for i in range(len(padded) - n + 1))
+    features.extend(f"t:{word}" for word in _WORD_RE.findall(_fold(job_title or "")))
+    return features
+
+
+class _SparseRows:
+    """Minimal CSR matrix: enough for X @ w and X.T @ r with numpy only."""
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.indptr) - 1
+
+    def dot(self, weights: np.ndarray) -> np.ndarray:
+        return np.bincount(self.rows, weights=self.data * weights[self.indices], minlength=self.n_rows)
+
+    def t_dot(self, values: np.ndarray, n_features: int) -> np.ndarray:
+        return np.bincount(self.indices, weights=self.data * values[self.rows], minlength=n_features)
+
+
+class LocalSuitabilityClassifier:
+    """
+    Hashed TF-IDF + logistic regression over (company name, job title).
+
+    `predict_proba` returns P(suitable). A prediction is confident when max(p, 1 - p)
+    reaches `threshold`, which training picks on a holdout so that confident predictions
+    reach the target accuracy.
+    """
+
+    def __init__(self, n_features: int = 2 ** 18, threshold: float = 1.0):
+        """
+        Initialize an untrained classifier.
+
+        Args:
+            n_features: Size of the hashed feature space
+            threshold: Minimum confidence of a prediction that skips the LLM (1.0: never)
+        """
+        self.n_features = n_features
+        self.threshold = threshold
+        self.idf = np.ones(n_features)
+        self.weights = np.zeros(n_features)
+        self.bias = 0.0
+        self.metrics: Dict[str, float] = {}
+
+    def _hash(self, feature: str) -> int:
+        # crc32 instead of hash(): stable across processes (hash() of str is salted)
+        return zlib.crc32(feature.encode("utf-8")) % self.n_features
+
+    def _term_counts(self, examples: Iterable[Tuple[str, str]]) -> _SparseRows:
+        indptr, indices, data = [0], [], []
+        for company_name, job_title in examples:
+            counts: Dict[int, int] = {}
+            for feature in _features(company_name, job_title):
+                index = self._hash(feature)
+                counts[index] = counts.get(index, 0) + 1
+            indices.extend(counts)
+            data.extend(counts.values())
+            indptr.append(len(indices))
+        return _SparseRows(np.array(indptr), np.array(indices, dtype=np.int64), np.array(data, dtype=np.float64))
+
+    def _vectorize(self, examples: Iterable[Tuple[str, str]]) -> _SparseRows:
+        """Sublinear TF * IDF, L2-normalized per row."""
+        matrix = self._term_counts(examples)
+        matrix.data = (1.0 + np.log(matrix.data)) * self.idf[matrix.indices]
+        norms = np.sqrt(np.bincount(matrix.rows, weights=matrix.data ** 2, minlength=matrix.n_rows))
+        matrix.data /= np.maximum(norms, 1e-12)[matrix.rows]
+        return matrix
+
+    def fit(self, examples: List[Tuple[str, str]], labels: List[int], epochs: int = 300,
+            learning_rate: float = 0.1, l2: float = 1e-4) -> "LocalSuitabilityClassifier":
+        """
+        Train on (company_name, job_title) examples; labels are 1 for suitable, 0 for not.
+
+        Full-batch Adam on the class-balanced log loss.
+        """
+        y = np.asarray(labels, dtype=np.float64)
+        counts = self._term_counts(examples)
+        document_frequency = np.bincount(counts.indices, minlength=self.n_features)
+        self.idf = np.log((1.0 + len(examples)) / (1.0 + document_frequency)) + 1.0
+        x = self._vectorize(examples)
+
+        positive = max(y.mean(), 1e-6)
+        sample_weight = np.where(y == 1, 0.5 / positive, 0.5 / max(1.0 - positive, 1e-6)) / len(y)
+        params = np.zeros(self.n_features + 1)
+        moment, velocity = np.zeros_like(params), np.zeros_like(params)
+        beta1, beta2 = 0.9, 0.999
+        for step in range(1, epochs + 1):
+            logits = x.dot(params[:-1]) + params[-1]
+            residual = (1.0 / (1.0 + np.exp(-logits)) - y) * sample_weight
+            gradient = np.empty_like(params)
+            gradient[:-1] = x.t_dot(residual, self.n_features) + l2 * params[:-1]
+            gradient[-1] = residual.sum()
+            moment = beta1 * moment + (1 - beta1) * gradient
+            velocity = beta2 * velocity + (1 - beta2) * gradient ** 2
+            params -= learning_rate * (moment / (1 - beta1 ** step)) / (np.sqrt(velocity / (1 - beta2 ** step)) + 1e-8)
+        self.weights, self.bias = params[:-1], float(params[-1])
+        return self
+
+    def predict_proba(self, examples: List[Tuple[str, str]]) -> np.ndarray:
+        """P(suitable) for each (company_name, job_title)."""
+        if not examples:
+            return np.zeros(0)
+        logits = self._vectorize(examples).dot(self.weights) + self.bias
+        return 1.0 / (1.0 + np.exp(-logits))
+
+    def decide(self, company_name: str, job_title: str = "") -> Optional[Tuple[bool, float]]:
+        """
+        Confident decision for one company.
+
+        Returns:
+            (is_suitable, confidence) or None when the LLM should decide
+        """
+        probability = float(self.predict_proba([(company_name, job_title)])[0])
+        confidence = max(probability, 1.0 - probability)
+        if confidence < self.threshold:
+            return None
+        return probability >= 0.5, confidence
+
+    def evaluate(self, examples: List[Tuple[str, str]], labels: List[int], threshold: Optional[float] = None) -> Dict[str, float]:
+        """
+        Accuracy and coverage on labelled data.
+
+        Returns:
+            {'examples', 'accuracy' (all predictions), 'coverage' (share of confident predictions),
+             'covered_accuracy' (accuracy of confident predictions)}
+        """
+        threshold = self.threshold if threshold is None else threshold
+        y = np.asarray(labels)
+        probability = self.predict_proba(examples)
+        predicted = (probability >= 0.5).astype(int)
+        covered = np.maximum(probability, 1.0 - probability) >= threshold
+        return {
+            "examples": int(len(y)),
+            "accuracy": float((predicted == y).mean()) if len(y) else 0.0,
+            "coverage": float(covered.mean()) if len(y) else 0.0,
+            "covered_accuracy": float((predicted[covered] == y[covered]).mean()) if covered.any() else 0.0,
+        }
+
+    def calibrate_threshold(
+        self, examples: List[Tuple[str, str]], labels: List[int], target_accuracy: float = 0.98,
+        min_confidence: float = 0.8
+    ) -> float:
+        """
+        Pick the lowest confidence threshold whose confident predictions reach `target_accuracy`.
+        The threshold never goes below `min_confidence`: names unlike anything in the training
+        data get middling probabilities and must still reach the LLM even when the holdout is easy.
+        If no threshold qualifies, it is 1.0 and every company goes to the LLM.
+        """
+        self.threshold = 1.0
+        for threshold in np.arange(min_confidence, 1.0, 0.01):
+            result = self.evaluate(examples, labels, threshold)
+            if result["coverage"] > 0 and result["covered_accuracy"] >= target_accuracy:
+                self.threshold = float(round(threshold, 2))
+                break
+        return self.threshold
+
+    def save(self, path: str = DEFAULT_MODEL_PATH):
+        """Save the model as a compressed .npz file."""
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(
+            path, weights=self.weights, idf=self.idf, bias=self.bias, threshold=self.threshold,
+            metrics=json.dumps(self.metrics)
+        )
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_MODEL_PATH) -> "LocalSuitabilityClassifier":
+        """Load a model saved by `save`."""
+        with np.load(path) as stored:
+            classifier = cls(n_features=len(stored["weights"]), threshold=float(stored["threshold"]))
+            classifier.weights = stored["weights"]
+            classifier.idf = stored["idf"]
+            classifier.bias = float(stored["bias"])
+            classifier.metrics = json.loads(str(stored["metrics"]))
+        return classifier
+
+    @classmethod
+    def load_default(cls) -> Optional["LocalSuitabilityClassifier"]:
+        """
+        Model from LOCAL_CLASSIFIER_PATH (default models/suitability_classifier.npz),
+        or None if it was not trained yet or LOCAL_CLASSIFIER_PATH is empty.
+        """
+        path = os.getenv("LOCAL_CLASSIFIER_PATH", DEFAULT_MODEL_PATH)
+        if not path or not Path(path).exists():
+            return None
+        try:
+            return cls.load(path)
+        except Exception as e:
+            print(f"Failed to load local classifier {path}: {e}")
+            return None
+
+
+async def load_report_examples(path: str) -> List[Tuple[Tuple[str, str], int]]:
+    """
+    Labelled examples from a `_zahalnyy_zvit.xlsx` report of process_file_filter_only.
+
+    Only rows decided by the LLM are used: "Підходить" is suitable, other rows with a
+    found industry are unsuitable. Skipped rows, failures (request, parse, suitability
+    check) and rows decided by this classifier itself are ignored, so retraining on
+    later reports never learns from its own outputs.
+    """
+    from modules.ExcelProcessor.excel_processor import ExcelProcessor
+
+    processor = ExcelProcessor(path)
+    df = await processor.load_file()
+    if REPORT_STATUS_COLUMN not in df.columns or REPORT_INDUSTRY_COLUMN not in df.columns:
+        return []
+    researches = df[REPORT_RESEARCH_COLUMN] if REPORT_RESEARCH_COLUMN in df.columns else [""] * len(df)
+    examples = []
+    for company, status, industry, research in zip(
+        processor.get_companies_data(), df[REPORT_STATUS_COLUMN], df[REPORT_INDUSTRY_COLUMN], researches
+    ):
+        status = str(status).strip() if isinstance(status, str) else ""
+        industry = str(industry).strip() if isinstance(industry, str) else ""
+        if not company['company_name'].strip() or not industry:
+            continue
+        if any(marker in status.lower() for marker in REPORT_FAILURE_MARKERS) or _is_local_decision(research):
+            continue
+        examples.append(((company['company_name'], company['title']), int(status == REPORT_SUITABLE_STATUS)))
+    return examples
+
+
+def _is_local_decision(research) -> bool:
+    """True for research texts written by OpenAIService._local_decision."""
+    if not isinstance(research, str) or LOCAL_SOURCE not in research:
+        return False
+    try:
+        data = json.loads(research)
+    except ValueError:
+        return False
+    return isinstance(data, dict) and data.get("source") == LOCAL_SOURCE
+
+
+async def load_research_cache_examples(db_connector) -> List[Tuple[Tuple[str, str], int]]:
+    """Labelled examples from the research cache (no job title is stored there)."""
+    examples = []
+    async for rows in db_connector.iterate("SELECT company_name, field_values FROM research_cache"):
+        for row in rows:
+            try:
+                field_values = json.loads(row["field_values"])
+            except (TypeError, ValueError):
+                continue
+            if row["company_name"] and isinstance(field_values.get("is_suitable"), bool):
+                examples.append(((row["company_name"], ""), int(field_values["is_suitable"])))
+    return examples
+
+
+async def _load_examples(reports: List[str], cache_db: Optional[str]) -> List[Tuple[Tuple[str, str], int]]:
+    examples = []
+    for pattern in reports:
+        for path in sorted(glob.glob(pattern)):
+            loaded = await load_report_examples(path)
+            print(f"{path}: {len(loaded)} examples")
+            examples.extend(loaded)
+    if cache_db:
+        from modules.DatabaceSQLiteController.async_sq_lite_connector import AsyncSQLiteConnector
+
+        connector = AsyncSQLiteConnector(cache_db)
+        await connector.connect()
+        try:
+            loaded = await load_research_cache_examples(connector)
+        finally:
+            await connector.disconnect()
+        print(f"{cache_db} research_cache: {len(loaded)} examples")
+        examples.extend(loaded)
+    return examples
+
+
+def _print_metrics(title: str, metrics: Dict[str, float]):
+    print(
+        f"{title}: {metrics['examples']} examples, accuracy {metrics['accuracy']:.1%}, "
+        f"coverage {metrics['coverage']:.1%}, accuracy of confident predictions {metrics['covered_accuracy']:.1%}"
+    )
+
+
+async def _main(args):
+    examples = await _load_examples(args.reports, args.cache_db)
+    if not examples:
+        print("No labelled examples found")
+        return
+    inputs = [example for example, _ in examples]
+    labels = [label for _, label in examples]
+
+    if args.command == "evaluate":
+        classifier = LocalSuitabilityClassifier.load(args.model)
+        _print_metrics(f"Model {args.model} (threshold {classifier.threshold:.2f})", classifier.evaluate(inputs, labels))
+        return
+
+    order = np.random.default_rng(args.seed).permutation(len(examples))
+    split = int(len(order) * (1 - args.holdout))
+    train, test = order[:split], order[split:]
+    classifier = LocalSuitabilityClassifier().fit([inputs[i] for i in train], [labels[i] for i in train])
+    test_inputs, test_labels = [inputs[i] for i in test], [labels[i] for i in test]
+    classifier.calibrate_threshold(test_inputs, test_labels, args.target_accuracy, args.min_confidence)
+    classifier.metrics = classifier.evaluate(test_inputs, test_labels)
+    classifier.metrics["train_examples"] = len(train)
+    _print_metrics(f"Holdout (threshold {classifier.threshold:.2f})", classifier.metrics)
+    classifier.save(args.model)
+    print(f"Saved {args.model}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train or evaluate the local suitability classifier")
+    parser.add_argument("command", choices=("train", "evaluate"))
+    parser.add_argument("--reports", nargs="*", default=[], help="glob patterns of _zahalnyy_zvit.xlsx reports")
+    parser.add_argument("--cache-db", help="SQLite file with the research_cache table (e.g. sent_emails_db)")
+    parser.add_argument("--model", default=os.getenv("LOCAL_CLASSIFIER_PATH", DEFAULT_MODEL_PATH))
+    parser.add_argument("--holdout", type=float, default=0.2, help="share of examples kept for evaluation")
+    parser.add_argument("--target-accuracy", type=float, default=0.98, help="accuracy required from confident predictions")
+    parser.add_argument("--min-confidence", type=float, default=0.8, help="lowest allowed confidence threshold")
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(_main(parser.parse_args()))
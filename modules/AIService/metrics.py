@@ -0,0 +1,165 @@
+"""Per-job counters for AI usage, shown in the job summary."""
+
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+# USD per 1M tokens: (input, cached input, output). Longest matching model prefix wins.
+MODEL_PRICES: Dict[str, Tuple[float, float, float]] = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4-turbo": (10.00, 10.00, 30.00),
+    "gpt-4": (30.00, 30.00, 60.00),
+    "gpt-5-nano": (0.05, 0.005, 0.40),
+    "gpt-5-mini": (0.25, 0.025, 2.00),
+    "gpt-5": (1.25, 0.125, 10.00),
+    "o4-mini": (1.10, 0.275, 4.40),
+}
+# Batch API completions are billed at half price
+BATCH_PRICE_FACTOR = 0.5
+
+
+def model_prices(model: str) -> Optional[Tuple[float, float, float]]:
+    """
+    Prices of a model in USD per 1M tokens.
+
+    OPENAI_PRICE_PER_1M="input,cached,output" overrides the table (for models it does not know).
+
+    Returns:
+        (input, cached input, output) or None if the price is unknown
+    """
+    override = os.getenv("OPENAI_PRICE_PER_1M")
+    if override:
+        try:
+            prices = tuple(float(part) for part in override.split(","))
+            if len(prices) == 3:
+                return prices
+        except ValueError:
+            pass
+    matches = [prefix for prefix in MODEL_PRICES if (model or "").startswith(prefix)]
+    return MODEL_PRICES[max(matches, key=len)] if matches else None
+
+
+@dataclass
+class JobMetrics:
+    """Counters collected by OpenAIService during one file-processing job."""
+
+    research_requests: int = 0  # research_company calls (cache hits included)
+    cache_hits: int = 0
+    coalesced_requests: int = 0  # calls that joined an identical request already in flight
+    local_decisions: int = 0  # research requests answered by the local classifier
+    api_calls: int = 0  # completions actually sent to the API
+    batch_requests: int = 0  # of api_calls, completions answered through the Batch API
+    tokens_used: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0  # of prompt_tokens, served from the provider's prompt cache
+    completion_tokens: int = 0
+    max_prompt_tokens: int = 0  # largest single prompt
+    estimated_cost: float = 0.0  # USD, 0 when the model price is unknown
+    tokens_by_call: Dict[str, Dict[str, int]] = field(default_factory=dict)  # call type -> token counters
+    tokens_saved: int = 0  # tokens the cached answers originally cost
+    structured_calls: int = 0  # answers checked against a pydantic schema
+    validation_failures: int = 0  # of structured_calls, answers that did not validate
+    retries: int = 0  # repeated completion attempts
+    retry_wait: float = 0.0  # seconds slept between attempts
+    retries_by_class: Dict[str, int] = field(default_factory=dict)
+    model: str = ""  # used for the cost estimate
+
+    @property
+    def cache_hit_rate(self) -> float:
+        """Share of research requests answered from the cache."""
+        return self.cache_hits / self.research_requests if self.research_requests else 0.0
+
+    @property
+    def validation_failure_rate(self) -> float:
+        """Share of structured answers that failed schema validation."""
+        return self.validation_failures / self.structured_calls if self.structured_calls else 0.0
+
+    @property
+    def cached_token_rate(self) -> float:
+        """Share of prompt tokens served from the provider's prompt cache."""
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    def add_usage(self, usage, call_type: str = "other", batch: bool = False) -> int:
+        """
+        Add token usage of one completion.
+
+        Args:
+            usage: `response.usage` from the OpenAI client (may be None)
+            call_type: Label of the request kind for the per-call breakdown
+            batch: Completion came from the Batch API (half price)
+
+        Returns:
+            Total tokens of this completion
+        """
+        self.api_calls += 1
+        tokens = int(getattr(usage, "total_tokens", 0) or 0)
+        prompt = int(getattr(usage, "prompt_tokens", 0) or 0)
+        completion = int(getattr(usage, "completion_tokens", 0) or 0)
+        cached = int(getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", 0) or 0)
+        self.tokens_used += tokens
+        self.prompt_tokens += prompt
+        self.cached_tokens += cached
+        self.completion_tokens += completion
+        self.max_prompt_tokens = max(self.max_prompt_tokens, prompt)
+
+        by_call = self.tokens_by_call.setdefault(call_type, {"calls": 0, "prompt": 0, "cached": 0, "completion": 0})
+        by_call["calls"] += 1
+        by_call["prompt"] += prompt
+        by_call["cached"] += cached
+        by_call["completion"] += completion
+
+        prices = model_prices(self.model)
+        if prices:
+            input_price, cached_price, output_price = prices
+            cost = ((prompt - cached) * input_price + cached * cached_price + completion * output_price) / 1_000_000
+            self.estimated_cost += cost * (BATCH_PRICE_FACTOR if batch else 1.0)
+        return tokens
+
+    def add_retry(self, error_class: str, delay: float):
+        """
+        Count one retry.
+
+        Args:
+            error_class: Error class from `modules.AIService.retry`
+            delay: Seconds slept before the retry
+        """
+        self.retries += 1
+        self.retry_wait += delay
+        self.retries_by_class[error_class] = self.retries_by_class.get(error_class, 0) + 1
+
+    def format_summary(self) -> str:
+        """Short human-readable summary for the Telegram job report."""
+        summary = (
+            f"🤖 AI: запитів до API {self.api_calls} (з них через Batch API {self.batch_requests}), "
+            f"токенів {self.tokens_used}\n"
+            f"💾 Кеш досліджень: {self.cache_hits}/{self.research_requests} "
+            f"({self.cache_hit_rate:.0%}), зекономлено токенів {self.tokens_saved}, "
+            f"об'єднано однакових запитів {self.coalesced_requests}"
+        )
+        if self.prompt_tokens or self.completion_tokens:
+            cost = f", ≈ ${self.estimated_cost:.4f}" if model_prices(self.model) else ""
+            summary += (
+                f"\n📏 Токени: prompt {self.prompt_tokens} (з кешу провайдера {self.cached_tokens}, "
+                f"{self.cached_token_rate:.0%}), completion {self.completion_tokens}{cost}, "
+                f"найбільший prompt {self.max_prompt_tokens}"
+            )
+            by_call = ", ".join(
+                f"{name}: {c['calls']}× {c['prompt']}/{c['cached']}/{c['completion']}"
+                for name, c in sorted(self.tokens_by_call.items(), key=lambda item: -item[1]['prompt'])
+            )
+            summary += f"\n   за типами (prompt/кеш/completion): {by_call}"
+        if self.structured_calls:
+            summary += (
+                f"\n🧾 Невалідних структурованих відповідей: {self.validation_failures}/{self.structured_calls} "
+                f"({self.validation_failure_rate:.1%})"
+            )
+        if self.local_decisions:
+            summary += f"\n🧮 Локальна модель вирішила без AI: {self.local_decisions}/{self.research_requests}"
+        if self.retries:
+            by_class = ", ".join(f"{name}: {count}" for name, count in sorted(self.retries_by_class.items()))
+            summary += f"\n🔁 Повторних запитів {self.retries} ({by_class}), очікування {self.retry_wait:.1f} с"
+        return summary
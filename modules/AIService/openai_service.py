@@ -1,16 +1,37 @@
 """OpenAI service for AI operations."""
 
+import asyncio
+import hashlib
 import re
 import json
 import os
 from pathlib import Path
-from typing import Optional, Set, Dict
+from typing import Awaitable, Callable, Optional, Set, Dict
 from openai import AsyncOpenAI
+from pydantic import ValidationError
+
+from modules.AIService.batch_runner import BatchRunner
+from modules.AIService.local_classifier import LOCAL_SOURCE, LocalSuitabilityClassifier
+from modules.AIService.metrics import JobMetrics
+from modules.AIService.rate_limiter import TokenBucketRateLimiter, get_shared_rate_limiter
+from modules.AIService.research_cache import ResearchCache, normalize_company_name
+from modules.AIService.retry import RATE_LIMIT, RetryPolicy, parse_retry_after
+from modules.AIService.schemas import (
+    ClassificationBatch, ClassificationResult, StructuredOutputError,
+    combined_model, research_model, response_format, tags_model
+)
 
 
 class OpenAIService:
     """OpenAI service for generating text and researching companies."""
 
+    # Bump when the research prompt or its parsing changes: cached answers of older versions are ignored
+    RESEARCH_PROMPT_VERSION = "2"
+    # Same for the multi-company classification prompt (cached separately from research)
+    CLASSIFY_PROMPT_VERSION = "classify-1"
+    # Companies per classification request
+    CLASSIFY_BATCH_SIZE = 30
+
     @staticmethod
     def _suitability_it_or_government_only(industry: str, rejection_reason: str) -> tuple[bool, str]:
         """Підходить усе, крім IT та державного сектору. Невизначена галузь — підходить."""
@@ -40,20 +61,197 @@ class OpenAIService:
                 return False, rejection_reason or "IT / software"
         return True, ""
     
-    def __init__(self, api_key: str, model: str = "gpt-4"):
+    # Completion tokens assumed for the rate-limit estimate when max_tokens is not set
+    DEFAULT_COMPLETION_TOKENS_ESTIMATE = 800
+    # max_completion_tokens per call type; a structured answer cut at the cap is retried once with twice the cap
+    MAX_COMPLETION_TOKENS = {
+        'research': 1500,
+        'suitability': 800,
+        'classify_base': 300,  # + classify_item per company
+        'classify_item': 80,
+        'tags': 500,
+        'combined': 1500,
+        'extract_fields': 800,
+        'text': 1500,  # plain-text email bodies
+        'template_html': 127000,  # calls that return the whole HTML template
+    }
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "gpt-4",
+        research_cache: Optional[ResearchCache] = None,
+        rate_limiter: Optional[TokenBucketRateLimiter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        local_classifier: Optional[LocalSuitabilityClassifier] = None
+    ):
         """
         Initialize OpenAI service.
         
         Args:
             api_key: OpenAI API key
             model: Model name (default: gpt-4)
+            research_cache: Optional persistent cache for research_company results
+            rate_limiter: RPM/TPM limiter (default: process-wide limiter shared by all jobs)
+            retry_policy: Retry rules for completion calls (default: RetryPolicy())
+            local_classifier: Trained local model that answers confident suitability decisions
         """
-        self.client = AsyncOpenAI(api_key=api_key)
+        # Retries are done by `retry_policy`, which also informs the rate limiter about 429s
+        self.client = AsyncOpenAI(api_key=api_key, max_retries=0)
         self.model = model
+        self.research_cache = research_cache
+        self.rate_limiter = rate_limiter or get_shared_rate_limiter()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.local_classifier = local_classifier
+        self.metrics = JobMetrics(model=model)
+        self._inflight: Dict[str, asyncio.Future] = {}  # single-flight: key -> shared task
         self.temp_template_path = Path("temporary_file.html")
         self.tags_description = {}
         self._template_processed = False  # Флаг чи template вже оброблений в цій сесії
+        self._template_lock = asyncio.Lock()  # рядки обробляються паралельно, а template - лише один раз
     
+    def _estimate_tokens(self, kwargs: dict) -> int:
+        """Rough token estimate of a completion request (~4 characters per token)."""
+        prompt_chars = sum(len(str(message.get('content', ''))) for message in kwargs.get('messages', []))
+        completion = kwargs.get('max_completion_tokens') or kwargs.get('max_tokens') or self.DEFAULT_COMPLETION_TOKENS_ESTIMATE
+        return prompt_chars // 4 + int(completion)
+
+    @staticmethod
+    def _prompt_cache_key(static_prompt: str) -> str:
+        """
+        Routing hint for the provider's prompt cache.
+
+        Requests with the same static prefix get the same key, so they land on servers that
+        already hold that prefix. Only the static part is hashed, never per-company values.
+        """
+        return "p-" + hashlib.sha256(static_prompt.encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def _call_type(kwargs: dict) -> str:
+        """Label of a request for the per-call token breakdown: schema name or "text"."""
+        fmt = kwargs.get('response_format') or {}
+        return fmt.get('json_schema', {}).get('name') or fmt.get('type') or 'text'
+
+    async def _create_completion(self, **kwargs):
+        """
+        Single entry point for chat completions: waits for the rate limiter,
+        sends the request (retried according to `retry_policy`) and records token usage.
+        Whole-template generations get the policy's long deadline.
+
+        Args:
+            **kwargs: Arguments of `client.chat.completions.create`
+
+        Returns:
+            Completion response
+        """
+        estimated_tokens = self._estimate_tokens(kwargs)
+        deadline = None
+        if (kwargs.get('max_completion_tokens') or 0) >= self.MAX_COMPLETION_TOKENS['template_html']:
+            deadline = self.retry_policy.long_deadline
+
+        response = await self.retry_policy.call(
+            lambda: self.client.chat.completions.create(**kwargs),
+            on_retry=self._on_retry,
+            # Every attempt is a request of its own for the RPM/TPM budget
+            acquire=lambda: self.rate_limiter.acquire(estimated_tokens),
+            deadline=deadline,
+        )
+        usage = getattr(response, 'usage', None)
+        self.rate_limiter.record_usage(estimated_tokens, getattr(usage, 'total_tokens', None))
+        self.metrics.add_usage(usage, call_type=self._call_type(kwargs))
+        return response
+
+    async def _create_structured(self, answer_model, **kwargs):
+        """
+        Completion whose answer must validate against a pydantic model (strict JSON schema).
+
+        An answer that fails validation (or was cut at max_completion_tokens) gets one targeted
+        retry: the model sees its answer and the validation errors; a cut answer also gets twice
+        the token cap. Both outcomes are counted in the job metrics.
+
+        Args:
+            answer_model: Pydantic model of the expected answer
+            **kwargs: Arguments of `client.chat.completions.create` (response_format is set here)
+
+        Returns:
+            (validated model instance, completion response)
+
+        Raises:
+            StructuredOutputError: The retry did not validate either
+        """
+        kwargs['response_format'] = response_format(answer_model)
+        content = ""
+        for attempt in range(2):
+            response = await self._create_completion(**kwargs)
+            self.metrics.structured_calls += 1
+            choice = response.choices[0]
+            content = choice.message.content or ""
+            try:
+                if choice.finish_reason == 'length':
+                    raise ValueError(f"answer cut at max_completion_tokens={kwargs.get('max_completion_tokens')}")
+                return answer_model.model_validate_json(content), response
+            except (ValidationError, ValueError) as e:
+                self.metrics.validation_failures += 1
+                error = e
+            if attempt == 0:
+                print(f"⚠️ {answer_model.__name__}: invalid structured answer, retrying ({str(error).splitlines()[0]})")
+                kwargs = dict(kwargs)
+                if choice.finish_reason == 'length' and kwargs.get('max_completion_tokens'):
+                    kwargs['max_completion_tokens'] *= 2
+                else:
+                    kwargs['messages'] = list(kwargs['messages']) + [
+                        {"role": "assistant", "content": content},
+                        {"role": "user", "content": f"The answer does not match the JSON schema:\n{error}\nReturn the corrected JSON only."},
+                    ]
+        raise StructuredOutputError(f"{answer_model.__name__}: {error}", content)
+
+    def _validated_batch_answer(self, answer_model, completion) -> Optional[str]:
+        """Validate a Batch API answer; invalid ones return None (callers retry them interactively)."""
+        content = self._completion_from_batch(completion, call_type=answer_model.__name__)
+        self.metrics.structured_calls += 1
+        try:
+            answer_model.model_validate_json(content or "")
+            return content
+        except ValidationError:
+            self.metrics.validation_failures += 1
+            return None
+
+    @staticmethod
+    def _contact_keys(required_fields: Optional[Set[str]], include_company: bool = True) -> tuple:
+        """Keys of the "contact" object in structured answers (last segment of template fields)."""
+        return tuple(sorted({
+            field.split('.')[-1] for field in required_fields or ()
+            if include_company or 'company' not in field.lower()
+        }))
+
+    def _research_model(self, required_fields: Optional[Set[str]]):
+        return research_model(self._contact_keys(required_fields)) if required_fields else ClassificationResult
+
+    @staticmethod
+    def _template_tags(template_with_tags: str) -> tuple:
+        return tuple(sorted(set(re.findall(r'\{\{([A-Z_]+)\}\}', template_with_tags))))
+
+    def _on_retry(self, error_class: str, error: BaseException, delay: float):
+        """Account a retry in the job metrics; on 429 slow down every caller of the shared limiter."""
+        self.metrics.add_retry(error_class, delay)
+        if error_class == RATE_LIMIT:
+            self.rate_limiter.on_rate_limited(parse_retry_after(error) or delay)
+
+    async def _single_flight(self, key: str, factory: Callable[[], Awaitable]):
+        """
+        Run `factory()` once per key while it is in flight; concurrent callers share the result.
+
+        The shared task is shielded, so a cancelled caller does not cancel it for the others.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.metrics.coalesced_requests += 1
+        return await asyncio.shield(task)
+
     async def research_company(
         self, 
         company_name: str, 
@@ -62,6 +260,7 @@ class OpenAIService:
     ) -> Dict[str, str]:
         """
         Research company information using AI with focus on required template fields.
+        Concurrent calls for the same company (normalized name and location) share one request.
         
         Args:
             company_name: Name of the company
@@ -72,19 +271,255 @@ class OpenAIService:
         Returns:
             Dictionary with researched information for each field
         """
+        key = "research\x1f" + ResearchCache.make_key(
+            company_name, company_info.get('location', ''), self.RESEARCH_PROMPT_VERSION, required_fields
+        )
+        result = await self._single_flight(
+            key, lambda: self._research_company(company_name, company_info, required_fields)
+        )
+        return dict(result)
+
+    async def _research_company(
+        self, 
+        company_name: str, 
+        company_info: dict,
+        required_fields: Optional[Set[str]] = None
+    ) -> Dict[str, str]:
+        """Uncoalesced implementation of research_company."""
+        self.metrics.research_requests += 1
+        local = self._local_decision(company_name, company_info, required_fields)
+        if local is not None:
+            return local
+        cache_key = None
+        if self.research_cache:
+            cache_key = self.research_cache.make_key(
+                company_name, company_info.get('location', ''), self.RESEARCH_PROMPT_VERSION, required_fields
+            )
+            cached = await self._get_cached_research(cache_key, company_name)
+            if cached is not None:
+                return cached
+        return await self._research_with_llm(company_name, company_info, required_fields, cache_key)
+
+    async def _research_with_llm(
+        self,
+        company_name: str,
+        company_info: dict,
+        required_fields: Optional[Set[str]],
+        cache_key: Optional[str]
+    ) -> Dict[str, str]:
+        """
+        Research call itself, after the local model and the cache had no answer.
+
+        Does not count a research request: callers have already counted it.
+        """
         try:
-            system_prompt = """Find company executive names (CEO/founder/owner). Search: website, LinkedIn, Handelsregister. Determine industry and suitability. Return JSON.
-Suitability: mark NOT suitable ONLY for IT/software companies OR government/public sector. If industry is unknown or unclear, mark suitable (is_suitable true). Banks and other private businesses are suitable."""
-            
-            if required_fields:
-                fields_list = ", ".join(sorted(required_fields))
-                user_prompt = f"""Research: {company_name}
-Job: {company_info.get('title', 'N/A')}
-Location: {company_info.get('location', 'N/A')}
+            request = self.build_research_request(company_name, company_info, required_fields)
+            try:
+                _, response = await self._create_structured(self._research_model(required_fields), **request)
+                research_text = response.choices[0].message.content
+                tokens = int(getattr(response.usage, 'total_tokens', 0) or 0)
+                validated = True
+            except StructuredOutputError as e:
+                # Lenient parse of the last answer; such results are not cached
+                research_text, tokens, validated = e.content, 0, False
+            field_values = self.parse_research_response(research_text, company_name, company_info, required_fields)
+            parse_failed = field_values.pop('_parse_failed', False)
+            if cache_key and validated and not parse_failed:
+                await self._store_cached_research(cache_key, field_values, company_name, company_info, tokens)
+            return field_values
+        except Exception as e:
+            return self._research_error_values(e, required_fields)
+
+    async def research_and_generate(
+        self,
+        company_name: str,
+        company_info: dict,
+        template_content: str,
+        template_fields: Optional[Set[str]],
+        job_title: str = ""
+    ) -> tuple[Dict[str, str], Optional[str]]:
+        """
+        Research a company and write its email in one structured call.
+
+        Contact fields, industry, suitability and every template tag come back in one
+        JSON-schema response. Concurrent calls for the same company and job title share it.
+
+        Args:
+            company_name: Name of the company
+            company_info: Dictionary with available company info
+            template_content: HTML template content
+            template_fields: Set of template field names
+            job_title: Job title/position
+
+        Returns:
+            (research result in the format of research_company, filled HTML or None).
+            HTML is None for unsuitable companies and whenever the email has to be
+            generated separately (cache hit, template without tags, incomplete tags).
+        """
+        key = "combined\x1f" + ResearchCache.make_key(
+            company_name, company_info.get('location', ''), self.RESEARCH_PROMPT_VERSION, template_fields
+        ) + "\x1f" + str(job_title or "").strip().casefold()
+        research, html = await self._single_flight(
+            key, lambda: self._research_and_generate(company_name, company_info, template_content, template_fields, job_title)
+        )
+        return dict(research), html
+
+    async def _research_and_generate(
+        self,
+        company_name: str,
+        company_info: dict,
+        template_content: str,
+        template_fields: Optional[Set[str]],
+        job_title: str
+    ) -> tuple[Dict[str, str], Optional[str]]:
+        """Uncoalesced implementation of research_and_generate."""
+        processed_template = await self._get_processed_template(template_content)
+        request = self.build_combined_request(company_name, company_info, template_fields, processed_template, job_title)
+        if request is None:
+            # Template without tags: the email needs the full-template fallback anyway
+            return await self._research_company(company_name, company_info, template_fields), None
+
+        self.metrics.research_requests += 1
+        local = self._local_decision(company_name, company_info, template_fields)
+        if local is not None:
+            return local, None
+        cache_key = None
+        if self.research_cache:
+            cache_key = self.research_cache.make_key(
+                company_name, company_info.get('location', ''), self.RESEARCH_PROMPT_VERSION, template_fields
+            )
+            cached = await self._get_cached_research(cache_key, company_name)
+            if cached is not None:
+                return cached, None
+
+        try:
+            _, response = await self._create_structured(
+                self._combined_model(template_fields, self._template_tags(processed_template)), **request
+            )
+            tokens = int(getattr(response.usage, 'total_tokens', 0) or 0)
+            research, html = self.parse_combined_response(
+                response.choices[0].message.content, company_name, company_info, template_fields, processed_template
+            )
+        except StructuredOutputError:
+            # Fall back to the separate research call (the email is generated afterwards);
+            # the request is already counted and the cache already missed
+            return await self._research_with_llm(company_name, company_info, template_fields, cache_key), None
+        except Exception as e:
+            return self._research_error_values(e, template_fields), None
+        if not research.pop('_parse_failed', False) and cache_key:
+            await self._store_cached_research(cache_key, research, company_name, company_info, tokens)
+        return research, html
+
+    def build_combined_request(
+        self,
+        company_name: str,
+        company_info: dict,
+        required_fields: Optional[Set[str]],
+        processed_template: str,
+        job_title: str = ""
+    ) -> Optional[dict]:
+        """
+        Build the single research + email request with a strict JSON schema.
+
+        The decision fields come first in the schema, and structured outputs are generated
+        in schema order, so for an unsuitable company the model has already decided before
+        reaching the tags and only emits "N/A" / "" for the rest.
+
+        Returns:
+            Keyword arguments of `client.chat.completions.create`, or None if the template has no tags
+        """
+        tags = self._template_tags(processed_template)
+        if not tags:
+            return None
+        tags_info = {tag: self.tags_description.get(f"{{{{{tag}}}}}", "Personalized content") for tag in tags}
+
+        system_prompt = """Research the company, decide suitability and write personalized email texts in one answer.
+Suitability: NOT suitable ONLY for IT/software companies OR government/public sector (police, ministries, municipal authorities). Unknown or unclear industry, banks and other private businesses are suitable.
+Contact: CEO/founder/owner names from website, LinkedIn, Handelsregister; "N/A" if not found. Never use emails containing bewerbung, personal, hr, karriere.
+If is_suitable is false: set every contact value to "N/A" and every tag to "" — do not write email text.
+If is_suitable is true: write every tag in German, professional and warm, personalized to the company's industry.
+
+Tags to write:
+""" + json.dumps(tags_info, indent=2, ensure_ascii=False)
+
+        # Tags are the same for the whole template, so they belong to the cached prefix
+        user_prompt = f"""Company: {company_name}
+Job: {job_title or company_info.get('title', 'N/A')}
+Location: {company_info.get('location', 'N/A')}"""
+
+        return dict(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=1,
+            response_format=response_format(self._combined_model(required_fields, tags)),
+            max_completion_tokens=self.MAX_COMPLETION_TOKENS['combined'],
+            prompt_cache_key=self._prompt_cache_key(system_prompt)
+        )
+
+    def _combined_model(self, required_fields: Optional[Set[str]], tags: tuple):
+        return combined_model(self._contact_keys(required_fields, include_company=False), tags)
+
+    def parse_combined_response(
+        self,
+        text: str,
+        company_name: str,
+        company_info: dict,
+        required_fields: Optional[Set[str]],
+        processed_template: str
+    ) -> tuple[Dict[str, str], Optional[str]]:
+        """
+        Split the combined answer into the research result and the filled email.
+
+        The research part is parsed exactly like a research_company answer (including the
+        IT / public-sector check). The email is only returned when the company is suitable
+        and every tag was written; otherwise the caller generates it separately.
+        """
+        try:
+            data = json.loads(text)
+        except (json.JSONDecodeError, TypeError):
+            return self.parse_research_response(text, company_name, company_info, required_fields), None
+        tags = data.pop('tags', None) if isinstance(data, dict) else None
+        research = self.parse_research_response(
+            json.dumps(data, ensure_ascii=False), company_name, company_info, required_fields
+        )
+        if research.get('_parse_failed') or not research.get('is_suitable'):
+            return research, None
+
+        expected_tags = set(self._template_tags(processed_template))
+        if not isinstance(tags, dict) or not expected_tags <= set(tags) or not all(str(tags[tag]).strip() for tag in expected_tags):
+            return research, None
+        field_values = self._build_field_values(company_name, research, required_fields)
+        return research, self._fill_tags_in_template(processed_template, {tag: str(tags[tag]) for tag in expected_tags}, field_values)
+
+    def build_research_request(
+        self,
+        company_name: str,
+        company_info: dict,
+        required_fields: Optional[Set[str]] = None
+    ) -> dict:
+        """
+        Build the chat completion request of research_company.
+
+        Used both for the interactive call and for Batch API request lines.
+
+        Args:
+            company_name: Name of the company
+            company_info: Dictionary with available company info
+            required_fields: Set of template fields that need to be filled
+
+        Returns:
+            Keyword arguments of `client.chat.completions.create`
+        """
+        if required_fields:
+            fields_list = ", ".join(sorted(required_fields))
+            system_prompt = f"""Find company executive names (CEO/founder/owner). Determine industry and suitability. Return JSON.
 
 Find: {fields_list}
 
-Search: "{company_name} CEO", "{company_name} founder", "{company_name} Geschäftsführer", Handelsregister, LinkedIn.
+Search: "<company> CEO", "<company> founder", "<company> Geschäftsführer", Handelsregister, LinkedIn, company website.
 
 NOT SUITABLE: ONLY IT/software companies OR government/public sector (incl. police, ministries, municipal authorities).
 SUITABLE: Everyone else, including if industry/specialization is unknown, unclear, or not determined. Banks and private companies are suitable unless clearly IT or government.
@@ -94,7 +529,7 @@ EMAIL RULE (critical): Do not use / do not consider valid any email address that
 Return JSON:
 {{
   "contact": {{
-    "COMPANY": "{company_name}",
+    "COMPANY": "company name as given",
     "FIRSTNAME": "CEO/founder first name or N/A",
     "LASTNAME": "CEO/founder last name or N/A",
     "unsubscribe": "N/A"
@@ -103,92 +538,461 @@ Return JSON:
   "is_suitable": true or false,
   "rejection_reason": "reason if not suitable, else empty string"
 }}"""
-            else:
-                user_prompt = f"""Research: {company_name}
-Job: {company_info.get('title', 'N/A')}
-Location: {company_info.get('location', 'N/A')}
-Find: business activity, industry, description.
-NOT SUITABLE: ONLY IT/software OR government/public sector.
+        else:
+            system_prompt = """Research the company: business activity, industry, description. Determine suitability. Return JSON.
+NOT SUITABLE: ONLY IT/software OR government/public sector (incl. police, ministries, municipal authorities).
 SUITABLE: unknown/unclear industry counts as suitable. Banks and private sector suitable.
 Return JSON with industry, is_suitable, rejection_reason (empty if suitable)."""
-            
-            # Перший запит з більш активною температурою
-            response = await self.client.chat.completions.create(
+
+        # Per-company values go last: the instructions above stay a byte-identical prefix for the prompt cache
+        user_prompt = f"""Research: {company_name}
+Job: {company_info.get('title', 'N/A')}
+Location: {company_info.get('location', 'N/A')}"""
+        
+        # Перший запит з більш активною температурою
+        return dict(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=1,
+            response_format=response_format(self._research_model(required_fields)),
+            max_completion_tokens=self.MAX_COMPLETION_TOKENS['research'],
+            prompt_cache_key=self._prompt_cache_key(system_prompt)
+        )
+
+    def parse_research_response(
+        self,
+        research_text: str,
+        company_name: str,
+        company_info: dict,
+        required_fields: Optional[Set[str]] = None
+    ) -> Dict[str, str]:
+        """
+        Turn the research completion text into field values.
+
+        Args:
+            research_text: Message content of the research completion
+            company_name: Name of the company
+            company_info: Dictionary with available company info
+            required_fields: Set of template fields that need to be filled
+
+        Returns:
+            Dictionary with researched information for each field; unparseable answers
+            are marked unsuitable and carry '_parse_failed' (must not be cached)
+        """
+        # Парсити JSON відповідь
+        try:
+            research_data = json.loads(research_text)
+        except json.JSONDecodeError:
+            parsed_values = self._parse_research_to_fields(research_text, required_fields, company_name, company_info)
+            parsed_values['is_suitable'] = False
+            parsed_values['industry'] = 'Unknown'
+            parsed_values['rejection_reason'] = 'Failed to parse research data'
+            parsed_values['_parse_failed'] = True
+            return parsed_values
+
+        field_values = {}
+        
+        # Витягти suitability з research_data
+        field_values['is_suitable'] = research_data.get('is_suitable', False)
+        field_values['industry'] = research_data.get('industry', 'Unknown')
+        field_values['rejection_reason'] = research_data.get('rejection_reason', '')
+        ok, rr = self._suitability_it_or_government_only(
+            field_values['industry'], field_values['rejection_reason']
+        )
+        field_values['is_suitable'] = ok
+        field_values['rejection_reason'] = rr if not ok else ''
+        
+        # Витягти значення з JSON структури
+        if 'contact' in research_data:
+            contact_data = research_data['contact']
+            for field in required_fields or []:
+                field_key = field.replace('contact.', '') if 'contact.' in field else field
+                if '.' in field_key:
+                    field_key = field_key.split('.')[-1]
+                
+                if field_key in contact_data:
+                    field_values[field] = contact_data[field_key]
+                elif 'company' in field.lower():
+                    field_values[field] = company_name
+                else:
+                    field_values[field] = contact_data.get(field_key, "N/A")
+        else:
+            for field in required_fields or []:
+                field_key = field.replace('contact.', '') if 'contact.' in field else field
+                if '.' in field_key:
+                    field_key = field_key.split('.')[-1]
+                
+                if field_key in research_data:
+                    field_values[field] = research_data[field_key]
+                elif 'company' in field.lower():
+                    field_values[field] = company_name
+                else:
+                    field_values[field] = "N/A"
+        
+        field_values['_research_text'] = research_text
+        return field_values
+
+    @staticmethod
+    def _research_error_values(error: Exception, required_fields: Optional[Set[str]] = None) -> Dict[str, str]:
+        """Default research values when the request failed."""
+        default_values = {}
+        if required_fields:
+            for field in required_fields:
+                default_values[field] = f"Error: {str(error)}"
+        else:
+            default_values['company_description'] = f"Error researching company: {str(error)}"
+        default_values['is_suitable'] = False
+        default_values['industry'] = 'Unknown'
+        default_values['rejection_reason'] = f'Error during research: {str(error)}'
+        return default_values
+    
+    @staticmethod
+    def _build_field_values(company_name: str, company_research: Dict[str, str], template_fields: Optional[Set[str]]) -> Dict[str, str]:
+        """Template placeholder values from research; missing fields become company name or N/A."""
+        field_values = {}
+        for field in template_fields or ():
+            if field in company_research:
+                field_values[field] = company_research[field]
+            elif 'company' in field.lower():
+                field_values[field] = company_name
+            else:
+                field_values[field] = "N/A"
+        return field_values
+
+    def _completion_from_batch(self, completion, call_type: str = "other") -> str:
+        """Account a Batch API completion in the job metrics and return its text."""
+        self.metrics.batch_requests += 1
+        self.metrics.add_usage(completion.usage, call_type=call_type, batch=True)
+        return completion.choices[0].message.content
+
+    async def research_companies_batch(
+        self,
+        companies: Dict[str, tuple],
+        required_fields: Optional[Set[str]],
+        runner: BatchRunner
+    ) -> Dict[str, Dict[str, str]]:
+        """
+        Research many companies through the Batch API.
+
+        Cached companies are answered from the cache; the rest go into one batch.
+        Companies whose batch item failed are missing from the result.
+
+        Args:
+            companies: key -> (company_name, company_info)
+            required_fields: Set of template fields that need to be filled
+            runner: BatchRunner bound to this service's client
+
+        Returns:
+            key -> research result in the format of research_company
+        """
+        results = {}
+        requests = {}
+        cache_keys = {}
+        for key, (company_name, company_info) in companies.items():
+            self.metrics.research_requests += 1
+            local = self._local_decision(company_name, company_info, required_fields)
+            if local is not None:
+                results[key] = local
+                continue
+            if self.research_cache:
+                cache_keys[key] = self.research_cache.make_key(
+                    company_name, company_info.get('location', ''), self.RESEARCH_PROMPT_VERSION, required_fields
+                )
+                cached = await self._get_cached_research(cache_keys[key], company_name)
+                if cached is not None:
+                    results[key] = cached
+                    continue
+            requests[key] = self.build_research_request(company_name, company_info, required_fields)
+
+        print(f"📦 Batch research: {len(requests)} requests, {len(results)} from cache")
+        completions = await runner.run(requests, name="research")
+        for key, completion in completions.items():
+            company_name, company_info = companies[key]
+            research_text = self._validated_batch_answer(self._research_model(required_fields), completion)
+            if research_text is None:
+                continue
+            field_values = self.parse_research_response(research_text, company_name, company_info, required_fields)
+            if not field_values.pop('_parse_failed', False) and key in cache_keys:
+                tokens = int(getattr(completion.usage, 'total_tokens', 0) or 0)
+                await self._store_cached_research(cache_keys[key], field_values, company_name, company_info, tokens)
+            results[key] = field_values
+        return results
+
+    async def generate_emails_batch(
+        self,
+        emails: Dict[str, tuple],
+        template_content: str,
+        template_fields: Optional[Set[str]],
+        runner: BatchRunner
+    ) -> Dict[str, str]:
+        """
+        Generate template emails through the Batch API.
+
+        The template is processed into tags once (interactive call), then all tag requests
+        go into one batch. If the template has no tags, nothing is generated and callers
+        use generate_email_content (AI fallback) per row.
+
+        Args:
+            emails: key -> (company_name, company_research, job_title)
+            template_content: HTML template content
+            template_fields: Set of template field names
+            runner: BatchRunner bound to this service's client
+
+        Returns:
+            key -> filled HTML for items that succeeded
+        """
+        processed_template = await self._get_processed_template(template_content)
+        tags = self._template_tags(processed_template)
+        if not tags:
+            return {}
+
+        requests = {}
+        field_values_by_key = {}
+        for key, (company_name, company_research, job_title) in emails.items():
+            field_values = self._build_field_values(company_name, company_research, template_fields)
+            request = self.build_tags_request(processed_template, company_name, company_research, job_title, field_values)
+            if request is not None:
+                requests[key] = request
+                field_values_by_key[key] = field_values
+
+        print(f"📦 Batch email generation: {len(requests)} requests")
+        completions = await runner.run(requests, name="emails")
+        results = {}
+        for key, completion in completions.items():
+            content = self._validated_batch_answer(tags_model(tags), completion)
+            if content is None:
+                continue
+            tags_json = json.loads(content)
+            results[key] = self._fill_tags_in_template(processed_template, tags_json, field_values_by_key[key])
+        return results
+
+    def _local_decision(
+        self,
+        company_name: str,
+        company_info: dict,
+        required_fields: Optional[Set[str]] = None
+    ) -> Optional[Dict[str, str]]:
+        """
+        Answer from the local classifier when it is confident.
+
+        Without required_fields only suitability is needed, so both decisions are final.
+        With required_fields the LLM still has to find contact data, so only a confident
+        "not suitable" (no email will be generated) skips it.
+
+        Returns:
+            Research-like result or None when the LLM has to decide
+        """
+        if self.local_classifier is None:
+            return None
+        try:
+            decision = self.local_classifier.decide(company_name, str(company_info.get('title', '') or ''))
+        except Exception as e:
+            print(f"Local classifier failed for {company_name}: {e}")
+            return None
+        if decision is None:
+            return None
+        is_suitable, confidence = decision
+        if is_suitable and required_fields:
+            return None
+
+        self.metrics.local_decisions += 1
+        rejection_reason = '' if is_suitable else f'IT / державний сектор (локальна модель, {confidence:.0%})'
+        result = {'is_suitable': is_suitable, 'industry': 'Unknown', 'rejection_reason': rejection_reason}
+        result['_research_text'] = json.dumps(
+            {'source': LOCAL_SOURCE, 'is_suitable': is_suitable, 'confidence': round(confidence, 3)}
+        )
+        for field in required_fields or ():
+            result[field] = company_name if 'company' in field.lower() else "N/A"
+        return result
+
+    async def _get_cached_research(self, cache_key: str, company_name: str) -> Optional[Dict[str, str]]:
+        """
+        Return cached research adapted to this row, or None on a miss.
+
+        The cache is keyed on the normalized name, so company-name fields are
+        replaced with the name exactly as written in the current row.
+        """
+        try:
+            cached = await self.research_cache.get(cache_key)
+        except Exception as e:
+            print(f"Research cache read failed for {company_name}: {e}")
+            return None
+        if not cached:
+            return None
+
+        self.metrics.cache_hits += 1
+        self.metrics.tokens_saved += cached['tokens']
+        field_values = dict(cached['field_values'])
+        for field in field_values:
+            if 'company' in field.lower() and field != 'company_description':
+                field_values[field] = company_name
+        return field_values
+
+    async def _store_cached_research(
+        self, cache_key: str, field_values: dict, company_name: str, company_info: dict, tokens: int,
+        prompt_version: Optional[str] = None
+    ):
+        """Save a successfully parsed research result; cache errors never fail the job."""
+        try:
+            await self.research_cache.set(
+                cache_key, field_values, company_name=company_name, location=company_info.get('location', ''),
+                prompt_version=prompt_version or self.RESEARCH_PROMPT_VERSION, tokens=tokens
+            )
+        except Exception as e:
+            print(f"Research cache write failed for {company_name}: {e}")
+
+    async def classify_companies(
+        self,
+        companies: Dict[str, tuple],
+        batch_size: Optional[int] = None,
+        concurrency: int = 4
+    ) -> Dict[str, Dict[str, str]]:
+        """
+        Classify many companies (IT / public sector vs. everything else) with few requests.
+
+        Companies are sent as a compact JSON list, `batch_size` per request, and the answer is a
+        list keyed by the same ids. Items that are missing or malformed in the answer are
+        re-checked one by one with `_check_company_suitability`.
+
+        Args:
+            companies: key -> (company_name, company_info)
+            batch_size: Companies per request (20-50 works well; default CLASSIFY_BATCH_SIZE)
+            concurrency: Requests in flight at the same time
+
+        Returns:
+            key -> {'is_suitable', 'industry', 'rejection_reason', '_research_text'}
+            (same keys as research_company without required_fields)
+        """
+        batch_size = max(1, batch_size or self.CLASSIFY_BATCH_SIZE)
+        results = {}
+        pending = {}
+        cache_keys = {}
+        for key, (company_name, company_info) in companies.items():
+            self.metrics.research_requests += 1
+            local = self._local_decision(company_name, company_info)
+            if local is not None:
+                results[key] = local
+                continue
+            if self.research_cache:
+                cache_keys[key] = self.research_cache.make_key(
+                    company_name, company_info.get('location', ''), self.CLASSIFY_PROMPT_VERSION
+                )
+                cached = await self._get_cached_research(cache_keys[key], company_name)
+                if cached is not None:
+                    results[key] = cached
+                    continue
+            pending[key] = (company_name, company_info)
+
+        keys = list(pending)
+        chunks = [keys[i:i + batch_size] for i in range(0, len(keys), batch_size)]
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def classify_chunk(chunk_keys):
+            async with semaphore:
+                chunk = {key: pending[key] for key in chunk_keys}
+                classified, tokens = await self._classify_chunk(chunk)
+            retry_keys = [key for key in chunk_keys if key not in classified]
+            if retry_keys:
+                print(f"⚠️ Classification: {len(retry_keys)}/{len(chunk_keys)} items malformed, re-checking individually")
+            for key in retry_keys:
+                company_name, company_info = chunk[key]
+                result = await self._check_company_suitability(company_name, company_info, {})
+                result['_research_text'] = json.dumps(result, ensure_ascii=False)
+                results[key] = result
+            per_item_tokens = tokens // max(1, len(chunk_keys))
+            for key, result in classified.items():
+                results[key] = result
+                if key in cache_keys:
+                    company_name, company_info = chunk[key]
+                    await self._store_cached_research(
+                        cache_keys[key], result, company_name, company_info, per_item_tokens,
+                        prompt_version=self.CLASSIFY_PROMPT_VERSION
+                    )
+
+        await asyncio.gather(*(classify_chunk(chunk) for chunk in chunks))
+        return results
+
+    async def _classify_chunk(self, chunk: Dict[str, tuple]) -> tuple[Dict[str, Dict[str, str]], int]:
+        """
+        One classification request for up to CLASSIFY_BATCH_SIZE companies.
+
+        Returns:
+            (key -> validated result for well-formed items, total tokens of the request)
+        """
+        ids = {str(i): key for i, key in enumerate(chunk)}
+        items = []
+        for item_id, key in ids.items():
+            company_name, company_info = chunk[key]
+            items.append({
+                "id": item_id,
+                "name": company_name,
+                "job": str(company_info.get('title', '') or ''),
+                "location": str(company_info.get('location', '') or ''),
+            })
+        system_prompt = """You classify employers by industry. For every company in the input list:
+1. "industry": short industry name, "Unknown" if unclear.
+2. "is_suitable": false ONLY for IT/software companies or government/public sector (police, ministries, municipal authorities, state agencies); true for everyone else, including unknown industry, banks and private businesses.
+3. "rejection_reason": short reason if not suitable, else "".
+Return JSON: {"results": [{"id": "<input id>", "industry": "...", "is_suitable": true, "rejection_reason": ""}, ...]} with exactly one entry per input id."""
+        user_prompt = json.dumps(items, ensure_ascii=False, separators=(",", ":"))
+        try:
+            response = await self._create_completion(
                 model=self.model,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
                 temperature=1,
-                response_format={"type": "json_object"}
+                response_format=response_format(ClassificationBatch),
+                max_completion_tokens=(
+                    self.MAX_COMPLETION_TOKENS['classify_base'] + self.MAX_COMPLETION_TOKENS['classify_item'] * len(items)
+                ),
+                prompt_cache_key=self._prompt_cache_key(system_prompt)
             )
-            
-            research_text = response.choices[0].message.content
-            
-            # Парсити JSON відповідь
-            try:
-                research_data = json.loads(research_text)
-                field_values = {}
-                
-                # Витягти suitability з research_data
-                field_values['is_suitable'] = research_data.get('is_suitable', False)
-                field_values['industry'] = research_data.get('industry', 'Unknown')
-                field_values['rejection_reason'] = research_data.get('rejection_reason', '')
-                ok, rr = self._suitability_it_or_government_only(
-                    field_values['industry'], field_values['rejection_reason']
-                )
-                field_values['is_suitable'] = ok
-                field_values['rejection_reason'] = rr if not ok else ''
-                
-                # Витягти значення з JSON структури
-                if 'contact' in research_data:
-                    contact_data = research_data['contact']
-                    for field in required_fields or []:
-                        field_key = field.replace('contact.', '') if 'contact.' in field else field
-                        if '.' in field_key:
-                            field_key = field_key.split('.')[-1]
-                        
-                        if field_key in contact_data:
-                            field_values[field] = contact_data[field_key]
-                        elif 'company' in field.lower():
-                            field_values[field] = company_name
-                        else:
-                            field_values[field] = contact_data.get(field_key, "N/A")
-                else:
-                    for field in required_fields or []:
-                        field_key = field.replace('contact.', '') if 'contact.' in field else field
-                        if '.' in field_key:
-                            field_key = field_key.split('.')[-1]
-                        
-                        if field_key in research_data:
-                            field_values[field] = research_data[field_key]
-                        elif 'company' in field.lower():
-                            field_values[field] = company_name
-                        else:
-                            field_values[field] = "N/A"
-                
-                field_values['_research_text'] = research_text
-                return field_values
-            except json.JSONDecodeError:
-                parsed_values = self._parse_research_to_fields(research_text, required_fields, company_name, company_info)
-                parsed_values['is_suitable'] = False
-                parsed_values['industry'] = 'Unknown'
-                parsed_values['rejection_reason'] = 'Failed to parse research data'
-                return parsed_values
-            
         except Exception as e:
-            # Return default values on error
-            default_values = {}
-            if required_fields:
-                for field in required_fields:
-                    default_values[field] = f"Error: {str(e)}"
-            else:
-                default_values['company_description'] = f"Error researching company: {str(e)}"
-            default_values['is_suitable'] = False
-            default_values['industry'] = 'Unknown'
-            default_values['rejection_reason'] = f'Error during research: {str(e)}'
-            return default_values
-    
+            print(f"Error classifying {len(items)} companies: {e}")
+            return {}, 0
+        tokens = int(getattr(response.usage, 'total_tokens', 0) or 0)
+        content = response.choices[0].message.content
+        self.metrics.structured_calls += 1
+        try:
+            ClassificationBatch.model_validate_json(content or "")
+        except ValidationError:
+            # Salvage the valid items below; the rest is re-checked one by one
+            self.metrics.validation_failures += 1
+        try:
+            answer = json.loads(content)
+        except (json.JSONDecodeError, TypeError):
+            return {}, tokens
+
+        classified = {}
+        for item in answer.get('results', []) if isinstance(answer, dict) else []:
+            result = self._validate_classification(item)
+            key = ids.get(str(item.get('id'))) if isinstance(item, dict) else None
+            if result is not None and key is not None:
+                classified[key] = result
+        return classified, tokens
+
+    def _validate_classification(self, item) -> Optional[Dict[str, str]]:
+        """Validated classification of one answer item, or None if the item is malformed."""
+        if not isinstance(item, dict):
+            return None
+        industry = item.get('industry')
+        is_suitable = item.get('is_suitable')
+        rejection_reason = item.get('rejection_reason', '')
+        if not isinstance(industry, str) or not isinstance(is_suitable, bool) or not isinstance(rejection_reason, str):
+            return None
+        ok, rr = self._suitability_it_or_government_only(industry, rejection_reason)
+        result = {'is_suitable': ok, 'industry': industry, 'rejection_reason': rr if not ok else ''}
+        result['_research_text'] = json.dumps(
+            {'industry': industry, 'is_suitable': ok, 'rejection_reason': result['rejection_reason']},
+            ensure_ascii=False
+        )
+        return result
+
     async def _check_company_suitability(
         self,
         company_name: str,
@@ -212,7 +1016,18 @@ Return JSON with industry, is_suitable, rejection_reason (empty if suitable)."""
 3. If industry is unknown or not determined — mark suitable (is_suitable true).
 4. Banks, insurance, hospitals (private), retail, manufacturing, etc. are suitable unless clearly IT or government.
 
-Return your analysis in JSON format."""
+Return JSON:
+{
+  "industry": "specific industry name or Unknown",
+  "is_suitable": true or false,
+  "rejection_reason": "only if not suitable"
+}
+
+Examples:
+- "Deutsche Bank" → {"industry": "Banking", "is_suitable": true, "rejection_reason": ""}
+- "Polizei Berlin" → {"industry": "Government/Police", "is_suitable": false, "rejection_reason": "Government/public sector"}
+- "SAP" → {"industry": "IT", "is_suitable": false, "rejection_reason": "IT company"}
+- "BMW" → {"industry": "Manufacturing", "is_suitable": true, "rejection_reason": ""}"""
             
             # Build context from research data
             research_context = ""
@@ -222,43 +1037,26 @@ Return your analysis in JSON format."""
                     if isinstance(contact, dict):
                         research_context = f"Company data: {json.dumps(contact, ensure_ascii=False)}"
             
-            user_prompt = f"""Analyze this company and determine if it's suitable:
-
-Company name: {company_name}
+            # Only the company goes into the user message, after the cached instructions
+            user_prompt = f"""Company name: {company_name}
 Job title: {company_info.get('title', 'N/A')}
 Location: {company_info.get('location', 'N/A')}
-{research_context}
-
-TASK:
-1. Industry/sector; use "Unknown" if you cannot tell.
-2. is_suitable false ONLY for IT/software OR government/public sector. Unknown industry → is_suitable true.
-
-Return JSON:
-{{
-  "industry": "specific industry name or Unknown",
-  "is_suitable": true or false,
-  "rejection_reason": "only if not suitable"
-}}
-
-Examples:
-- "Deutsche Bank" → {{"industry": "Banking", "is_suitable": true, "rejection_reason": ""}}
-- "Polizei Berlin" → {{"industry": "Government/Police", "is_suitable": false, "rejection_reason": "Government/public sector"}}
-- "SAP" → {{"industry": "IT", "is_suitable": false, "rejection_reason": "IT company"}}
-- "BMW" → {{"industry": "Manufacturing", "is_suitable": true, "rejection_reason": ""}}"""
+{research_context}"""
             
-            response = await self.client.chat.completions.create(
+            result, _ = await self._create_structured(
+                ClassificationResult,
                 model=self.model,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
                 temperature=1,
-                response_format={"type": "json_object"}
+                max_completion_tokens=self.MAX_COMPLETION_TOKENS['suitability'],
+                prompt_cache_key=self._prompt_cache_key(system_prompt)
             )
             
-            result = json.loads(response.choices[0].message.content)
-            industry_str = str(result.get('industry', 'Unknown'))
-            rr_str = str(result.get('rejection_reason', ''))
+            industry_str = result.industry or 'Unknown'
+            rr_str = result.rejection_reason
             ok, rr = self._suitability_it_or_government_only(industry_str, rr_str)
             return {
                 'is_suitable': ok,
@@ -316,6 +1114,7 @@ Examples:
     ) -> str:
         """
         Generate personalized email content by filling template.
+        Concurrent calls for the same company, job title and template share one generation.
         
         Args:
             company_name: Name of the company
@@ -327,21 +1126,36 @@ Examples:
         Returns:
             Generated email content in HTML format
         """
+        key_parts = (
+            normalize_company_name(company_name),
+            str(job_title or "").strip().casefold(),
+            hashlib.sha256((template_content or "").encode("utf-8")).hexdigest(),
+            ",".join(sorted(template_fields or ())),
+        )
+        key = "email\x1f" + "\x1f".join(key_parts)
+        return await self._single_flight(
+            key,
+            lambda: self._generate_email_content(
+                company_name, company_research, job_title, template_content, template_fields
+            )
+        )
+
+    async def _generate_email_content(
+        self, 
+        company_name: str, 
+        company_research: Dict[str, str],
+        job_title: str,
+        template_content: Optional[str] = None,
+        template_fields: Optional[Set[str]] = None
+    ) -> str:
+        """Uncoalesced implementation of generate_email_content."""
         try:
             if template_content:
                 # Перевірити чи є оброблений template
                 processed_template = await self._get_processed_template(template_content)
                 
                 # Підготувати field_values
-                field_values = {}
-                if template_fields:
-                    for field in template_fields:
-                        if field in company_research:
-                            field_values[field] = company_research[field]
-                        elif 'company' in field.lower():
-                            field_values[field] = company_name
-                        else:
-                            field_values[field] = "N/A"
+                field_values = self._build_field_values(company_name, company_research, template_fields)
                 
                 # Перевірити чи template оброблений (має теги)
                 found_tags = re.findall(r'\{\{([A-Z_]+)\}\}', processed_template)
@@ -371,14 +1185,14 @@ TASK: Replace ONLY the main introductory text (after greeting) with personalized
 Return complete HTML with ALL original content preserved."""
                     
                     print(f"📤 Sending FULL template to AI for fallback generation ({len(template_content)} chars)")
-                    response = await self.client.chat.completions.create(
+                    response = await self._create_completion(
                         model=self.model,
                         messages=[
                             {"role": "system", "content": system_prompt},
                             {"role": "user", "content": user_prompt}
                         ],
                         temperature=1,
-                        max_completion_tokens=127000
+                        max_completion_tokens=self.MAX_COMPLETION_TOKENS['template_html']
                     )
                     print(f"📥 Received AI response")
                     
@@ -437,13 +1251,14 @@ Return complete HTML with ALL original content preserved."""
                 showing appreciation for what the company does, and proposing collaboration.
                 Make it personalized based on the company's business type."""
                 
-                response = await self.client.chat.completions.create(
+                response = await self._create_completion(
                     model=self.model,
                     messages=[
                         {"role": "system", "content": system_prompt},
                         {"role": "user", "content": user_prompt}
                     ],
-                    temperature=1
+                    temperature=1,
+                    max_completion_tokens=self.MAX_COMPLETION_TOKENS['text']
                 )
                 
                 return response.choices[0].message.content
@@ -479,13 +1294,14 @@ Return complete HTML with ALL original content preserved."""
         If a field cannot be determined, use: FIELD_NAME: N/A"""
         
         try:
-            response = await self.client.chat.completions.create(
+            response = await self._create_completion(
                 model=self.model,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
-                temperature=1
+                temperature=1,
+                max_completion_tokens=self.MAX_COMPLETION_TOKENS['extract_fields']
             )
             
             # Parse response to extract field values
@@ -720,13 +1536,14 @@ Keep it concise (2-4 paragraphs, 150-250 words).
 Use natural paragraph breaks.
 Focus on: greeting, appreciation for company's work, interest in cooperation - NOT on specific offers or data."""
             
-            response = await self.client.chat.completions.create(
+            response = await self._create_completion(
                 model=self.model,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
-                temperature=1  # Higher for more creativity and uniqueness
+                temperature=1,  # Higher for more creativity and uniqueness
+                max_completion_tokens=self.MAX_COMPLETION_TOKENS['text']
             )
             
             generated_text = response.choices[0].message.content.strip()
@@ -795,14 +1612,14 @@ Return the FULL modified HTML template with tags, then add comment at the end wi
         print(f"📤 Sending template to AI for processing ({len(template_content)} chars)...")
         
         try:
-            response = await self.client.chat.completions.create(
+            response = await self._create_completion(
                 model=self.model,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
                 temperature=1,
-                max_completion_tokens=127000 
+                max_completion_tokens=self.MAX_COMPLETION_TOKENS['template_html']
             )
             
             print(f"📥 AI response received")
@@ -909,7 +1726,16 @@ Return the FULL modified HTML template with tags, then add comment at the end wi
         return modified_template, tags_description
     
     async def _get_processed_template(self, original_template: str) -> str:
-        """Отримує оброблений template (з тегами) або обробляє якщо немає."""
+        """
+        Отримує оброблений template (з тегами) або обробляє якщо немає.
+        Паралельні рядки чекають на першу обробку замість того, щоб запускати власну:
+        файл template і tags_description спільні для всієї задачі.
+        """
+        async with self._template_lock:
+            return await self._load_or_process_template(original_template)
+
+    async def _load_or_process_template(self, original_template: str) -> str:
+        """Читає оброблений template з файлу або обробляє його (викликається під _template_lock)."""
         print(f"🔍 Checking for processed template: {self.temp_template_path.absolute()}")
         print(f"🔍 Template processed flag: {self._template_processed}")
         print(f"🔍 File exists: {self.temp_template_path.exists()}")
@@ -991,10 +1817,24 @@ Return the FULL modified HTML template with tags, then add comment at the end wi
         field_values: Dict[str, str]
     ) -> Dict[str, str]:
         """Генерує JSON зі значеннями для тегів у template."""
+        request = self.build_tags_request(template_with_tags, company_name, company_research, job_title, field_values)
+        if request is None:
+            return {}
+        result, _ = await self._create_structured(tags_model(self._template_tags(template_with_tags)), **request)
+        return result.model_dump(by_alias=True)
+
+    def build_tags_request(
+        self,
+        template_with_tags: str,
+        company_name: str,
+        company_research: Dict[str, str],
+        job_title: str,
+        field_values: Dict[str, str]
+    ) -> Optional[dict]:
+        """Будує запит генерації значень тегів (аргументи chat.completions.create) або None, якщо тегів немає."""
         
         # Витягнути всі теги з template
-        tags = re.findall(r'\{\{([A-Z_]+)\}\}', template_with_tags)
-        unique_tags = list(set(tags))
+        unique_tags = list(self._template_tags(template_with_tags))
         
         print(f"🔍 Searching for tags in template ({len(template_with_tags)} chars)")
         print(f"🔍 Found tags: {unique_tags}")
@@ -1006,7 +1846,7 @@ Return the FULL modified HTML template with tags, then add comment at the end wi
             # Шукати всі можливі теги для дебагу
             all_tags = re.findall(r'\{\{([^}]+)\}\}', template_with_tags)
             print(f"🔍 All {{}} patterns found: {all_tags[:10]}")
-            return {}
+            return None
         
         firstname = field_values.get('contact.FIRSTNAME', field_values.get('FIRSTNAME', ''))
         industry = company_research.get('industry', '')
@@ -1020,30 +1860,28 @@ Return the FULL modified HTML template with tags, then add comment at the end wi
             else:
                 tags_info[tag] = "Personalized content"
         
-        system_prompt = """Generate personalized content for template tags. Return JSON with tag values."""
+        # Tag descriptions are fixed per template: they form the cached prefix, the recipient comes last
+        system_prompt = """Generate personalized content for template tags. Professional, warm tone. German language. Return JSON with tag names as keys.
+
+Generate content for these tags:
+""" + json.dumps(tags_info, indent=2, ensure_ascii=False)
         
         user_prompt = f"""Company: {company_name}
 Recipient: {firstname}
 Job: {job_title}
-Industry: {industry}
-
-Generate content for these tags:
-{json.dumps(tags_info, indent=2, ensure_ascii=False)}
-
-Professional, warm tone. German language. Return JSON with tag names as keys."""
+Industry: {industry}"""
         
-        response = await self.client.chat.completions.create(
+        return dict(
             model=self.model,
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
             temperature=1,
-            response_format={"type": "json_object"},
-            max_completion_tokens=500
+            response_format=response_format(tags_model(tuple(unique_tags))),
+            max_completion_tokens=self.MAX_COMPLETION_TOKENS['tags'],
+            prompt_cache_key=self._prompt_cache_key(system_prompt)
         )
-        
-        return json.loads(response.choices[0].message.content)
     
     def _fill_tags_in_template(
         self,
@@ -1156,13 +1994,14 @@ Return the complete modified HTML template with:
 - ALL placeholders preserved
 - ALL HTML structure preserved"""
             
-            response = await self.client.chat.completions.create(
+            response = await self._create_completion(
                 model=self.model,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
-                temperature=1
+                temperature=1,
+                max_completion_tokens=self.MAX_COMPLETION_TOKENS['template_html']
             )
             
             modified_template = response.choices[0].message.content.strip()
@@ -0,0 +1,124 @@
+"""Token-bucket limiter for OpenAI requests-per-minute and tokens-per-minute limits."""
+
+import asyncio
+import os
+import time
+from typing import Optional
+
+
+class TokenBucketRateLimiter:
+    """
+    Two token buckets (requests and tokens) refilled continuously over a minute.
+
+    `acquire` waits until both buckets can pay for the next request. Token usage is
+    estimated before the call and corrected with the real usage afterwards
+    (`record_usage`), so the bucket may go negative and later callers wait longer.
+    Waiters are served in FIFO order.
+    """
+
+    def __init__(self, rpm: int, tpm: int):
+        """
+        Initialize the limiter.
+
+        Args:
+            rpm: Requests per minute (0 disables the request bucket)
+            tpm: Tokens per minute (0 disables the token bucket)
+        """
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self._paused_until = 0.0  # monotonic time before which no request is let through
+        self.total_wait = 0.0  # seconds spent waiting for capacity
+        self.rate_limit_hits = 0  # 429 responses reported via `on_rate_limited`
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(float(self.rpm), self._requests + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            self._tokens = min(float(self.tpm), self._tokens + elapsed * self.tpm / 60.0)
+
+    def _wait_time(self, tokens: int) -> float:
+        """Seconds until both buckets can pay for a request of `tokens` tokens."""
+        wait = 0.0
+        if self.rpm and self._requests < 1:
+            wait = max(wait, (1 - self._requests) * 60.0 / self.rpm)
+        if self.tpm:
+            # A request larger than the whole bucket only waits for a full bucket
+            needed = min(float(tokens), float(self.tpm))
+            if self._tokens < needed:
+                wait = max(wait, (needed - self._tokens) * 60.0 / self.tpm)
+        return wait
+
+    async def acquire(self, estimated_tokens: int = 0):
+        """
+        Wait for capacity and reserve one request and `estimated_tokens` tokens.
+
+        Args:
+            estimated_tokens: Expected prompt + completion tokens of the request
+        """
+        async with self._lock:
+            while True:
+                self._refill()
+                wait = max(self._wait_time(estimated_tokens), self._paused_until - time.monotonic())
+                if wait <= 0:
+                    break
+                self.total_wait += wait
+                await asyncio.sleep(wait)
+            if self.rpm:
+                self._requests -= 1
+            if self.tpm:
+                self._tokens -= estimated_tokens
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        """
+        Correct the token bucket with the real usage of a finished request.
+
+        Args:
+            estimated_tokens: Value passed to `acquire`
+            actual_tokens: `usage.total_tokens` of the response (None leaves the estimate)
+        """
+        if self.tpm and actual_tokens is not None:
+            self._refill()
+            self._tokens = min(float(self.tpm), self._tokens - (actual_tokens - estimated_tokens))
+
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        """
+        React to a 429: the server's view of our usage is ahead of the local buckets.
+
+        All callers are paused for `retry_after` seconds and both buckets are emptied,
+        so traffic resumes at the refill rate instead of in a burst.
+
+        Args:
+            retry_after: Delay requested by the server (None only empties the buckets)
+        """
+        self._refill()
+        self.rate_limit_hits += 1
+        if self.rpm:
+            self._requests = min(self._requests, 0.0)
+        if self.tpm:
+            self._tokens = min(self._tokens, 0.0)
+        if retry_after:
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+
+_shared_limiter: Optional[TokenBucketRateLimiter] = None
+
+
+def get_shared_rate_limiter() -> TokenBucketRateLimiter:
+    """
+    Process-wide limiter: API limits apply per key, so all jobs share one bucket.
+    Limits come from OPENAI_RPM and OPENAI_TPM (0 disables a bucket).
+    """
+    global _shared_limiter
+    if _shared_limiter is None:
+        _shared_limiter = TokenBucketRateLimiter(
+            rpm=int(os.getenv("OPENAI_RPM", "500")),
+            tpm=int(os.getenv("OPENAI_TPM", "200000")),
+        )
+    return _shared_limiter
@@ -0,0 +1,148 @@
+"""Persistent cache of company research results."""
+
+import hashlib
+import json
+import re
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from modules.DatabaceSQLiteController.async_sq_lite_connector import format_db_datetime
+from modules.DatabaceSQLiteController.migrations import RESEARCH_CACHE_MIGRATIONS_BY_DIALECT, apply_migrations
+
+# Legal-form suffixes that do not distinguish one employer from another
+_LEGAL_FORMS = {
+    "gmbh", "mbh", "ag", "kg", "kgaa", "ohg", "gbr", "ug", "se", "eg", "ek", "ev", "co",
+    "haftungsbeschrankt", "ltd", "limited", "inc", "llc", "plc", "bv", "sarl", "sa", "spa",
+}
+# Dotted abbreviations ("e.V.", "e.K.", "Co.") collapse to one token before splitting
+_DOTTED_FORMS_RE = re.compile(r"\b(e)\.\s*(v|k|g)\.?", re.IGNORECASE)
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _fold(text: str) -> str:
+    """Lower-case and strip diacritics (ä -> a, ß -> ss)."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def normalize_company_name(name: str) -> str:
+    """
+    Normalize a company name for cache lookups.
+
+    "Müller Bau GmbH & Co. KG" and "müller bau gmbh" both become "muller bau".
+
+    Args:
+        name: Company name as written in the input file
+
+    Returns:
+        Lower-cased name without punctuation and legal-form suffixes
+    """
+    text = _DOTTED_FORMS_RE.sub(lambda m: f" {m.group(1)}{m.group(2)} ", _fold(name or ""))
+    tokens = [token for token in _TOKEN_RE.findall(text) if token not in _LEGAL_FORMS]
+    # A name that consists only of legal forms is kept as is
+    return " ".join(tokens) or " ".join(_TOKEN_RE.findall(text))
+
+
+def normalize_location(location: str) -> str:
+    """Lower-case location with collapsed whitespace and no diacritics."""
+    return " ".join(_TOKEN_RE.findall(_fold(str(location or ""))))
+
+
+class ResearchCache:
+    """
+    Database-backed cache of `OpenAIService.research_company` results.
+
+    Entries are keyed on normalized company name, location, prompt version and the set of
+    requested template fields, and expire after `ttl_days`.
+    """
+
+    table_name = "research_cache"
+
+    def __init__(self, db_connector, ttl_days: int = 30):
+        """
+        Initialize research cache.
+
+        Args:
+            db_connector: Database connector (AsyncDBConnector)
+            ttl_days: Entry lifetime in days
+        """
+        self.db_connector = db_connector
+        self.ttl_days = ttl_days
+
+    async def init_table(self):
+        """Create the cache table or migrate it to the current schema."""
+        migrations = RESEARCH_CACHE_MIGRATIONS_BY_DIALECT[self.db_connector.dialect.name]
+        await apply_migrations(self.db_connector, self.table_name, migrations)
+
+    @staticmethod
+    def make_key(company_name: str, location: str, prompt_version: str, required_fields: Optional[Iterable[str]] = None) -> str:
+        """
+        Build the cache key.
+
+        Args:
+            company_name: Company name (normalized here)
+            location: Company location (normalized here)
+            prompt_version: Version of the research prompt; bump it to invalidate old answers
+            required_fields: Template fields the answer was produced for
+
+        Returns:
+            sha256 hex digest of the key parts
+        """
+        parts = (
+            normalize_company_name(company_name),
+            normalize_location(location),
+            str(prompt_version),
+            ",".join(sorted(required_fields or ())),
+        )
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[Dict]:
+        """
+        Get a fresh cache entry.
+
+        Args:
+            key: Key from `make_key`
+
+        Returns:
+            {'field_values': dict, 'tokens': int} or None if missing or expired
+        """
+        cutoff = format_db_datetime(datetime.now() - timedelta(days=self.ttl_days))
+        row = await self.db_connector.fetch_one(
+            f"SELECT field_values, tokens FROM {self.table_name} WHERE cache_key = ? AND created_at > ?",
+            (key, cutoff)
+        )
+        if not row:
+            return None
+        try:
+            return {"field_values": json.loads(row["field_values"]), "tokens": int(row["tokens"] or 0)}
+        except (TypeError, ValueError):
+            return None
+
+    async def set(self, key: str, field_values: Dict, company_name: str = "", location: str = "", prompt_version: str = "", tokens: int = 0):
+        """
+        Store research result.
+
+        Args:
+            key: Key from `make_key`
+            field_values: Parsed research result as returned by `research_company`
+            company_name: Original company name (for reference)
+            location: Original location (for reference)
+            prompt_version: Prompt version the answer was produced with
+            tokens: Tokens the API call cost (reported as savings on later hits)
+        """
+        query = self.db_connector.dialect.upsert(
+            self.table_name,
+            ("cache_key", "company_name", "location", "prompt_version", "field_values", "tokens", "created_at"),
+            "cache_key"
+        )
+        await self.db_connector.execute_query(query, (
+            key, company_name, str(location or ""), prompt_version,
+            json.dumps(field_values, ensure_ascii=False, default=str), tokens,
+            format_db_datetime(datetime.now())
+        ))
+
+    async def purge_expired(self):
+        """Delete expired entries."""
+        cutoff = format_db_datetime(datetime.now() - timedelta(days=self.ttl_days))
+        await self.db_connector.execute_query(f"DELETE FROM {self.table_name} WHERE created_at <= ?", (cutoff,))
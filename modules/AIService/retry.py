@@ -0,0 +1,164 @@
+"""Retry policy for OpenAI calls: Retry-After, exponential backoff with jitter, per-call deadline."""
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Optional
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+# Error classes with their own retry budgets
+RATE_LIMIT = "rate_limit"
+SERVER = "server"
+TIMEOUT = "timeout"
+CONNECTION = "connection"
+
+
+def classify_error(error: BaseException) -> Optional[str]:
+    """
+    Map an exception of the OpenAI client to a retryable error class.
+
+    Args:
+        error: Exception raised by the call
+
+    Returns:
+        One of RATE_LIMIT, SERVER, TIMEOUT, CONNECTION or None if the error is not retryable
+    """
+    if isinstance(error, openai.RateLimitError):
+        return RATE_LIMIT
+    if isinstance(error, (openai.APITimeoutError, asyncio.TimeoutError)):
+        return TIMEOUT
+    if isinstance(error, openai.APIConnectionError):
+        return CONNECTION
+    if isinstance(error, openai.APIStatusError) and (error.status_code >= 500 or error.status_code in (408, 409)):
+        return SERVER
+    return None
+
+
+def parse_retry_after(error: BaseException) -> Optional[float]:
+    """
+    Read the server-requested delay from `retry-after-ms` / `retry-after` headers.
+
+    Args:
+        error: Exception raised by the call (only APIStatusError carries headers)
+
+    Returns:
+        Delay in seconds or None if the response has no usable header
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000.0)
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        # HTTP-date form: "Wed, 21 Oct 2015 07:28:00 GMT"
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class RetryPolicy:
+    """
+    How completion calls are retried.
+
+    Every error class has its own budget, so a burst of 429s does not use up the
+    retries meant for a flaky connection. The delay is the server's Retry-After when
+    present, otherwise exponential backoff with full jitter. No attempt starts after
+    the per-call deadline. Time spent waiting for the rate limiter does not count
+    against the deadline, only requests and backoff sleeps do.
+    """
+
+    budgets: Dict[str, int] = field(default_factory=lambda: {
+        RATE_LIMIT: 6,
+        SERVER: 4,
+        TIMEOUT: 2,
+        CONNECTION: 3,
+    })
+    base_delay: float = 1.0  # seconds, first backoff step
+    max_delay: float = 60.0  # cap of one backoff step
+    deadline: float = 180.0  # seconds for the whole call, retries included
+    long_deadline: float = 600.0  # calls that generate a whole HTML template (the client's own timeout)
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential delay for the given 1-based retry number."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def delay_for(self, error: BaseException, attempt: int) -> float:
+        """Delay before the next attempt: Retry-After if the server sent one, else backoff."""
+        retry_after = parse_retry_after(error)
+        if retry_after is not None:
+            # A little jitter keeps concurrent workers from retrying in the same instant
+            return min(retry_after, self.max_delay) + random.uniform(0, self.base_delay / 4)
+        return self.backoff(attempt)
+
+    async def call(
+        self,
+        func: Callable[[], Awaitable],
+        on_retry: Optional[Callable[[str, BaseException, float], None]] = None,
+        acquire: Optional[Callable[[], Awaitable]] = None,
+        deadline: Optional[float] = None
+    ):
+        """
+        Run `func` with retries.
+
+        Args:
+            func: Factory of one attempt (called again for every retry)
+            on_retry: Callback(error_class, error, delay) invoked before each retry sleep
+            acquire: Waits for rate-limiter capacity before every attempt; this wait is not
+                counted against the deadline
+            deadline: Seconds for this call (default: `self.deadline`)
+
+        Returns:
+            Result of the first successful attempt
+
+        Raises:
+            The last error when it is not retryable, its budget is used up or the deadline passed
+        """
+        deadline = deadline or self.deadline
+        started = time.monotonic()
+        queued = 0.0  # seconds spent in `acquire`
+        attempts: Dict[str, int] = {}
+        while True:
+            if acquire is not None:
+                queue_started = time.monotonic()
+                await acquire()
+                queued += time.monotonic() - queue_started
+            remaining = deadline - (time.monotonic() - started - queued)
+            try:
+                return await asyncio.wait_for(func(), timeout=max(remaining, 0.001))
+            except Exception as err:
+                error_class = classify_error(err)
+                if error_class is None:
+                    raise
+                attempts[error_class] = attempts.get(error_class, 0) + 1
+                if attempts[error_class] > self.budgets.get(error_class, 0):
+                    logger.warning(f"Retry budget for {error_class} exhausted: {err}")
+                    raise
+                delay = self.delay_for(err, attempts[error_class])
+                if time.monotonic() - started - queued + delay >= deadline:
+                    logger.warning(f"Call deadline of {deadline:.1f}s reached: {err}")
+                    raise
+                if on_retry:
+                    on_retry(error_class, err, delay)
+                logger.info(f"Retrying after {error_class} in {delay:.1f}s ({attempts[error_class]}/{self.budgets[error_class]})")
+                await asyncio.sleep(delay)
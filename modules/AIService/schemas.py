@@ -0,0 +1,109 @@
+"""Pydantic models of every LLM response and their strict JSON schemas for `response_format`."""
+
+import copy
+from functools import lru_cache
+from typing import Iterable, List, Tuple, Type
+
+from pydantic import BaseModel, ConfigDict, Field, create_model
+
+
+class _StrictModel(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+
+class ClassificationResult(_StrictModel):
+    """Suitability decision of one company (research without template fields, suitability check)."""
+
+    industry: str
+    is_suitable: bool
+    rejection_reason: str
+
+
+class ClassificationItem(_StrictModel):
+    """One entry of a multi-company classification answer."""
+
+    id: str
+    industry: str
+    is_suitable: bool
+    rejection_reason: str
+
+
+class ClassificationBatch(_StrictModel):
+    """Answer of the multi-company classifier."""
+
+    results: List[ClassificationItem]
+
+
+def _string_fields(name: str, keys: Iterable[str]) -> Type[BaseModel]:
+    """
+    Model with one required string per key.
+
+    Keys come from templates and may be any text, so fields get safe Python names and
+    the key itself as the alias (schemas and validation use aliases).
+    """
+    fields = {f"field_{i}": (str, Field(alias=key)) for i, key in enumerate(keys)}
+    return create_model(name, __base__=_StrictModel, **fields)
+
+
+@lru_cache(maxsize=64)
+def research_model(contact_keys: Tuple[str, ...]) -> Type[BaseModel]:
+    """Research answer with template contact fields (decision first: cheap for unsuitable companies)."""
+    return create_model(
+        "ResearchResult",
+        __base__=ClassificationResult,
+        contact=(_string_fields("ResearchContact", contact_keys), ...),
+    )
+
+
+@lru_cache(maxsize=64)
+def tags_model(tags: Tuple[str, ...]) -> Type[BaseModel]:
+    """Values of template tags ({{MAIN_MAIL}} -> "MAIN_MAIL")."""
+    return _string_fields("TemplateTags", tags)
+
+
+@lru_cache(maxsize=64)
+def combined_model(contact_keys: Tuple[str, ...], tags: Tuple[str, ...]) -> Type[BaseModel]:
+    """Research + suitability + tag values in one answer."""
+    return create_model(
+        "CompanyEmail",
+        __base__=ClassificationResult,
+        contact=(_string_fields("CompanyEmailContact", contact_keys), ...),
+        tags=(tags_model(tags), ...),
+    )
+
+
+def _make_strict(schema: dict) -> dict:
+    """Strict structured outputs: every property required, no additional properties, no titles/defaults."""
+    for key in ("title", "description", "default"):
+        schema.pop(key, None)
+    for definition in schema.get("$defs", {}).values():
+        _make_strict(definition)
+    if schema.get("type") == "object" and "properties" in schema:
+        schema["additionalProperties"] = False
+        schema["required"] = list(schema["properties"])
+        for prop in schema["properties"].values():
+            _make_strict(prop)
+    if isinstance(schema.get("items"), dict):
+        _make_strict(schema["items"])
+    return schema
+
+
+@lru_cache(maxsize=128)
+def _strict_schema(model: Type[BaseModel]) -> dict:
+    return _make_strict(model.model_json_schema(by_alias=True))
+
+
+class StructuredOutputError(ValueError):
+    """The model answer did not validate against the schema even after a retry."""
+
+    def __init__(self, message: str, content: str = ""):
+        super().__init__(message)
+        self.content = content  # last raw answer, for lenient fallback parsing
+
+
+def response_format(model: Type[BaseModel]) -> dict:
+    """`response_format` argument that makes the API return JSON valid for `model`."""
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": model.__name__, "strict": True, "schema": copy.deepcopy(_strict_schema(model))},
+    }
@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+
+class CaptchaBudgetExceeded(Exception):
+    """Бюджет сесії на розв'язання капч вичерпано (або на балансі провайдерів немає коштів)."""
+
+
+@dataclass
+class CaptchaProviderStats:
+    """Статистика роботи одного провайдера капч."""
+    name: str
+    requests: int = 0 # кількість запитів на розв'язання
+    wins: int = 0 # кількість разів, коли відповідь провайдера прийшла першою
+    errors: int = 0 # кількість помилок сервісу
+    accepted: int = 0 # відповіді, прийняті сайтом
+    rejected: int = 0 # відповіді, відхилені сайтом (kontaktdaten-captcha-input-fehler)
+    latency_ewma: Optional[float] = None # згладжена затримка відповіді, секунди
+    spent: float = 0.0 # витрачено за сесію, USD
+
+    @property
+    def acceptance_rate(self) -> float:
+        """Частка прийнятих відповідей (зі згладжуванням Лапласа, щоб новий провайдер мав шанс)."""
+        return (self.accepted + 1) / (self.accepted + self.rejected + 2)
+
+    @property
+    def score(self) -> float:
+        """Оцінка для маршрутизації: чим вища точність і нижча затримка, тим краще."""
+        latency = self.latency_ewma if self.latency_ewma is not None else 1.0
+        return self.acceptance_rate / max(latency, 0.5)
+
+
+class CaptchaBroker:
+    """
+    Брокер для розв'язання текстових капч кількома провайдерами.
+
+    Провайдер - будь-який об'єкт з атрибутами `name`, `cost_per_captcha` та асинхронними методами
+    `solve_text_captcha(image)` (повертає {'code', 'captchaId'}) і `report_result(id, is_correct)`.
+    Опціонально `get_balance_value()` для контролю балансу.
+
+    - hedge=True: якщо найкращий провайдер відповідає довше звичного, те саме зображення
+      відправляється наступному, береться перша відповідь;
+    - статистика затримки та точності (за сигналом сайту) визначає порядок провайдерів;
+    - max_session_spend обмежує витрати за одну сесію парсера.
+    """
+
+    def __init__(
+        self,
+        providers: list,
+        hedge: bool = True,
+        max_session_spend: Optional[float] = None,
+        min_balance: float = 0.0,
+        min_samples: int = 5,
+        ewma_alpha: float = 0.3,
+        hedge_factor: float = 1.5,
+        default_hedge_delay: float = 20.0,
+        logger: logging.Logger | None = None
+    ):
+        """
+        :param providers: Список провайдерів капч.
+        :param hedge: Чи підключати резервного провайдера, коли основний затримується або повертає помилку.
+        :param max_session_spend: Максимальні витрати за сесію в USD (None - без обмеження).
+        :param min_balance: Мінімальний залишок на балансі провайдера, нижче якого він не використовується.
+        :param min_samples: Кількість оцінених відповідей, поки провайдер вважається "новим" і отримує пріоритет.
+        :param ewma_alpha: Коефіцієнт згладжування затримки.
+        :param hedge_factor: Резервний провайдер запускається після hedge_factor * звичної затримки основного.
+        :param default_hedge_delay: Затримка запуску резервного провайдера, поки статистики ще немає (секунди).
+        """
+        self.providers = list(providers)
+        self.hedge = hedge
+        self.max_session_spend = max_session_spend
+        self.min_balance = min_balance
+        self.min_samples = min_samples
+        self.ewma_alpha = ewma_alpha
+        self.hedge_factor = hedge_factor
+        self.default_hedge_delay = default_hedge_delay
+        self.logger = logger if logger else logging.getLogger(__name__)
+
+        self.stats = {provider.name: CaptchaProviderStats(provider.name) for provider in self.providers}
+        self.balances = {} # останній відомий баланс провайдерів
+        self.session_spend = 0.0
+
+    async def start_session(self):
+        """
+        Починає нову сесію: обнуляє витрати та оновлює баланси провайдерів.
+        """
+        self.session_spend = 0.0
+        for stats in self.stats.values():
+            stats.spent = 0.0
+
+        for provider in self.providers:
+            if not hasattr(provider, "get_balance_value"):
+                continue
+            try:
+                self.balances[provider.name] = await provider.get_balance_value()
+            except Exception as e:
+                self.logger.warning(f"CaptchaBroker [start_session]: не вдалося отримати баланс {provider.name}: {e}")
+
+    def _cost(self, provider) -> float:
+        return float(getattr(provider, "cost_per_captcha", 0.0) or 0.0)
+
+    def _is_affordable(self, provider, extra_spend: float = 0.0) -> bool:
+        cost = self._cost(provider)
+        balance = self.balances.get(provider.name)
+        if balance is not None and balance - cost < self.min_balance:
+            return False
+        if self.max_session_spend is not None and self.session_spend + extra_spend + cost > self.max_session_spend:
+            return False
+        return True
+
+    def ranked_providers(self) -> list:
+        """
+        Повертає провайдерів у порядку пріоритету.
+        Провайдери з малою кількістю оцінок йдуть першими (дослідження), далі - за оцінкою score.
+        """
+        def sort_key(provider):
+            stats = self.stats[provider.name]
+            samples = stats.accepted + stats.rejected
+            return (samples >= self.min_samples, -stats.score)
+
+        return sorted(self.providers, key=sort_key)
+
+    def _select_providers(self) -> list:
+        selected = []
+        planned_spend = 0.0
+        for provider in self.ranked_providers():
+            if not self._is_affordable(provider, planned_spend):
+                continue
+            selected.append(provider)
+            planned_spend += self._cost(provider)
+            if len(selected) >= (2 if self.hedge else 1):
+                break
+        return selected
+
+    def _charge(self, provider):
+        cost = self._cost(provider)
+        self.session_spend += cost
+        self.stats[provider.name].spent += cost
+        if provider.name in self.balances:
+            self.balances[provider.name] -= cost
+
+    async def _solve_with(self, provider, image: str) -> dict:
+        stats = self.stats[provider.name]
+        stats.requests += 1
+        self._charge(provider)
+        started = time.monotonic()
+        try:
+            result = await provider.solve_text_captcha(image)
+        except Exception:
+            stats.errors += 1
+            raise
+
+        latency = time.monotonic() - started
+        if stats.latency_ewma is None:
+            stats.latency_ewma = latency
+        else:
+            stats.latency_ewma = self.ewma_alpha * latency + (1 - self.ewma_alpha) * stats.latency_ewma
+        return {**result, "provider": provider.name}
+
+    def _hedge_delay(self, provider) -> float:
+        """Через скільки секунд без відповіді основного провайдера запускати резервний."""
+        latency = self.stats[provider.name].latency_ewma
+        if latency is None:
+            return self.default_hedge_delay
+        return latency * self.hedge_factor
+
+    async def solve(self, image: str) -> dict:
+        """
+        Розв'язує капчу найкращим провайдером.
+        При hedge резервний провайдер запускається, якщо основний не відповів за звичний для нього час
+        або повернув помилку; використовується перша успішна відповідь.
+        :param image: Посилання або шлях до зображення капчі.
+        :return: {'code', 'captchaId', 'provider'} - перша успішна відповідь.
+        :raises CaptchaBudgetExceeded: Якщо жоден провайдер не вкладається в бюджет.
+        :raises Exception: Якщо всі обрані провайдери повернули помилку.
+        """
+        selected = self._select_providers()
+        if not selected:
+            raise CaptchaBudgetExceeded(
+                f"Бюджет на капчі вичерпано: витрачено {self.session_spend:.4f} USD за сесію."
+            )
+
+        primary, reserve = selected[0], selected[1:]
+        tasks = {asyncio.create_task(self._solve_with(primary, image)): primary}
+        pending = set(tasks)
+        errors = []
+        try:
+            while pending:
+                timeout = self._hedge_delay(primary) if reserve else None
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    provider = tasks[task]
+                    if task.exception():
+                        errors.append(f"{provider.name}: {task.exception()}")
+                        continue
+                    self.stats[provider.name].wins += 1
+                    return task.result()
+
+                # Основний провайдер затримується або повернув помилку - підключаємо резервний
+                if reserve and (not done or not pending):
+                    provider = reserve.pop(0)
+                    if self._is_affordable(provider):
+                        task = asyncio.create_task(self._solve_with(provider, image))
+                        tasks[task] = provider
+                        pending.add(task)
+        finally:
+            # Запити, які програли гонку, більше не потрібні
+            for task in pending:
+                task.cancel()
+
+        raise Exception(f"Жоден провайдер не розв'язав капчу: {'; '.join(errors)}")
+
+    async def report(self, result: dict, is_correct: bool):
+        """
+        Записує результат перевірки відповіді сайтом і передає його провайдеру.
+        :param result: Відповідь, отримана з методу solve.
+        :param is_correct: True, якщо сайт прийняв відповідь.
+        """
+        name = result.get("provider")
+        provider = next((p for p in self.providers if p.name == name), None)
+        if not provider:
+            return
+
+        if is_correct:
+            self.stats[name].accepted += 1
+        else:
+            self.stats[name].rejected += 1
+
+        try:
+            await provider.report_result(result["captchaId"], is_correct)
+        except Exception as e:
+            self.logger.warning(f"CaptchaBroker [report]: {name} - {e}")
+
+    def get_stats(self) -> List[CaptchaProviderStats]:
+        """Повертає статистику провайдерів у порядку пріоритету."""
+        return [self.stats[provider.name] for provider in self.ranked_providers()]
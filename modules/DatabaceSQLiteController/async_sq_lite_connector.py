@@ -1,37 +1,107 @@
 import aiosqlite
 import asyncio
 import logging
-from typing import List, Dict, Optional
+import re
+from collections import deque
+from contextlib import aclosing, asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Dict, Optional
 from datetime import datetime, timedelta
 
 from config import SQL_LITE_LOG_PATH, EMAIL_RESEND_COOLDOWN_DAYS
+from modules.DatabaceSQLiteController.migrations import ADVERTS_MIGRATIONS_BY_DIALECT, SENT_EMAILS_MIGRATIONS_BY_DIALECT, apply_migrations, validate_identifier
+from modules.DatabaseController.async_base import SQLITE_DIALECT, AsyncDBConnector
 from modules.MainLogger.logger import setup_logger_from_yaml
 
 # Налаштування логування
 log_path = SQL_LITE_LOG_PATH
 logger_t = setup_logger_from_yaml(log_path=log_path)
 
-class AsyncSQLiteConnector:
+# Оператори BOOLEAN MODE MySQL, які прибираються з тексту користувача
+_MYSQL_FULLTEXT_OPERATORS = re.compile(r'[+\-<>()~*"@]')
+
+def format_db_datetime(value: datetime) -> str:
+    """Формат дати й часу, в якому вони зберігаються в базі (сортується як рядок)."""
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+@dataclass
+class _WriteOperation:
+    """
+    Одна операція запису в черзі: список (запит, параметри, executemany) та future для підтвердження.
+    Усі запити операції застосовуються разом або не застосовуються взагалі.
+    Операція з exclusive (async-функція, що отримує підключення) виконується окремо, поза транзакцією.
+    """
+    statements: List[tuple]
+    future: asyncio.Future
+    exclusive: Optional[Callable[[aiosqlite.Connection], Awaitable[Any]]] = None
+
+class AsyncSQLiteConnector(AsyncDBConnector):
     """
     Асинхронний клас для роботи з SQLite базою даних.
+    База працює в режимі WAL: усі зміни йдуть через чергу єдиного записувача, який фіксує їх групами
+    (group commit), читання - через пул підключень лише для читання, тому звіти не блокують запис і навпаки.
     """
+
+    dialect = SQLITE_DIALECT
+
+    # Налаштування, спільні для всіх підключень
+    common_pragmas = (
+        "PRAGMA cache_size = -64000",  # ~64 МБ кешу сторінок
+        "PRAGMA mmap_size = 268435456",  # 256 МБ memory-mapped I/O
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA busy_timeout = 5000",
+    )
+    writer_pragmas = (
+        "PRAGMA journal_mode = WAL",
+        "PRAGMA synchronous = NORMAL",  # у режимі WAL безпечно і значно швидше за FULL
+    )
     
-    def __init__(self, file_name: str):
+    def __init__(self, file_name: str, read_pool_size: int = 4, write_queue_size: int = 1000, commit_interval: float = 0.005, max_batch_operations: int = 200):
         """
         Ініціалізація AsyncSQLiteConnector.
         :param file_name: назва файлу бази даних
+        :param read_pool_size: кількість підключень для читання (0 - читання через підключення-записувач)
+        :param write_queue_size: максимальна кількість операцій запису в черзі; коли черга заповнена,
+                                 виклики запису чекають (backpressure)
+        :param commit_interval: скільки секунд записувач збирає операції в одну транзакцію
+        :param max_batch_operations: максимальна кількість операцій в одній транзакції
         """
         self.file_name = file_name
+        self.read_pool_size = read_pool_size
+        self.write_queue_size = write_queue_size
+        self.commit_interval = commit_interval
+        self.max_batch_operations = max_batch_operations
         self.lock = asyncio.Lock()
         self.connection = None
+        self._readers: List[aiosqlite.Connection] = []
+        self._readers_queue: Optional[asyncio.Queue] = None
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
 
     async def connect(self):
         """
-        Встановлює підключення до SQLite бази даних.
+        Встановлює підключення до SQLite бази даних: одне для запису та пул для читання.
         """
         try:
             self.connection = await aiosqlite.connect(f"{self.file_name}.db")
             self.connection.row_factory = aiosqlite.Row
+            for pragma in (*self.writer_pragmas, *self.common_pragmas):
+                await self.connection.execute(pragma)
+
+            self._readers_queue = asyncio.Queue()
+            reader_uri = f"{Path(f'{self.file_name}.db').absolute().as_uri()}?mode=ro"
+            for _ in range(self.read_pool_size):
+                reader = await aiosqlite.connect(reader_uri, uri=True)
+                reader.row_factory = aiosqlite.Row
+                for pragma in (*self.common_pragmas, "PRAGMA query_only = ON"):
+                    await reader.execute(pragma)
+                self._readers.append(reader)
+                self._readers_queue.put_nowait(reader)
+
+            self._write_queue = asyncio.Queue(maxsize=self.write_queue_size)
+            self._writer_task = asyncio.create_task(self._writer_loop())
             logger_t.info("Асинхронне підключення до SQLite бази даних встановлено.")
         except Exception as err:
             logger_t.error(f"Помилка підключення до бази даних: {err}")
@@ -40,38 +110,271 @@ class AsyncSQLiteConnector:
     async def disconnect(self):
         """
         Закриває підключення до бази даних.
+        Перед закриттям записувач застосовує всі операції, що залишилися в черзі.
         """
+        if self._writer_task:
+            await self._write_queue.put(None)
+            await self._writer_task
+            self._writer_task = None
+            self._write_queue = None
+        for reader in self._readers:
+            await reader.close()
+        self._readers = []
+        self._readers_queue = None
         if self.connection:
             await self.connection.close()
             logger_t.info("Підключення до SQLite бази даних закрито.")
 
-    async def execute_query(self, query: str, params: Optional[tuple] = None):
+    @asynccontextmanager
+    async def _read_connection(self):
         """
-        Виконує запит до бази даних (без повернення результату).
+        Видає підключення для читання з пулу.
+        Без пулу читання виконується через підключення-записувач під lock.
+        """
+        if not self._readers:
+            async with self.lock:
+                yield self.connection
+            return
+
+        reader = await self._readers_queue.get()
+        try:
+            yield reader
+        finally:
+            self._readers_queue.put_nowait(reader)
+
+    async def _enqueue_write(self, statements: List[tuple]) -> Any:
+        """
+        Ставить операцію запису в чергу і чекає, поки записувач її застосує та зафіксує.
+        Якщо черга заповнена, чекає на вільне місце.
+        :param statements: Список (запит, параметри, executemany).
+        :raises Exception: Помилка застосування операції (операція відкочена).
+        """
+        if not self._writer_task or self._writer_task.done():
+            raise RuntimeError("Підключення до бази даних не встановлено або записувач зупинено.")
+        future = asyncio.get_running_loop().create_future()
+        await self._enqueue_operation(_WriteOperation(statements, future))
+        return await future
+
+    async def run_exclusive(self, func: Callable[[aiosqlite.Connection], Awaitable[Any]]) -> Any:
+        """
+        Виконує func(connection) на підключенні-записувачі між групами записів, поза транзакцією.
+        Для операцій, які не можна виконувати в транзакції (ATTACH, VACUUM, PRAGMA auto_vacuum).
+        func сама відповідає за commit/rollback своїх змін.
+        :return: Результат func.
         """
+        if not self._writer_task or self._writer_task.done():
+            raise RuntimeError("Підключення до бази даних не встановлено або записувач зупинено.")
+        future = asyncio.get_running_loop().create_future()
+        await self._enqueue_operation(_WriteOperation([], future, exclusive=func))
+        return await future
+
+    async def _enqueue_operation(self, operation: _WriteOperation):
+        writer_task = self._writer_task
+        await self._write_queue.put(operation)
+        # Поки чекали на місце в черзі, записувач міг зупинитися - тоді операцію вже ніхто не виконає
+        if writer_task.done() and not operation.future.done():
+            operation.future.set_exception(RuntimeError("Записувач бази даних зупинено."))
+
+    @staticmethod
+    def _fail_operations(operations: List[Optional[_WriteOperation]], err: BaseException):
+        """Завершує з помилкою всі ще не завершені операції."""
+        for operation in operations:
+            if operation is not None and not operation.future.done():
+                operation.future.set_exception(err)
+
+    def _fail_queued_operations(self, err: BaseException):
+        """Забирає з черги всі операції, що залишилися, і завершує їх з помилкою."""
+        while True:
+            try:
+                operation = self._write_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            self._fail_operations([operation], err)
+
+    async def _run_exclusive_operation(self, operation: _WriteOperation):
+        if operation.future.done():
+            return
         async with self.lock:
             try:
-                async with self.connection.execute(query, params or ()) as cursor:
-                    await self.connection.commit()
+                result = await operation.exclusive(self.connection)
             except Exception as err:
-                logger_t.error(f"Помилка виконання запиту: {err}")
+                logger_t.error(f"Помилка виконання операції на підключенні-записувачі: {err}")
+                await self._safe_rollback()
+                if not operation.future.done():
+                    operation.future.set_exception(err)
+                return
+        if not operation.future.done():
+            operation.future.set_result(result)
+
+    async def _safe_rollback(self):
+        """Відкат транзакції записувача; помилка відкату лише записується в лог."""
+        try:
+            if self.connection.in_transaction:
                 await self.connection.rollback()
+        except Exception as err:
+            logger_t.error(f"Помилка відкату транзакції записувача: {err}")
+
+    async def _writer_loop(self):
+        """
+        Єдиний записувач: забирає операції з черги і фіксує їх групами -
+        одна транзакція на commit_interval секунд або max_batch_operations операцій.
+        Помилка однієї групи завершує з помилкою лише її операції, записувач працює далі.
+        Коли записувач зупиняється, операції, що залишилися в черзі, завершуються з помилкою.
+        """
+        loop = asyncio.get_running_loop()
+        stopping = False
+        batch: List[_WriteOperation] = []
+        exclusive_operation = None
+        try:
+            while not stopping:
+                operation = await self._write_queue.get()
+                if operation is None:
+                    break
+                batch, exclusive_operation = [], None
+                try:
+                    if operation.exclusive:
+                        exclusive_operation = operation
+                    else:
+                        batch.append(operation)
+                        deadline = loop.time() + self.commit_interval
+                        while len(batch) < self.max_batch_operations:
+                            try:
+                                operation = self._write_queue.get_nowait()
+                            except asyncio.QueueEmpty:
+                                timeout = deadline - loop.time()
+                                if timeout <= 0:
+                                    break
+                                try:
+                                    operation = await asyncio.wait_for(self._write_queue.get(), timeout)
+                                except asyncio.TimeoutError:
+                                    break
+                            if operation is None:
+                                stopping = True
+                                break
+                            if operation.exclusive:
+                                exclusive_operation = operation
+                                break
+                            batch.append(operation)
+                        await self._commit_batch(batch)
+                    if exclusive_operation:
+                        await self._run_exclusive_operation(exclusive_operation)
+                except Exception as err:
+                    logger_t.error(f"Помилка записувача бази даних: {err}")
+                    self._fail_operations([*batch, exclusive_operation], err)
+        finally:
+            # Операції, які виконувались у момент зупинки (скасування задачі), та ті, що чекають у черзі
+            stopped = RuntimeError("Записувач бази даних зупинено.")
+            self._fail_operations([*batch, exclusive_operation], stopped)
+            self._fail_queued_operations(stopped)
+
+    async def _commit_batch(self, batch: List[_WriteOperation]):
+        """
+        Застосовує групу операцій в одній транзакції.
+        Кожна операція виконується в окремому SAVEPOINT, тому помилка однієї
+        відкочує лише її, а решта фіксуються.
+        """
+        results: List[tuple] = []
+        async with self.lock:
+            try:
+                if self.connection.in_transaction:
+                    # Залишок попередньої групи, яку не вдалося відкотити
+                    await self.connection.rollback()
+                await self.connection.execute("BEGIN")
+                for operation in batch:
+                    if operation.future.done():  # виклик скасовано, поки операція чекала в черзі
+                        results.append((operation, None))
+                        continue
+                    await self.connection.execute("SAVEPOINT write_operation")
+                    try:
+                        for query, params, many in operation.statements:
+                            if many:
+                                await self.connection.executemany(query, params)
+                            else:
+                                await self.connection.execute(query, params or ())
+                        await self.connection.execute("RELEASE write_operation")
+                        results.append((operation, None))
+                    except Exception as err:
+                        await self.connection.execute("ROLLBACK TO write_operation")
+                        await self.connection.execute("RELEASE write_operation")
+                        results.append((operation, err))
+                await self.connection.commit()
+            except Exception as err:
+                logger_t.error(f"Помилка фіксації групи з {len(batch)} операцій запису: {err}")
+                await self._safe_rollback()
+                results = [(operation, err) for operation in batch]
+
+        for operation, err in results:
+            if operation.future.done():
+                continue
+            if err is None:
+                operation.future.set_result(None)
+            else:
+                operation.future.set_exception(err)
+        logger_t.debug(f"Зафіксовано групу з {len(batch)} операцій запису.")
+
+    async def execute_query(self, query: str, params: Optional[tuple] = None):
+        """
+        Виконує запит до бази даних (без повернення результату).
+        Запит йде через чергу записувача; метод повертається після фіксації транзакції.
+        """
+        try:
+            await self._enqueue_write([(query, params, False)])
+        except Exception as err:
+            logger_t.error(f"Помилка виконання запиту: {err}")
+
+    async def execute_many(self, query: str, params_list: List[tuple]):
+        """
+        Виконує один запит для набору параметрів (executemany) як одну операцію.
+        При помилці операція відкочується, а виняток передається далі.
+        """
+        try:
+            await self._enqueue_write([(query, params_list, True)])
+        except Exception as err:
+            logger_t.error(f"Помилка пакетного виконання запиту: {err}")
+            raise
+
+    async def execute_transaction(self, statements: List[tuple]):
+        """
+        Виконує кілька запитів як одну операцію (включно з DDL).
+        :param statements: Список пар (запит, параметри або None).
+        При помилці операція відкочується, а виняток передається далі.
+        """
+        try:
+            await self._enqueue_write([(query, params, False) for query, params in statements])
+        except Exception as err:
+            logger_t.error(f"Помилка виконання транзакції: {err}")
+            raise
 
     async def fetch_all(self, query: str, params: Optional[tuple] = None) -> List[Dict]:
         """
         Виконує запит та повертає всі результати.
         """
-        async with self.lock:
+        async with self._read_connection() as connection:
             try:
-                async with self.connection.execute(query, params or ()) as cursor:
+                async with connection.execute(query, params or ()) as cursor:
                     rows = await cursor.fetchall()
                     results = [dict(row) for row in rows]
-                    print(f"Отримано {len(results)} результатів.")
+                    logger_t.debug(f"Отримано {len(results)} результатів.")
                     return results
             except Exception as err:
                 logger_t.error(f"Помилка виконання запиту: {err}")
                 return []
 
+    async def iterate(self, query: str, params: Optional[tuple] = None, batch_size: int = 500) -> AsyncIterator[List[Dict]]:
+        """
+        Виконує запит і повертає результати частинами (fetchmany), не завантажуючи їх усі в пам'ять.
+        Підключення для читання зайняте, доки генератор не буде вичерпано або закрито.
+        :param batch_size: Кількість рядків в одній частині.
+        :return: Асинхронний генератор списків словників.
+        """
+        async with self._read_connection() as connection:
+            async with connection.execute(query, params or ()) as cursor:
+                while True:
+                    rows = await cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield [dict(row) for row in rows]
+
     async def fetch_one(self, query: str, params: Optional[tuple] = None) -> Optional[dict]:
         """
         Виконує запит та повертає перший результат.
@@ -79,8 +382,8 @@ class AsyncSQLiteConnector:
         :param params: Параметри для запиту
         :return: Результат у вигляді словника або None
         """
-        async with self.lock:
-            async with self.connection.execute(query, params or ()) as cursor:
+        async with self._read_connection() as connection:
+            async with connection.execute(query, params or ()) as cursor:
                 row = await cursor.fetchone()
                 return dict(row) if row else None
         
@@ -89,19 +392,47 @@ class AsyncAdvertsDatabase:
     Асинхронний клас для роботи з оголошеннями у SQLite базі даних.
     """
 
-    def __init__(self, db_connector: AsyncSQLiteConnector, database_table:str):
+    advert_columns = (
+        "sid", "title", "job_title", "address", "location", "type_offer", "posted_date", "posted_date_txt",
+        "employer_company_name", "employer_contact_person", "email", "phone", "link", "time_getting", "session_id",
+        "description"
+    )
+    # Ваги колонок FTS для bm25: title, job_title, employer_company_name, location, description
+    search_weights = (10.0, 5.0, 5.0, 3.0, 1.0)
+
+    def __init__(self, db_connector: AsyncDBConnector, database_table:str, batch_size: int = 50, flush_interval: float = 5.0, max_pending: int = 5000, max_row_attempts: int = 3):
+        """
+        :param db_connector: Підключення до бази даних.
+        :param database_table: Назва таблиці оголошень.
+        :param batch_size: Кількість оголошень у буфері, після якої виконується запис.
+        :param flush_interval: Максимальний час (секунди) перебування оголошення в буфері.
+        :param max_pending: Максимальна кількість оголошень у буфері; найстаріші понад ліміт відкладаються.
+        :param max_row_attempts: Кількість невдалих записів оголошення, після якої воно відкладається.
+        """
         self.db_connector = db_connector
-        self.database_table = database_table
+        self.database_table = validate_identifier(database_table)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_row_attempts = max_row_attempts
+        self._pending_adverts: List[tuple] = []
+        self._row_attempts: Dict[str, int] = {}  # sid -> кількість невдалих спроб запису
+        # Оголошення, які база відхилила max_row_attempts разів або які не вмістилися в буфер
+        self.rejected_adverts: deque = deque(maxlen=max_pending)
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _upsert_advert_query(self) -> str:
+        """Запит додавання оголошення: при повторі sid оновлює рядок на місці, не змінюючи id."""
+        return self.db_connector.dialect.upsert(self.database_table, self.advert_columns, "sid")
 
     async def table_check(self):
         """
-        Перевіряє на існування таблиці, при негативному результаті створює її
+        Створює таблицю або доводить її схему до актуальної версії (міграції з migrations.py)
         """
-        if not await self.table_exists(self.database_table):
-            await self.create_table(self.database_table)
-            logger_t.info(f"Таблиця {self.database_table} успішно створена.")
-        else:
-            logger_t.info(f"Таблиця {self.database_table} вже існує.")
+        migrations = ADVERTS_MIGRATIONS_BY_DIALECT[self.db_connector.dialect.name]
+        version = await apply_migrations(self.db_connector, self.database_table, migrations)
+        logger_t.info(f"Таблиця {self.database_table} готова (версія схеми {version}).")
 
     async def table_exists(self, table_name: str) -> bool:
         """
@@ -109,50 +440,115 @@ class AsyncAdvertsDatabase:
         :param table_name: Назва таблиці
         :return: True, якщо таблиця існує, інакше False
         """
-        query = """
-        SELECT name 
-        FROM sqlite_master 
-        WHERE type='table' AND name=?;
-        """
-        result = await self.db_connector.fetch_one(query, (table_name,))
+        result = await self.db_connector.fetch_one(self.db_connector.dialect.table_exists_query(), (table_name,))
         return result is not None
 
-    async def create_table(self, table_name:str):
-        """
-        Створює таблицю для збереження контактів.
-        """
-        query = f"""
-        CREATE TABLE IF NOT EXISTS {table_name} (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            sid TEXT NOT NULL UNIQUE,
-            title TEXT NOT NULL,
-            job_title TEXT NOT NULL,
-            address TEXT,
-            location TEXT,
-            type_offer TEXT,
-            posted_date DATE,
-            posted_date_txt TEXT,
-            employer_company_name TEXT,
-            employer_contact_person TEXT,
-            email TEXT,
-            phone TEXT,
-            link TEXT NOT NULL,
-            time_getting DATETIME NOT NULL,
-            session_id INTEGER
-        )
-        """
-        await self.db_connector.execute_query(query)
-
-    async def add_advert(self, sid:str, link:str, time_getting:str, title: str, job_title:str, address:Optional[str] = None, location:Optional[str] = None, type_offer:Optional[str] = None, posted_date:Optional[str] = None, posted_date_txt:Optional[str] = None, employer_company_name:Optional[str] = None, employer_contact_person:Optional[str] = None, email:Optional[str] = None, phone:Optional[str] = None, session_id:Optional[int] = None):
+    async def add_advert(self, sid:str, link:str, time_getting:str, title: str, job_title:str, address:Optional[str] = None, location:Optional[str] = None, type_offer:Optional[str] = None, posted_date:Optional[str] = None, posted_date_txt:Optional[str] = None, employer_company_name:Optional[str] = None, employer_contact_person:Optional[str] = None, email:Optional[str] = None, phone:Optional[str] = None, session_id:Optional[int] = None, description:Optional[str] = None):
         try:
-            query = f"INSERT OR REPLACE INTO {self.database_table} (sid, title, job_title, address, location, type_offer, posted_date, posted_date_txt, employer_company_name, employer_contact_person, email, phone, link, time_getting, session_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
-            await self.db_connector.execute_query(query, (sid, title, job_title, address, location, type_offer, posted_date, posted_date_txt, employer_company_name, employer_contact_person, email, phone, link, time_getting, session_id))
+            await self.db_connector.execute_query(self._upsert_advert_query(), (sid, title, job_title, address, location, type_offer, posted_date, posted_date_txt, employer_company_name, employer_contact_person, email, phone, link, time_getting, session_id, description))
             print(f"Оголошення {title} успішно додано.")
         except Exception as e:
             logger_t.error(f"Помилка при додаванні оголошення `{title}`: {e}.")
             raise Exception(e)
 
-    async def get_all_adverts(self, max_old: int = False, session_id: str = None) -> List[Dict]:
+    async def add_advert_buffered(self, **advert):
+        """
+        Додає оголошення в буфер. Буфер записується однією транзакцією,
+        коли в ньому набирається batch_size оголошень або минає flush_interval секунд.
+        Приймає ті самі параметри, що й add_advert.
+        Помилка запису не перериває парсинг: оголошення лишаються в буфері до наступної спроби.
+        """
+        self._pending_adverts.append(tuple(advert.get(column) for column in self.advert_columns))
+
+        if len(self._pending_adverts) >= self.batch_size:
+            try:
+                await self.flush_adverts()
+            except Exception as e:
+                logger_t.error(f"Буфер оголошень не записано, спробую пізніше: {e}")
+        elif not self._flush_task or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_after_interval())
+
+    async def _flush_after_interval(self):
+        await asyncio.sleep(self.flush_interval)
+        try:
+            await self.flush_adverts()
+        except Exception as e:
+            logger_t.error(f"Помилка фонового запису буфера оголошень: {e}")
+
+    async def flush_adverts(self):
+        """
+        Записує всі оголошення з буфера однією транзакцією (executemany).
+        Якщо пакет не записався, оголошення записуються по одному, щоб знайти рядки, які відхиляє база.
+        Такі рядки повертаються в буфер, а після max_row_attempts невдалих спроб відкладаються
+        в rejected_adverts, тож один поганий рядок не блокує запис решти.
+        Якщо не записався жоден рядок (база недоступна), буфер зберігається і помилка передається далі.
+        """
+        async with self._flush_lock:
+            if not self._pending_adverts:
+                return
+            batch, self._pending_adverts = self._pending_adverts, []
+            try:
+                await self.db_connector.execute_many(self._upsert_advert_query(), batch)
+                logger_t.info(f"Записано {len(batch)} оголошень у {self.database_table}.")
+                self._forget_attempts(batch)
+                return
+            except Exception as e:
+                batch_error = e
+                logger_t.error(f"Помилка при записі {len(batch)} оголошень: {e}. Записую по одному.")
+
+            failed = []
+            for row in batch:
+                try:
+                    # execute_many, бо execute_query лише логує помилку і не передає її далі
+                    await self.db_connector.execute_many(self._upsert_advert_query(), [row])
+                except Exception as e:
+                    failed.append((row, e))
+            written = len(batch) - len(failed)
+            if written:
+                logger_t.info(f"Записано {written} з {len(batch)} оголошень у {self.database_table} по одному.")
+                failed_rows = {id(row) for row, _ in failed}
+                self._forget_attempts([row for row in batch if id(row) not in failed_rows])
+
+            if failed and not written:
+                # Не записався жоден рядок - проблема в базі, а не в даних: спроби не рахуються
+                self._pending_adverts = batch + self._pending_adverts
+                self._trim_pending()
+                raise batch_error
+
+            retry = []
+            for row, err in failed:
+                sid = row[0]
+                attempts = self._row_attempts.get(sid, 0) + 1
+                if attempts >= self.max_row_attempts:
+                    self._row_attempts.pop(sid, None)
+                    self.rejected_adverts.append(row)
+                    logger_t.error(f"Оголошення sid={sid} відкладено після {attempts} невдалих спроб запису: {err}.")
+                else:
+                    self._row_attempts[sid] = attempts
+                    retry.append(row)
+            self._pending_adverts = retry + self._pending_adverts
+            self._trim_pending()
+
+    def _forget_attempts(self, rows: List[tuple]):
+        """Скидає лічильники невдалих спроб для записаних оголошень."""
+        if self._row_attempts:
+            for row in rows:
+                self._row_attempts.pop(row[0], None)
+
+    def _trim_pending(self):
+        """Обмежує буфер max_pending оголошеннями: найстаріші понад ліміт відкладаються в rejected_adverts."""
+        overflow = len(self._pending_adverts) - self.max_pending
+        if overflow <= 0:
+            return
+        dropped, self._pending_adverts = self._pending_adverts[:overflow], self._pending_adverts[overflow:]
+        self.rejected_adverts.extend(dropped)
+        self._forget_attempts(dropped)
+        logger_t.error(
+            f"Буфер оголошень переповнено (ліміт {self.max_pending}), відкладено {overflow}: "
+            f"{', '.join(str(row[0]) for row in dropped)}."
+        )
+
+    async def get_all_adverts(self, max_old: int = False, session_id: Optional[int] = None) -> List[Dict]:
         """ 
         Отримує всі оголошення, з можливою фільтрацією за часом та session_id.
         
@@ -161,19 +557,119 @@ class AsyncAdvertsDatabase:
         :return: Список оголошень, які відповідають критеріям.
         """
         query = f"SELECT * FROM {self.database_table}"
-        conditions = []
+        conditions, params = self._adverts_filters(max_old, session_id)
+        
+        # Додаємо умови в запит, якщо вони є
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        
+        return await self.db_connector.fetch_all(query, params)
+
+    def _adverts_filters(self, max_old: int = False, session_id: Optional[int] = None) -> tuple[list, tuple]:
+        """
+        Будує параметризовані умови фільтрації оголошень.
+        time_getting зберігається як 'YYYY-MM-DD HH:MM:SS' (локальний час), тому межа рахується тут же.
+        """
+        conditions, params = [], []
 
         if max_old:
-            conditions.append(f"time_getting > datetime('now', '-{max_old} day{"s" if max_old > 1 else ""}')")
+            conditions.append("time_getting > ?")
+            params.append(format_db_datetime(datetime.now() - timedelta(days=max_old)))
 
         if session_id:
-            conditions.append(f"session_id = '{session_id}'")
-        
-        # Додаємо умови в запит, якщо вони є
+            conditions.append("session_id = ?")
+            params.append(int(session_id))
+
+        return conditions, tuple(params)
+
+    @staticmethod
+    def _fts_query(text: str) -> str:
+        """
+        Перетворює текст користувача на безпечний запит FTS5: кожне слово береться в лапки
+        (оператори та спецсимволи не інтерпретуються), останнє слово шукається як префікс.
+        """
+        terms = ['"' + term.replace('"', '""') + '"' for term in text.split()]
+        if not terms:
+            return ""
+        terms[-1] += "*"
+        return " ".join(terms)
+
+    async def search_adverts(self, text: str, limit: int = 10, offset: int = 0, max_old: int = False) -> List[Dict]:
+        """
+        Повнотекстовий пошук оголошень за назвою, професією, роботодавцем, місцем та описом.
+
+        :param text: Слова для пошуку (усі мають зустрічатися в оголошенні).
+        :param limit: Кількість результатів на сторінці.
+        :param offset: Зсув від початку результатів (для пагінації).
+        :param max_old: Максимальний вік записів у днях (опціонально).
+        :return: Список оголошень, від найбільш релевантного, з полем rank (менше - краще).
+        """
+        if self.db_connector.dialect.name == "mysql":
+            return await self._search_adverts_mysql(text, limit, offset, max_old)
+
+        fts_query = self._fts_query(text)
+        if not fts_query:
+            return []
+
+        fts_table = f"{self.database_table}_fts"
+        weights = ", ".join(str(weight) for weight in self.search_weights)
+        conditions, params = self._adverts_filters(max_old)
+        conditions = [f"a.{condition}" for condition in conditions]
+        query = (
+            f"SELECT a.*, bm25({fts_table}, {weights}) AS rank "
+            f"FROM {fts_table} JOIN {self.database_table} AS a ON a.id = {fts_table}.rowid "
+            f"WHERE {' AND '.join([f'{fts_table} MATCH ?', *conditions])} "
+            f"ORDER BY rank LIMIT ? OFFSET ?"
+        )
+        return await self.db_connector.fetch_all(query, (fts_query, *params, limit, offset))
+
+    async def _search_adverts_mysql(self, text: str, limit: int, offset: int, max_old: int) -> List[Dict]:
+        """Те саме, що search_adverts, через FULLTEXT-індекс MySQL (BOOLEAN MODE)."""
+        terms = _MYSQL_FULLTEXT_OPERATORS.sub(" ", text).split()
+        if not terms:
+            return []
+        boolean_query = " ".join(f"+{term}" for term in terms) + "*"
+
+        match = "MATCH (title, job_title, employer_company_name, location, description) AGAINST (? IN BOOLEAN MODE)"
+        conditions, params = self._adverts_filters(max_old)
+        query = (
+            f"SELECT *, -{match} AS `rank` FROM {self.database_table} "
+            f"WHERE {' AND '.join([match, *conditions])} "
+            f"ORDER BY `rank` LIMIT ? OFFSET ?"
+        )
+        return await self.db_connector.fetch_all(query, (boolean_query, boolean_query, *params, limit, offset))
+
+    async def stream_adverts(self, max_old: int = False, session_id: Optional[int] = None, batch_size: int = 500) -> AsyncIterator[Dict]:
+        """
+        Асинхронно перебирає оголошення з тими ж фільтрами, що й get_all_adverts,
+        читаючи їх з бази частинами по batch_size рядків.
+
+        :param max_old: Максимальний вік записів у днях (опціонально).
+        :param session_id: Фільтрація за session_id (опціонально).
+        :param batch_size: Розмір частини для fetchmany.
+        :return: Асинхронний генератор оголошень.
+        """
+        query = f"SELECT * FROM {self.database_table}"
+        conditions, params = self._adverts_filters(max_old, session_id)
         if conditions:
             query += " WHERE " + " AND ".join(conditions)
-        
-        return await self.db_connector.fetch_all(query)
+        query += " ORDER BY time_getting"
+
+        # aclosing повертає підключення в пул, навіть якщо споживач зупинився раніше
+        async with aclosing(self.db_connector.iterate(query, params, batch_size)) as batches:
+            async for rows in batches:
+                for row in rows:
+                    yield row
+
+    async def get_recent_links(self, max_old: int = 1) -> List[str]:
+        """
+        Повертає посилання оголошень, отриманих за останні max_old днів
+        (запит повністю обслуговується індексом (time_getting, link)).
+        """
+        conditions, params = self._adverts_filters(max_old)
+        query = f"SELECT link FROM {self.database_table} WHERE {' AND '.join(conditions)}"
+        rows = await self.db_connector.fetch_all(query, params)
+        return [row['link'] for row in rows]
 
     async def delete_advert(self, contact_id: int):
         query = f"DELETE FROM {self.database_table} WHERE id = ?"
@@ -182,51 +678,69 @@ class AsyncAdvertsDatabase:
 
 class EmailDatabase:
     """
-    Асинхронний клас для роботи з відправленими email в SQLite базі даних.
+    Асинхронний клас для роботи з відправленими email (SQLite або MySQL - залежно від конектора).
     """
     
-    def __init__(self, db_connector: AsyncSQLiteConnector):
+    def __init__(self, db_connector: AsyncDBConnector):
         self.db_connector = db_connector
         self.table_name = "sent_emails"
     
     async def init_table(self):
-        """Створює таблицю для збереження відправлених email якщо її немає."""
-        query = f"""
-        CREATE TABLE IF NOT EXISTS {self.table_name} (
-            email TEXT PRIMARY KEY,
-            sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            company_name TEXT,
-            job_title TEXT
-        )
-        """
-        await self.db_connector.execute_query(query)
-        logger_t.info(f"Таблиця {self.table_name} готова.")
+        """Створює таблицю для збереження відправлених email або оновлює її схему."""
+        migrations = SENT_EMAILS_MIGRATIONS_BY_DIALECT[self.db_connector.dialect.name]
+        version = await apply_migrations(self.db_connector, self.table_name, migrations)
+        logger_t.info(f"Таблиця {self.table_name} готова (версія схеми {version}).")
     
+    # Максимальна кількість параметрів в одному IN (...) - з запасом від ліміту SQLite
+    bulk_chunk_size = 500
+
+    def _parse_sent_at(self, sent_at_str) -> Optional[datetime]:
+        """Перетворює sent_at з бази в datetime."""
+        if not sent_at_str:
+            return None
+        if isinstance(sent_at_str, datetime):  # MySQL повертає datetime
+            return sent_at_str
+        try:
+            # Парсити timestamp з SQLite
+            if isinstance(sent_at_str, str):
+                # SQLite зберігає як 'YYYY-MM-DD HH:MM:SS'
+                return datetime.strptime(sent_at_str, '%Y-%m-%d %H:%M:%S')
+            return datetime.fromisoformat(sent_at_str)
+        except Exception as e:
+            logger_t.error(f"Помилка парсингу дати: {e}")
+            return None
+
     async def get_last_sent_date(self, email: str) -> Optional[datetime]:
         """Отримує дату останньої відправки на email."""
         query = f"SELECT sent_at FROM {self.table_name} WHERE email = ?"
         result = await self.db_connector.fetch_one(query, (email,))
-        if result and result.get('sent_at'):
-            try:
-                # Парсити timestamp з SQLite
-                sent_at_str = result['sent_at']
-                if isinstance(sent_at_str, str):
-                    # SQLite зберігає як 'YYYY-MM-DD HH:MM:SS'
-                    return datetime.strptime(sent_at_str, '%Y-%m-%d %H:%M:%S')
-                return datetime.fromisoformat(sent_at_str)
-            except Exception as e:
-                logger_t.error(f"Помилка парсингу дати: {e}")
-                return None
-        return None
-    
-    async def can_send_email(self, email: str) -> bool:
+        return self._parse_sent_at(result.get('sent_at')) if result else None
+
+    async def bulk_last_sent(self, emails: List[str]) -> Dict[str, datetime]:
         """
-        Перевіряє чи можна відправляти email (чи пройшло достатньо днів з останньої відправки/запису).
+        Отримує дати останньої відправки для списку адрес кількома запитами IN (...)
+        замість окремого запиту на кожну адресу.
+        :param emails: Адреси (порожні та дублікати ігноруються).
+        :return: Словник email -> дата останньої відправки (лише для адрес, які є в базі).
+        """
+        unique_emails = list(dict.fromkeys(e.strip() for e in emails if e and e.strip()))
+        result = {}
+        for start in range(0, len(unique_emails), self.bulk_chunk_size):
+            chunk = unique_emails[start:start + self.bulk_chunk_size]
+            placeholders = ", ".join("?" for _ in chunk)
+            query = f"SELECT email, sent_at FROM {self.table_name} WHERE email IN ({placeholders})"
+            for row in await self.db_connector.fetch_all(query, tuple(chunk)):
+                sent_at = self._parse_sent_at(row.get('sent_at'))
+                if sent_at:
+                    result[row['email']] = sent_at
+        return result
+
+    def is_cooldown_passed(self, email: str, last_sent: Optional[datetime]) -> bool:
+        """
+        Перевіряє за вже відомою датою останньої відправки, чи пройшло достатньо днів.
         """
         if not email or not email.strip():
             return True  # Якщо email порожній - можна обробляти
-        
-        last_sent = await self.get_last_sent_date(email)
         if not last_sent:
             return True  # Ніколи не відправляли - можна
         
@@ -242,19 +756,43 @@ class EmailDatabase:
             )
         
         return can_send
+
+    async def can_send_email(self, email: str) -> bool:
+        """
+        Перевіряє чи можна відправляти email (чи пройшло достатньо днів з останньої відправки/запису).
+        """
+        if not email or not email.strip():
+            return True  # Якщо email порожній - можна обробляти
+        
+        return self.is_cooldown_passed(email, await self.get_last_sent_date(email))
+
+    def _record_query(self) -> str:
+        return self.db_connector.dialect.upsert(
+            self.table_name,
+            ("email", "sent_at", "company_name", "job_title"),
+            "email",
+            values={"sent_at": "CURRENT_TIMESTAMP"}
+        )
     
     async def record_sent_email(self, email: str, company_name: str = '', job_title: str = ''):
         """Записує email після відправки."""
         if not email or not email.strip():
             return
         
-        query = f"""
-        INSERT OR REPLACE INTO {self.table_name} (email, sent_at, company_name, job_title)
-        VALUES (?, CURRENT_TIMESTAMP, ?, ?)
-        """
-        await self.db_connector.execute_query(query, (email.strip(), company_name, job_title))
+        await self.db_connector.execute_query(self._record_query(), (email.strip(), company_name, job_title))
         logger_t.info(f"Записано відправлений email: {email} для {company_name}")
 
+    async def record_sent_emails(self, records: List[tuple]):
+        """
+        Записує кілька відправлених email однією транзакцією.
+        :param records: Список (email, company_name, job_title).
+        """
+        params = [(email.strip(), company_name, job_title) for email, company_name, job_title in records if email and email.strip()]
+        if not params:
+            return
+        await self.db_connector.execute_many(self._record_query(), params)
+        logger_t.info(f"Записано відправлених email: {len(params)}")
+
 # Приклад використання
 async def main_db():
     db = AsyncSQLiteConnector(f"test_db")
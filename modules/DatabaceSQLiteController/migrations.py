@@ -0,0 +1,264 @@
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+
+_IDENTIFIER_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+def validate_identifier(name: str) -> str:
+    """
+    Перевіряє, що назва таблиці безпечна для підстановки в SQL.
+    :raises ValueError: Якщо назва містить щось, крім латинських літер, цифр та '_'.
+    """
+    if not isinstance(name, str) or not _IDENTIFIER_RE.match(name):
+        raise ValueError(f"Недопустима назва таблиці: {name!r}")
+    return name
+
+
+@dataclass(frozen=True)
+class Migration:
+    """
+    Одна версія схеми.
+    Запити можуть містити {table} - назву таблиці, для якої застосовується міграція.
+    Міграції лише додають (нові таблиці, індекси, колонки) або перетворюють дані на місці,
+    тому застосовуються при старті без зупинки читачів.
+    skip_if - запит (теж з {table}), який повертає рядок, якщо зміни міграції вже є в базі:
+    MySQL фіксує DDL одразу, тому міграцію, перервану до запису в schema_migrations,
+    при наступному старті лише позначаємо застосованою.
+    """
+    version: int
+    description: str
+    statements: tuple[str, ...]
+    skip_if: Optional[str] = None
+
+
+def _mysql_index_exists(index: str) -> str:
+    """Запит перевірки існування індексу MySQL на таблиці {table}."""
+    return (
+        "SELECT index_name FROM information_schema.statistics "
+        f"WHERE table_schema = DATABASE() AND table_name = '{{table}}' AND index_name = '{index}'"
+    )
+
+
+ADVERTS_MIGRATIONS = (
+    Migration(1, "Таблиця оголошень", (
+        """
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sid TEXT NOT NULL UNIQUE,
+            title TEXT NOT NULL,
+            job_title TEXT NOT NULL,
+            address TEXT,
+            location TEXT,
+            type_offer TEXT,
+            posted_date DATE,
+            posted_date_txt TEXT,
+            employer_company_name TEXT,
+            employer_contact_person TEXT,
+            email TEXT,
+            phone TEXT,
+            link TEXT NOT NULL,
+            time_getting DATETIME NOT NULL,
+            session_id INTEGER
+        )
+        """,
+    )),
+    Migration(2, "time_getting у форматі 'YYYY-MM-DD HH:MM:SS' (сортування та порівняння рядків)", (
+        """
+        UPDATE {table}
+        SET time_getting = strftime('%Y-%m-%d %H:%M:%S', time_getting)
+        WHERE strftime('%Y-%m-%d %H:%M:%S', time_getting) IS NOT NULL
+          AND time_getting != strftime('%Y-%m-%d %H:%M:%S', time_getting)
+        """,
+    )),
+    Migration(3, "Індекси для звітів за періодом і сесією та для списку вже оброблених посилань", (
+        "CREATE INDEX IF NOT EXISTS idx_{table}_time_getting_link ON {table} (time_getting, link)",
+        "CREATE INDEX IF NOT EXISTS idx_{table}_session_time ON {table} (session_id, time_getting)",
+    )),
+    Migration(4, "Текст опису оголошення", (
+        "ALTER TABLE {table} ADD COLUMN description TEXT",
+    )),
+    Migration(5, "Повнотекстовий індекс FTS5 (назва, професія, роботодавець, місце, опис) з тригерами синхронізації", (
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5(
+            title, job_title, employer_company_name, location, description,
+            content='{table}', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS {table}_fts_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {table}_fts (rowid, title, job_title, employer_company_name, location, description)
+            VALUES (new.id, new.title, new.job_title, new.employer_company_name, new.location, new.description);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS {table}_fts_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {table}_fts ({table}_fts, rowid, title, job_title, employer_company_name, location, description)
+            VALUES ('delete', old.id, old.title, old.job_title, old.employer_company_name, old.location, old.description);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS {table}_fts_au AFTER UPDATE ON {table} BEGIN
+            INSERT INTO {table}_fts ({table}_fts, rowid, title, job_title, employer_company_name, location, description)
+            VALUES ('delete', old.id, old.title, old.job_title, old.employer_company_name, old.location, old.description);
+            INSERT INTO {table}_fts (rowid, title, job_title, employer_company_name, location, description)
+            VALUES (new.id, new.title, new.job_title, new.employer_company_name, new.location, new.description);
+        END
+        """,
+        # Індексуємо оголошення, які вже є в таблиці
+        "INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')",
+    )),
+)
+
+SENT_EMAILS_MIGRATIONS = (
+    Migration(1, "Таблиця відправлених email", (
+        """
+        CREATE TABLE IF NOT EXISTS {table} (
+            email TEXT PRIMARY KEY,
+            sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            company_name TEXT,
+            job_title TEXT
+        )
+        """,
+    )),
+    Migration(2, "Покриваючий індекс для перевірки cooldown (email -> sent_at без читання рядка)", (
+        "CREATE INDEX IF NOT EXISTS idx_{table}_email_sent_at ON {table} (email, sent_at)",
+    )),
+)
+
+# Та сама схема для MySQL / MariaDB (DB_BACKEND=mysql). Нумерація версій власна.
+# DDL у MySQL не відкочується, тому кожна міграція містить один DDL-запит і перевірку skip_if.
+MYSQL_ADVERTS_MIGRATIONS = (
+    Migration(1, "Таблиця оголошень", (
+        """
+        CREATE TABLE IF NOT EXISTS {table} (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            sid VARCHAR(64) NOT NULL UNIQUE,
+            title TEXT NOT NULL,
+            job_title TEXT NOT NULL,
+            address TEXT,
+            location TEXT,
+            type_offer TEXT,
+            posted_date DATE,
+            posted_date_txt TEXT,
+            employer_company_name TEXT,
+            employer_contact_person TEXT,
+            email TEXT,
+            phone TEXT,
+            link VARCHAR(512) NOT NULL,
+            time_getting DATETIME NOT NULL,
+            session_id BIGINT,
+            description MEDIUMTEXT
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """,
+    )),
+    Migration(2, "Індекс для звітів за періодом і для списку вже оброблених посилань", (
+        "CREATE INDEX idx_{table}_time_getting_link ON {table} (time_getting, link)",
+    ), skip_if=_mysql_index_exists("idx_{table}_time_getting_link")),
+    Migration(3, "Індекс для звітів за сесією", (
+        "CREATE INDEX idx_{table}_session_time ON {table} (session_id, time_getting)",
+    ), skip_if=_mysql_index_exists("idx_{table}_session_time")),
+    Migration(4, "Повнотекстовий індекс (назва, професія, роботодавець, місце, опис)", (
+        "CREATE FULLTEXT INDEX ft_{table} ON {table} (title, job_title, employer_company_name, location, description)",
+    ), skip_if=_mysql_index_exists("ft_{table}")),
+)
+
+MYSQL_SENT_EMAILS_MIGRATIONS = (
+    Migration(1, "Таблиця відправлених email", (
+        """
+        CREATE TABLE IF NOT EXISTS {table} (
+            email VARCHAR(255) PRIMARY KEY,
+            sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            company_name TEXT,
+            job_title TEXT,
+            INDEX idx_{table}_email_sent_at (email, sent_at)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """,
+    )),
+)
+
+RESEARCH_CACHE_MIGRATIONS = (
+    Migration(1, "Кеш досліджень компаній (AI)", (
+        """
+        CREATE TABLE IF NOT EXISTS {table} (
+            cache_key VARCHAR(64) PRIMARY KEY,
+            company_name TEXT,
+            location TEXT,
+            prompt_version VARCHAR(32),
+            field_values TEXT NOT NULL,
+            tokens INTEGER DEFAULT 0,
+            created_at DATETIME NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_{table}_created_at ON {table} (created_at)",
+    )),
+)
+
+MYSQL_RESEARCH_CACHE_MIGRATIONS = (
+    Migration(1, "Кеш досліджень компаній (AI)", (
+        """
+        CREATE TABLE IF NOT EXISTS {table} (
+            cache_key VARCHAR(64) PRIMARY KEY,
+            company_name TEXT,
+            location TEXT,
+            prompt_version VARCHAR(32),
+            field_values TEXT NOT NULL,
+            tokens INTEGER DEFAULT 0,
+            created_at DATETIME NOT NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """,
+    )),
+    Migration(2, "Індекс для очищення застарілих записів кешу", (
+        "CREATE INDEX idx_{table}_created_at ON {table} (created_at)",
+    ), skip_if=_mysql_index_exists("idx_{table}_created_at")),
+)
+
+# Міграції за діалектом конектора (db_connector.dialect.name)
+ADVERTS_MIGRATIONS_BY_DIALECT = {"sqlite": ADVERTS_MIGRATIONS, "mysql": MYSQL_ADVERTS_MIGRATIONS}
+SENT_EMAILS_MIGRATIONS_BY_DIALECT = {"sqlite": SENT_EMAILS_MIGRATIONS, "mysql": MYSQL_SENT_EMAILS_MIGRATIONS}
+RESEARCH_CACHE_MIGRATIONS_BY_DIALECT = {"sqlite": RESEARCH_CACHE_MIGRATIONS, "mysql": MYSQL_RESEARCH_CACHE_MIGRATIONS}
+
+
+async def apply_migrations(db_connector, table: str, migrations: tuple[Migration, ...]) -> int:
+    """
+    Застосовує до таблиці всі ще не застосовані міграції, кожну - в окремій транзакції.
+    Версії зберігаються в таблиці schema_migrations окремо для кожної таблиці,
+    тому кілька таблиць можуть жити в одній базі.
+    :param db_connector: Конектор бази (AsyncDBConnector).
+    :param table: Назва таблиці.
+    :param migrations: Міграції в порядку зростання версії.
+    :return: Поточна версія схеми таблиці.
+    """
+    validate_identifier(table)
+    await db_connector.execute_transaction([(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            component VARCHAR(64) NOT NULL,
+            version INTEGER NOT NULL,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (component, version)
+        )
+        """, None
+    )])
+
+    row = await db_connector.fetch_one(
+        "SELECT MAX(version) AS version FROM schema_migrations WHERE component = ?", (table,)
+    )
+    current_version = (row or {}).get("version") or 0
+
+    for migration in sorted(migrations, key=lambda m: m.version):
+        if migration.version <= current_version:
+            continue
+        statements = [(statement.format(table=table), None) for statement in migration.statements]
+        if migration.skip_if and await db_connector.fetch_one(migration.skip_if.format(table=table)):
+            statements = []
+        statements.append((
+            "INSERT INTO schema_migrations (component, version, description) VALUES (?, ?, ?)",
+            (table, migration.version, migration.description)
+        ))
+        await db_connector.execute_transaction(statements)
+        current_version = migration.version
+
+    return current_version
@@ -0,0 +1,303 @@
+import argparse
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+
+import aiosqlite
+
+from config import DB_PATH, SQL_LITE_LOG_PATH
+from modules.DatabaceSQLiteController.async_sq_lite_connector import AsyncSQLiteConnector, format_db_datetime
+from modules.DatabaceSQLiteController.migrations import validate_identifier
+from modules.MainLogger.logger import setup_logger_from_yaml
+
+logger_t = setup_logger_from_yaml(log_path=SQL_LITE_LOG_PATH)
+
+# SQLite за замовчуванням дозволяє приєднати не більше 10 баз (SQLITE_MAX_ATTACHED)
+MAX_ATTACHED_ARCHIVES = 9
+
+
+def _month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(value: datetime) -> datetime:
+    return _month_start(_month_start(value) + timedelta(days=32))
+
+
+class AdvertsArchiver:
+    """
+    Багаторівневе зберігання оголошень.
+
+    - Оголошення, старші за max_age_days, переносяться з основної таблиці в помісячні
+      архівні файли SQLite (<archive_dir>/<table>_YYYY_MM.db); основна таблиця і FTS-індекс
+      залишаються невеликими.
+    - Архіви доступні для читання через тимчасове представлення <table>_all (UNION ALL основної
+      таблиці та приєднаних архівів) - див. open_union / get_adverts.
+    - Основна база працює з auto_vacuum = INCREMENTAL, вільні сторінки повертаються
+      невеликими порціями (incremental_vacuum) за розкладом, без повного VACUUM.
+      Наявну базу на цей режим переводить окрема команда при зупиненому застосунку:
+      python -m modules.DatabaceSQLiteController.retention --enable-incremental-vacuum
+    """
+
+    def __init__(
+        self,
+        db_connector: AsyncSQLiteConnector,
+        database_table: str = "adverts",
+        archive_dir: str = "data/archive",
+        max_age_days: int = 90,
+        vacuum_pages: int = 2000
+    ):
+        """
+        :param db_connector: Підключення до основної бази.
+        :param database_table: Назва таблиці оголошень.
+        :param archive_dir: Директорія помісячних архівів.
+        :param max_age_days: Оголошення, старші за цю кількість днів, переносяться в архів.
+        :param vacuum_pages: Скільки вільних сторінок звільняти за один запуск incremental_vacuum.
+        """
+        self.db_connector = db_connector
+        self.database_table = validate_identifier(database_table)
+        self.archive_dir = archive_dir
+        self.max_age_days = max_age_days
+        self.vacuum_pages = vacuum_pages
+
+    def _archive_path(self, month: str) -> str:
+        """:param month: Місяць у форматі 'YYYY-MM'."""
+        return os.path.join(self.archive_dir, f"{self.database_table}_{month.replace('-', '_')}.db")
+
+    def list_archive_months(self) -> List[str]:
+        """Повертає місяці ('YYYY-MM'), для яких є архівні файли, за зростанням."""
+        if not os.path.isdir(self.archive_dir):
+            return []
+        prefix = f"{self.database_table}_"
+        months = []
+        for name in os.listdir(self.archive_dir):
+            if name.startswith(prefix) and name.endswith(".db"):
+                year_month = name[len(prefix):-len(".db")]
+                if len(year_month) == 7:
+                    months.append(year_month.replace("_", "-"))
+        return sorted(months)
+
+    @staticmethod
+    async def _table_columns(connection: aiosqlite.Connection, schema: str, table: str) -> List[str]:
+        async with connection.execute(f"PRAGMA {schema}.table_info({table})") as cursor:
+            return [row[1] for row in await cursor.fetchall()]
+
+    async def archive_old_adverts(self) -> int:
+        """
+        Переносить оголошення, старші за max_age_days, в помісячні архіви.
+        Кожен місяць переноситься окремою транзакцією (копія в архів + видалення з основної таблиці).
+        У режимі WAL така транзакція атомарна для кожного файлу окремо, тому копіювання виконується
+        через INSERT OR REPLACE: повторний запуск після збою лише перезапише вже скопійовані рядки.
+        :return: Кількість перенесених оголошень.
+        """
+        cutoff = format_db_datetime(datetime.now() - timedelta(days=self.max_age_days))
+        months = await self.db_connector.fetch_all(
+            f"SELECT DISTINCT substr(time_getting, 1, 7) AS month FROM {self.database_table} WHERE time_getting < ?",
+            (cutoff,)
+        )
+        os.makedirs(self.archive_dir, exist_ok=True)
+
+        total = 0
+        for row in months:
+            month = row["month"]
+            moved = await self.db_connector.run_exclusive(
+                lambda connection, month=month: self._archive_month(connection, month, cutoff)
+            )
+            logger_t.info(f"Архів {self.database_table} {month}: перенесено {moved} оголошень.")
+            total += moved
+        return total
+
+    async def _archive_month(self, connection: aiosqlite.Connection, month: str, cutoff: str) -> int:
+        """Переносить оголошення одного місяця (виконується на підключенні-записувачі)."""
+        table = self.database_table
+        month_start = datetime.strptime(month, "%Y-%m")
+        period = (format_db_datetime(month_start), format_db_datetime(_next_month(month_start)), cutoff)
+        condition = "time_getting >= ? AND time_getting < ? AND time_getting < ?"
+
+        await connection.execute("ATTACH DATABASE ? AS archive", (self._archive_path(month),))
+        try:
+            await connection.execute(f"CREATE TABLE IF NOT EXISTS archive.{table} AS SELECT * FROM main.{table} WHERE 0")
+            await connection.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS archive.idx_{table}_sid ON {table} (sid)")
+            await connection.execute(f"CREATE INDEX IF NOT EXISTS archive.idx_{table}_time_getting ON {table} (time_getting)")
+
+            # Колонки, додані в основну таблицю пізніше, ніж створено архів
+            main_columns = await self._table_columns(connection, "main", table)
+            archive_columns = await self._table_columns(connection, "archive", table)
+            for column in main_columns:
+                if column not in archive_columns:
+                    await connection.execute(f"ALTER TABLE archive.{table} ADD COLUMN {column}")
+
+            columns = ", ".join(main_columns)
+            await connection.execute("BEGIN")
+            try:
+                cursor = await connection.execute(
+                    f"INSERT OR REPLACE INTO archive.{table} ({columns}) "
+                    f"SELECT {columns} FROM main.{table} WHERE {condition}",
+                    period
+                )
+                moved = cursor.rowcount
+                await connection.execute(f"DELETE FROM main.{table} WHERE {condition}", period)
+                await connection.commit()
+            except Exception:
+                await connection.rollback()
+                raise
+        finally:
+            await connection.execute("DETACH DATABASE archive")
+        return moved
+
+    async def is_incremental_vacuum_enabled(self) -> bool:
+        """Перевіряє, чи основна база вже працює з auto_vacuum = INCREMENTAL."""
+        row = await self.db_connector.fetch_one("PRAGMA auto_vacuum")
+        return bool(row) and row["auto_vacuum"] == 2
+
+    async def enable_incremental_vacuum(self):
+        """
+        Вмикає auto_vacuum = INCREMENTAL для основної бази.
+        Для наявної бази режим набуває чинності лише після одного повного VACUUM, який блокує
+        записувача на весь час виконання (на великій базі - хвилини), тому метод викликається
+        лише окремою командою (main у цьому модулі), а не при старті застосунку.
+        """
+        async def _enable(connection: aiosqlite.Connection):
+            async with connection.execute("PRAGMA auto_vacuum") as cursor:
+                mode = (await cursor.fetchone())[0]
+            if mode == 2:  # INCREMENTAL
+                return
+            logger_t.info("Перехід основної бази на auto_vacuum = INCREMENTAL (одноразовий VACUUM)...")
+            await connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            await connection.execute("VACUUM")
+
+        await self.db_connector.run_exclusive(_enable)
+
+    async def incremental_vacuum(self) -> int:
+        """
+        Повертає файловій системі до vacuum_pages вільних сторінок основної бази та скорочує WAL.
+        :return: Кількість вільних сторінок до запуску.
+        """
+        async def _vacuum(connection: aiosqlite.Connection) -> int:
+            async with connection.execute("PRAGMA freelist_count") as cursor:
+                free_pages = (await cursor.fetchone())[0]
+            if free_pages:
+                async with connection.execute(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)})") as cursor:
+                    await cursor.fetchall()
+            async with connection.execute("PRAGMA wal_checkpoint(TRUNCATE)") as cursor:
+                await cursor.fetchall()
+            return free_pages
+
+        free_pages = await self.db_connector.run_exclusive(_vacuum)
+        logger_t.info(f"incremental_vacuum: вільних сторінок було {free_pages}, звільнено до {self.vacuum_pages}.")
+        return free_pages
+
+    async def run_once(self):
+        """Один цикл обслуговування: архівування та incremental_vacuum."""
+        moved = await self.archive_old_adverts()
+        await self.incremental_vacuum()
+        return moved
+
+    async def run_periodically(self, interval: float = 6 * 60 * 60):
+        """
+        Запускає обслуговування за розкладом (для asyncio.create_task у main.py).
+        :param interval: Пауза між запусками в секундах.
+        """
+        if not await self.is_incremental_vacuum_enabled():
+            logger_t.warning(
+                f"Основна база ще не працює з auto_vacuum = INCREMENTAL: incremental_vacuum не звільняє місце. "
+                f"Очікує одноразового переходу (повний VACUUM) - зупиніть застосунок і виконайте "
+                f"python -m modules.DatabaceSQLiteController.retention --enable-incremental-vacuum"
+            )
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger_t.error(f"Помилка обслуговування таблиці {self.database_table}: {e}")
+            await asyncio.sleep(interval)
+
+    @asynccontextmanager
+    async def open_union(self, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Відкриває окреме підключення лише для читання, приєднує архіви потрібних місяців
+        і створює тимчасове представлення <table>_all з усіма оголошеннями.
+        :param date_from: Початок періоду (None - з найстарішого архіву).
+        :param date_to: Кінець періоду (None - до сьогодні).
+        :raises ValueError: Якщо період охоплює більше MAX_ATTACHED_ARCHIVES архівів.
+        """
+        table = self.database_table
+        months = [
+            month for month in self.list_archive_months()
+            if (not date_from or month >= date_from.strftime("%Y-%m"))
+            and (not date_to or month <= date_to.strftime("%Y-%m"))
+        ]
+        if len(months) > MAX_ATTACHED_ARCHIVES:
+            raise ValueError(
+                f"Період охоплює {len(months)} архівів, одночасно можна приєднати не більше {MAX_ATTACHED_ARCHIVES}."
+            )
+
+        main_uri = f"{Path(f'{self.db_connector.file_name}.db').absolute().as_uri()}?mode=ro"
+        connection = await aiosqlite.connect(main_uri, uri=True)
+        connection.row_factory = aiosqlite.Row
+        try:
+            main_columns = await self._table_columns(connection, "main", table)
+            selects = [f"SELECT {', '.join(main_columns)} FROM main.{table}"]
+            for index, month in enumerate(months):
+                schema = f"archive_{index}"
+                archive_uri = f"{Path(self._archive_path(month)).absolute().as_uri()}?mode=ro"
+                await connection.execute(f"ATTACH DATABASE ? AS {schema}", (archive_uri,))
+                archive_columns = set(await self._table_columns(connection, schema, table))
+                columns = ", ".join(column if column in archive_columns else f"NULL AS {column}" for column in main_columns)
+                selects.append(f"SELECT {columns} FROM {schema}.{table}")
+            await connection.execute(f"CREATE TEMP VIEW {table}_all AS {' UNION ALL '.join(selects)}")
+            yield connection
+        finally:
+            await connection.close()
+
+    async def get_adverts(self, date_from: datetime, date_to: Optional[datetime] = None) -> List[Dict]:
+        """
+        Отримує оголошення за період з основної таблиці та архівів.
+        :param date_from: Початок періоду.
+        :param date_to: Кінець періоду (None - до поточного моменту).
+        :return: Список оголошень, впорядкований за time_getting.
+        """
+        date_to = date_to or datetime.now()
+        async with self.open_union(date_from, date_to) as connection:
+            query = (
+                f"SELECT * FROM {self.database_table}_all "
+                f"WHERE time_getting >= ? AND time_getting <= ? ORDER BY time_getting"
+            )
+            async with connection.execute(query, (format_db_datetime(date_from), format_db_datetime(date_to))) as cursor:
+                return [dict(row) for row in await cursor.fetchall()]
+
+
+async def _enable_incremental_vacuum(db_path: str):
+    db_connector = AsyncSQLiteConnector(db_path)
+    await db_connector.connect()
+    try:
+        archiver = AdvertsArchiver(db_connector)
+        if await archiver.is_incremental_vacuum_enabled():
+            print("auto_vacuum = INCREMENTAL уже ввімкнено.")
+            return
+        await archiver.enable_incremental_vacuum()
+        print("auto_vacuum = INCREMENTAL ввімкнено.")
+    finally:
+        await db_connector.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Обслуговування основної бази оголошень SQLite.")
+    parser.add_argument("--db", default=f"{DB_PATH}/arbeitsagentur_db", help="Шлях до бази без .db")
+    parser.add_argument(
+        "--enable-incremental-vacuum", action="store_true",
+        help="Одноразово перевести базу на auto_vacuum = INCREMENTAL (повний VACUUM; застосунок має бути зупинений)"
+    )
+    args = parser.parse_args()
+    if not args.enable_incremental_vacuum:
+        parser.print_help()
+        return
+    asyncio.run(_enable_incremental_vacuum(args.db))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, List, Optional, Sequence
+
+
+class SQLDialect:
+    """
+    Відмінності SQL між серверами баз даних, які потрібні репозиторіям.
+    Запити в репозиторіях пишуться з параметрами '?' - конектор перекладає їх у свій формат.
+    Базовий клас описує SQLite.
+    """
+    name = "sqlite"
+
+    def translate(self, query: str) -> str:
+        """Перетворює запит з параметрами '?' у формат драйвера."""
+        return query
+
+    def upsert(self, table: str, columns: Sequence[str], key: str, values: Optional[Dict[str, str]] = None) -> str:
+        """
+        Запит "вставити або оновити" за унікальним ключем.
+        :param table: Назва таблиці.
+        :param columns: Колонки, що вставляються.
+        :param key: Унікальна колонка, за якою визначається конфлікт.
+        :param values: SQL-вирази для окремих колонок замість параметра '?' (наприклад, CURRENT_TIMESTAMP).
+        """
+        values = values or {}
+        placeholders = ", ".join(values.get(column, "?") for column in columns)
+        updates = ", ".join(self._update_value(column) for column in columns if column != key)
+        return (
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) "
+            f"{self._on_conflict(key)} {updates}"
+        )
+
+    def _on_conflict(self, key: str) -> str:
+        return f"ON CONFLICT({key}) DO UPDATE SET"
+
+    def _update_value(self, column: str) -> str:
+        return f"{column} = excluded.{column}"
+
+    def table_exists_query(self) -> str:
+        """Запит перевірки існування таблиці (один параметр - назва таблиці)."""
+        return "SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?"
+
+
+class MySQLDialect(SQLDialect):
+    """MySQL / MariaDB: параметри '%s', upsert через ON DUPLICATE KEY UPDATE."""
+    name = "mysql"
+
+    def translate(self, query: str) -> str:
+        # '%' в тексті запиту екранується, бо драйвер підставляє параметри через оператор %
+        return query.replace("%", "%%").replace("?", "%s")
+
+    def _on_conflict(self, key: str) -> str:
+        return "ON DUPLICATE KEY UPDATE"
+
+    def _update_value(self, column: str) -> str:
+        return f"{column} = VALUES({column})"
+
+    def table_exists_query(self) -> str:
+        return "SELECT table_name AS name FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = ?"
+
+
+SQLITE_DIALECT = SQLDialect()
+MYSQL_DIALECT = MySQLDialect()
+
+
+class AsyncDBConnector(ABC):
+    """
+    Спільний інтерфейс асинхронних конекторів, з яким працюють репозиторії
+    (AsyncAdvertsDatabase, EmailDatabase). Запити передаються з параметрами '?'.
+    """
+    dialect: SQLDialect = SQLITE_DIALECT
+
+    @abstractmethod
+    async def connect(self):
+        """Встановлює підключення (або створює пул підключень)."""
+
+    @abstractmethod
+    async def disconnect(self):
+        """Закриває підключення."""
+
+    @abstractmethod
+    async def execute_query(self, query: str, params: Optional[tuple] = None):
+        """Виконує запит без повернення результату; помилка записується в лог."""
+
+    @abstractmethod
+    async def execute_many(self, query: str, params_list: List[tuple]):
+        """Виконує запит для набору параметрів в одній транзакції; при помилці - відкат і виняток."""
+
+    @abstractmethod
+    async def execute_transaction(self, statements: List[tuple]):
+        """Виконує список (запит, параметри) в одній транзакції; при помилці - відкат і виняток."""
+
+    @abstractmethod
+    async def fetch_all(self, query: str, params: Optional[tuple] = None) -> List[Dict]:
+        """Повертає всі рядки результату у вигляді словників."""
+
+    @abstractmethod
+    async def fetch_one(self, query: str, params: Optional[tuple] = None) -> Optional[dict]:
+        """Повертає перший рядок результату або None."""
+
+    @abstractmethod
+    def iterate(self, query: str, params: Optional[tuple] = None, batch_size: int = 500) -> AsyncIterator[List[Dict]]:
+        """Асинхронний генератор, що повертає результат частинами по batch_size рядків."""
@@ -0,0 +1,183 @@
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+
+from modules.DatabaseController.async_base import MYSQL_DIALECT, AsyncDBConnector
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncMySQLConnector(AsyncDBConnector):
+    """
+    Асинхронний конектор до MySQL / MariaDB з пулом підключень (aiomysql).
+    Дозволяє кільком вузлам парсера працювати з однією базою.
+    """
+    dialect = MYSQL_DIALECT
+
+    def __init__(self, host: str, user: str, password: str, database: str, port: int = 3306, pool_size: int = 10, pool=None):
+        """
+        Ініціалізація AsyncMySQLConnector.
+        :param host: хост для підключення
+        :param user: користувач
+        :param password: пароль
+        :param database: назва бази даних
+        :param port: порт сервера
+        :param pool_size: максимальна кількість підключень у пулі
+        :param pool: готовий пул підключень (для перевірки без сервера - MySQLStubPool з
+                     test_mysql.py); якщо передано, connect() не створює новий пул
+        """
+        self.host = host
+        self.user = user
+        self.password = password
+        self.database = database
+        self.port = port
+        self.pool_size = pool_size
+        self.pool = pool
+        self._owns_pool = pool is None
+        self._stream_cursor_class = None
+
+    async def connect(self):
+        """
+        Створює пул підключень до бази даних.
+        """
+        if not self._owns_pool:
+            return
+        try:
+            import aiomysql
+        except ImportError as err:
+            raise ImportError("Для DB_BACKEND=mysql потрібен пакет aiomysql (pip install aiomysql).") from err
+
+        try:
+            self.pool = await aiomysql.create_pool(
+                host=self.host,
+                port=self.port,
+                user=self.user,
+                password=self.password,
+                db=self.database,
+                minsize=1,
+                maxsize=self.pool_size,
+                autocommit=False,
+                charset="utf8mb4",
+            )
+            # Курсор на боці сервера: iterate не завантажує весь результат у пам'ять
+            self._stream_cursor_class = aiomysql.SSCursor
+            logger.info("Пул підключень до MySQL бази даних створено.")
+        except Exception as err:
+            logger.error(f"Помилка підключення до бази даних: {err}")
+            raise
+
+    async def disconnect(self):
+        """
+        Закриває пул підключень.
+        """
+        if self.pool and self._owns_pool:
+            self.pool.close()
+            await self.pool.wait_closed()
+            self.pool = None
+            logger.info("Пул підключень до MySQL бази даних закрито.")
+
+    @asynccontextmanager
+    async def _connection(self):
+        connection = await self.pool.acquire()
+        try:
+            yield connection
+        finally:
+            self.pool.release(connection)
+
+    @staticmethod
+    def _rows_to_dicts(cursor, rows) -> List[Dict]:
+        columns = [column[0] for column in cursor.description or ()]
+        return [dict(zip(columns, row)) for row in rows]
+
+    async def execute_query(self, query: str, params: Optional[tuple] = None):
+        """
+        Виконує запит до бази даних (без повернення результату).
+        """
+        async with self._connection() as connection:
+            try:
+                async with connection.cursor() as cursor:
+                    await cursor.execute(self.dialect.translate(query), params or ())
+                await connection.commit()
+            except Exception as err:
+                logger.error(f"Помилка виконання запиту: {err}")
+                await connection.rollback()
+
+    async def execute_many(self, query: str, params_list: List[tuple]):
+        """
+        Виконує один запит для набору параметрів (executemany) в одній транзакції.
+        При помилці транзакція відкочується, а виняток передається далі.
+        """
+        async with self._connection() as connection:
+            try:
+                async with connection.cursor() as cursor:
+                    await cursor.executemany(self.dialect.translate(query), params_list)
+                await connection.commit()
+            except Exception as err:
+                logger.error(f"Помилка пакетного виконання запиту: {err}")
+                await connection.rollback()
+                raise
+
+    async def execute_transaction(self, statements: List[tuple]):
+        """
+        Виконує кілька запитів в одній транзакції.
+        DDL у MySQL фіксує транзакцію неявно, тому міграції MySQL мають по одному DDL-запиту і перевірку skip_if (migrations.py).
+        При помилці транзакція відкочується, а виняток передається далі.
+        """
+        async with self._connection() as connection:
+            try:
+                await connection.begin()
+                async with connection.cursor() as cursor:
+                    for query, params in statements:
+                        await cursor.execute(self.dialect.translate(query), params or ())
+                await connection.commit()
+            except Exception as err:
+                logger.error(f"Помилка виконання транзакції: {err}")
+                await connection.rollback()
+                raise
+
+    async def fetch_all(self, query: str, params: Optional[tuple] = None) -> List[Dict]:
+        """
+        Виконує запит та повертає всі результати.
+        """
+        async with self._connection() as connection:
+            try:
+                async with connection.cursor() as cursor:
+                    await cursor.execute(self.dialect.translate(query), params or ())
+                    return self._rows_to_dicts(cursor, await cursor.fetchall())
+            except Exception as err:
+                logger.error(f"Помилка виконання запиту: {err}")
+                return []
+            finally:
+                # Завершує неявну транзакцію читання, щоб наступний запит бачив свіжі дані
+                await connection.rollback()
+
+    async def fetch_one(self, query: str, params: Optional[tuple] = None) -> Optional[dict]:
+        """
+        Виконує запит та повертає перший результат.
+        """
+        async with self._connection() as connection:
+            try:
+                async with connection.cursor() as cursor:
+                    await cursor.execute(self.dialect.translate(query), params or ())
+                    row = await cursor.fetchone()
+                    return self._rows_to_dicts(cursor, [row])[0] if row else None
+            finally:
+                await connection.rollback()
+
+    async def iterate(self, query: str, params: Optional[tuple] = None, batch_size: int = 500) -> AsyncIterator[List[Dict]]:
+        """
+        Виконує запит і повертає результати частинами (fetchmany).
+        Підключення зайняте, доки генератор не буде вичерпано або закрито.
+        """
+        async with self._connection() as connection:
+            cursor_args = (self._stream_cursor_class,) if self._stream_cursor_class else ()
+            try:
+                async with connection.cursor(*cursor_args) as cursor:
+                    await cursor.execute(self.dialect.translate(query), params or ())
+                    while True:
+                        rows = await cursor.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        yield self._rows_to_dicts(cursor, rows)
+            finally:
+                await connection.rollback()
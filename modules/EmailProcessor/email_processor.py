@@ -1,6 +1,9 @@
 """Email processor module for generating email content from Excel files."""
 
 import asyncio
+import logging
+import os
+from datetime import datetime
 from typing import Optional
 from pathlib import Path
 from config import (
@@ -12,14 +15,19 @@ from config import (
     BREVO_SENDER_NAME,
     EMAIL_RESEND_COOLDOWN_DAYS,
 )
+from modules.AIService.batch_runner import BatchRunner
+from modules.AIService.local_classifier import LocalSuitabilityClassifier
 from modules.AIService.openai_service import OpenAIService
+from modules.AIService.research_cache import normalize_company_name, normalize_location
 from modules.EmailSender.brevo_sender import BrevoSender
 from modules.ExcelProcessor.excel_processor import ExcelProcessor
 from modules.EmailContentGenerator.template_parser import (
     load_template_file, 
     extract_template_fields
 )
-from modules.DatabaceSQLiteController.async_sq_lite_connector import AsyncSQLiteConnector, EmailDatabase
+from initial import EmailDBHandler
+
+logger = logging.getLogger(__name__)
 
 
 class EmailProcessor:
@@ -28,22 +36,70 @@ class EmailProcessor:
     # Class variable to track active processes
     _active_processes = 0
     _lock = asyncio.Lock()
+    # The final write of sent emails is retried with backoff: a lost record means a resend next job
+    SENT_FINAL_ATTEMPTS = 4
+    SENT_RETRY_DELAY = 1.0  # seconds, doubled after every failed attempt
     
-    def __init__(self, template_path: Optional[str] = None):
+    def __init__(
+        self,
+        template_path: Optional[str] = None,
+        workers: Optional[int] = None,
+        batch_min_companies: Optional[int] = None,
+        classify_batch_size: Optional[int] = None,
+        combined_call: Optional[bool] = None,
+        sent_flush_size: Optional[int] = None,
+        sent_flush_interval: Optional[float] = None
+    ):
         """
         Initialize email processor.
         
         Args:
             template_path: Optional path to HTML template file
+            workers: Number of rows processed concurrently
+                     (default: EMAIL_PROCESSOR_WORKERS environment variable, 4)
+            batch_min_companies: Files with at least this many unique companies are sent through
+                                 the Batch API (default: OPENAI_BATCH_MIN_COMPANIES environment
+                                 variable; 0 disables batch mode)
+            classify_batch_size: Companies per request of the filter-only classifier
+                                 (default: OPENAI_CLASSIFY_BATCH_SIZE environment variable, 30;
+                                 0 classifies every company with its own research request)
+            combined_call: Research and write the email of a company in one structured call
+                           (default: EMAIL_COMBINED_CALL environment variable, on; "0" turns it off)
+            sent_flush_size: Sent emails buffered before they are written to the database
+                             (default: EMAIL_SENT_FLUSH_SIZE environment variable, 20)
+            sent_flush_interval: Maximum seconds a sent email stays in the buffer
+                                 (default: EMAIL_SENT_FLUSH_SECONDS environment variable, 5)
         """
-        self.ai_service = OpenAIService(api_key=OPENAI_API_KEY, model=OPENAI_MODEL)
+        self.workers = workers or int(os.getenv("EMAIL_PROCESSOR_WORKERS", "4"))
+        if batch_min_companies is None:
+            batch_min_companies = int(os.getenv("OPENAI_BATCH_MIN_COMPANIES", "0"))
+        self.batch_min_companies = batch_min_companies
+        if classify_batch_size is None:
+            classify_batch_size = int(os.getenv("OPENAI_CLASSIFY_BATCH_SIZE", "30"))
+        self.classify_batch_size = classify_batch_size
+        if combined_call is None:
+            combined_call = os.getenv("EMAIL_COMBINED_CALL", "1") != "0"
+        self.combined_call = combined_call
+        if sent_flush_size is None:
+            sent_flush_size = int(os.getenv("EMAIL_SENT_FLUSH_SIZE", "20"))
+        self.sent_flush_size = max(1, sent_flush_size)
+        if sent_flush_interval is None:
+            sent_flush_interval = float(os.getenv("EMAIL_SENT_FLUSH_SECONDS", "5"))
+        self.sent_flush_interval = sent_flush_interval
+        self.ai_service = OpenAIService(
+            api_key=OPENAI_API_KEY,
+            model=OPENAI_MODEL,
+            local_classifier=LocalSuitabilityClassifier.load_default()
+        )
         self.brevo_sender = BrevoSender(BREVO_API_KEY, BREVO_SENDER_EMAIL, BREVO_SENDER_NAME)
         self._progress_callback = None
         self.template_path = template_path
         self.template_content = None
         self.template_fields = None
         self._first_html_saved = False  # Флаг чи вже збережено перший HTML
-        self.email_db = None  # Ініціалізується в process_file
+        self.email_db = None  # Спільний EmailDatabase, отримується з EmailDBHandler в process_file
+        self._sent_records = []  # (email, company_name, job_title), ще не записані в базу
+        self._sent_flush_task = None  # відкладений запис буфера _sent_records
         
         # Load template if provided
         if template_path:
@@ -81,6 +137,230 @@ class EmailProcessor:
             # Print to console if no callback
             print(f"[{current}/{total}] {company_name}")
     
+    async def _record_sent(self, last_sent_map: dict, email: str, company_name: str, job_title: str):
+        """
+        Remember a sent email; the buffer is written every `sent_flush_size` records or
+        `sent_flush_interval` seconds, so a crash mid-file loses at most a few records and
+        concurrent jobs see the sends in their cooldown checks.
+        The in-memory map is updated too, so later rows with the same address hit the cooldown.
+        """
+        self._sent_records.append((email, company_name, job_title))
+        last_sent_map[email] = datetime.now()
+        if len(self._sent_records) >= self.sent_flush_size:
+            await self._flush_sent_records()
+        elif not self._sent_flush_task or self._sent_flush_task.done():
+            self._sent_flush_task = asyncio.create_task(self._flush_sent_after_interval())
+
+    async def _flush_sent_after_interval(self):
+        await asyncio.sleep(self.sent_flush_interval)
+        # The final flush only cancels a sleeping timer, never a write in progress
+        self._sent_flush_task = None
+        await self._flush_sent_records()
+
+    async def _flush_sent_records(self, final: bool = False):
+        """
+        Write all remembered sent emails in one transaction.
+
+        Args:
+            final: End of the file - also cancel the interval flush that has not started yet.
+                   A failed intermediate write keeps the records for the next flush; the final
+                   write is retried SENT_FINAL_ATTEMPTS times and the addresses it could not
+                   record are logged at error level.
+        """
+        if final and self._sent_flush_task and not self._sent_flush_task.done():
+            self._sent_flush_task.cancel()
+        records, self._sent_records = self._sent_records, []
+        if not records or not self.email_db:
+            return
+        attempts = self.SENT_FINAL_ATTEMPTS if final else 1
+        for attempt in range(1, attempts + 1):
+            try:
+                await self.email_db.record_sent_emails(records)
+                return
+            except Exception as e:
+                error = e
+                if attempt < attempts:
+                    logger.warning(f"Failed to record {len(records)} sent emails (attempt {attempt}/{attempts}): {e}")
+                    await asyncio.sleep(self.SENT_RETRY_DELAY * 2 ** (attempt - 1))
+        if not final:
+            logger.warning(f"Failed to record {len(records)} sent emails, keeping them for the next flush: {error}")
+            self._sent_records = records + self._sent_records
+            return
+        logger.error(
+            f"Lost {len(records)} sent-email records after {attempts} attempts ({error}); "
+            f"the cooldown check will not see these addresses: {', '.join(email for email, _, _ in records)}"
+        )
+
+    @staticmethod
+    def _company_key(company: dict) -> str:
+        """Key that identifies one employer within a file (normalized name + location)."""
+        return (
+            f"{normalize_company_name(str(company.get('company_name', '')))}|"
+            f"{normalize_location(company.get('location', ''))}"
+        )
+
+    def _group_rows_by_company(self, companies: list) -> dict:
+        """
+        Pre-pass: group row indices by employer so each company is researched once per file.
+
+        Returns:
+            Dict company key -> list of row indices (rows without a company name are skipped)
+        """
+        groups = {}
+        for idx, company in enumerate(companies):
+            if str(company.get('company_name', '')).strip():
+                groups.setdefault(self._company_key(company), []).append(idx)
+        return groups
+
+    async def _research_once(
+        self, research_tasks: dict, company: dict, company_name: str, required_fields, prepared_emails: Optional[dict] = None
+    ) -> dict:
+        """
+        Research a company once per file; later rows of the same company reuse the result.
+
+        Args:
+            research_tasks: Per-file dict company key -> research task
+            company: Row data
+            company_name: Stripped company name of the row
+            required_fields: Template fields to research
+            prepared_emails: Per-file dict `_email_key` -> HTML; when given and combined mode is on,
+                             the first row of a company also gets its email from the same call
+
+        Returns:
+            Copy of the research result, with company-name fields set to this row's name
+        """
+        key = self._company_key(company)
+        task = research_tasks.get(key)
+        if task is None:
+            if prepared_emails is not None and self.combined_call and self.template_content:
+                research = self._research_with_email(company, company_name, prepared_emails)
+            else:
+                research = self.ai_service.research_company(
+                    company_name=company_name,
+                    company_info=company,
+                    required_fields=required_fields
+                )
+            task = asyncio.ensure_future(research)
+            research_tasks[key] = task
+        research = dict(await asyncio.shield(task))
+        for field in required_fields or ():
+            if 'company' in field.lower():
+                research[field] = company_name
+        return research
+
+    def _use_batch(self, company_groups: dict) -> bool:
+        """Batch mode pays off only for large offline files: latency is up to 24 hours."""
+        return bool(self.batch_min_companies) and len(company_groups) >= self.batch_min_companies
+
+    def _needs_ai(self, company: dict, last_sent_map: dict) -> bool:
+        """Row reaches the AI stage: it has a company name and its email is not in cooldown."""
+        if not str(company.get('company_name', '')).strip():
+            return False
+        email = str(company.get('email', '') or '').strip()
+        return not email or self.email_db.is_cooldown_passed(email, last_sent_map.get(email))
+
+    @staticmethod
+    def _completed_future(result):
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(result)
+        return future
+
+    def _pending_companies(self, companies: list, company_groups: dict, last_sent_map: dict) -> dict:
+        """
+        Companies that need an AI answer: the first row of each group that passes the checks.
+
+        Returns:
+            Dict company key -> (company_name, row)
+        """
+        pending = {}
+        for key, rows in company_groups.items():
+            row = next((idx for idx in rows if self._needs_ai(companies[idx], last_sent_map)), None)
+            if row is not None:
+                company = companies[row]
+                pending[key] = (str(company.get('company_name', '')).strip(), company)
+        return pending
+
+    async def _classify_all(self, companies: list, company_groups: dict, last_sent_map: dict, research_tasks: dict):
+        """
+        Classify all companies of a filter-only file with multi-company requests.
+
+        Results go into `research_tasks` like `_batch_research` results.
+        """
+        pending = self._pending_companies(companies, company_groups, last_sent_map)
+        if not pending:
+            return
+        await self._update_progress(0, len(companies), f"Класифікація {len(pending)} компаній...")
+        results = await self.ai_service.classify_companies(
+            pending, batch_size=self.classify_batch_size, concurrency=self.workers
+        )
+        for key, research in results.items():
+            research_tasks[key] = self._completed_future(research)
+
+    async def _batch_research(self, companies: list, company_groups: dict, last_sent_map: dict, research_tasks: dict, required_fields):
+        """
+        Research all companies of the file in one Batch API job before rows are processed.
+
+        Results are put into `research_tasks` as finished tasks, so `_research_once` picks
+        them up; companies whose batch item failed are researched interactively.
+        """
+        pending = self._pending_companies(companies, company_groups, last_sent_map)
+        if not pending:
+            return
+        await self._update_progress(0, len(companies), f"Batch API: дослідження {len(pending)} компаній...")
+        results = await self.ai_service.research_companies_batch(
+            pending, required_fields, BatchRunner(self.ai_service.client)
+        )
+        for key, research in results.items():
+            research_tasks[key] = self._completed_future(research)
+
+    @classmethod
+    def _email_key(cls, company: dict) -> str:
+        """Rows with the same employer and job title get the same generated email."""
+        return f"{cls._company_key(company)}|{str(company.get('title', '') or '').strip().casefold()}"
+
+    async def _batch_emails(self, companies: list, research_tasks: dict, last_sent_map: dict) -> dict:
+        """
+        Generate emails for all suitable researched rows in one Batch API job.
+
+        Returns:
+            Dict `_email_key` -> filled HTML (missing keys are generated interactively)
+        """
+        if not self.template_content:
+            return {}
+        pending = {}
+        for company in companies:
+            task = research_tasks.get(self._company_key(company))
+            if task is None or not task.done() or not self._needs_ai(company, last_sent_map):
+                continue
+            research = task.result()
+            key = self._email_key(company)
+            if research.get('is_suitable') and key not in pending:
+                company_name = str(company.get('company_name', '')).strip()
+                research = dict(research)
+                for field in self.template_fields or ():
+                    if 'company' in field.lower():
+                        research[field] = company_name
+                pending[key] = (company_name, research, company.get('title', ''))
+        if not pending:
+            return {}
+        await self._update_progress(0, len(companies), f"Batch API: генерація {len(pending)} листів...")
+        return await self.ai_service.generate_emails_batch(
+            pending, self.template_content, self.template_fields, BatchRunner(self.ai_service.client)
+        )
+
+    async def _research_with_email(self, company: dict, company_name: str, prepared_emails: dict) -> dict:
+        """Combined call: returns the research result and puts the generated email into `prepared_emails`."""
+        research, email_content = await self.ai_service.research_and_generate(
+            company_name=company_name,
+            company_info=company,
+            template_content=self.template_content,
+            template_fields=self.template_fields,
+            job_title=company.get('title', '')
+        )
+        if email_content is not None:
+            prepared_emails[self._email_key(company)] = email_content
+        return research
+
     @classmethod
     async def can_start_process(cls) -> tuple:
         """
@@ -101,6 +381,64 @@ class EmailProcessor:
         async with cls._lock:
             cls._active_processes = max(0, cls._active_processes - 1)
     
+    @staticmethod
+    def _work_units(companies: list) -> list:
+        """
+        Split rows into units that are safe to process concurrently.
+
+        Rows with the same email address form one unit and are processed in row order,
+        so the in-file cooldown check (first row sends, later rows are skipped) does not
+        depend on worker timing. Units are ordered by their first row.
+        """
+        units = {}
+        for idx, company in enumerate(companies):
+            email = str(company.get('email', '') or '').strip()
+            units.setdefault(email or f"#row{idx}", []).append(idx)
+        return sorted(units.values(), key=lambda rows: rows[0])
+
+    async def _run_rows(self, companies: list, process_row) -> None:
+        """
+        Process rows with `self.workers` concurrent workers.
+
+        Progress advances over the contiguous prefix of finished rows, so it is reported
+        in the original row order regardless of which worker finishes first.
+
+        Args:
+            companies: Rows from ExcelProcessor.get_companies_data()
+            process_row: async callable(idx, company) -> status line for progress
+        """
+        total = len(companies)
+        queue: asyncio.Queue = asyncio.Queue()
+        for unit in self._work_units(companies):
+            queue.put_nowait(unit)
+
+        statuses: list[Optional[str]] = [None] * total
+        reported = 0
+        progress_lock = asyncio.Lock()
+
+        async def worker():
+            nonlocal reported
+            while True:
+                try:
+                    unit = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                for idx in unit:
+                    try:
+                        status_line = await process_row(idx, companies[idx])
+                    except Exception as ex:
+                        status_line = f"Помилка: {companies[idx].get('company_name') or 'unknown'} ({ex})"
+                    async with progress_lock:
+                        statuses[idx] = status_line
+                        start = reported
+                        while reported < total and statuses[reported] is not None:
+                            reported += 1
+                        if reported > start:
+                            await self._update_progress(reported, total, statuses[reported - 1])
+
+        worker_count = max(1, min(self.workers, total or 1))
+        await asyncio.gather(*(worker() for _ in range(worker_count)))
+
     async def process_file(self, file_path: str) -> str:
         """
         Process Excel/CSV file and generate email content.
@@ -111,11 +449,9 @@ class EmailProcessor:
         Returns:
             Path to output file with email content
         """
-        # Ініціалізувати БД для email
-        db_connector = AsyncSQLiteConnector("sent_emails_db")
-        await db_connector.connect()
-        self.email_db = EmailDatabase(db_connector)
-        await self.email_db.init_table()
+        # Спільна для всіх задач БД відправлених email та кеш досліджень компаній
+        self.email_db = await EmailDBHandler.get_instance()
+        self.ai_service.research_cache = await EmailDBHandler.get_research_cache()
         
         try:
             # Load file
@@ -126,46 +462,46 @@ class EmailProcessor:
             companies = processor.get_companies_data()
             total = len(companies)
             
-            await self._update_progress(0, total, "Початок обробки...")
+            company_groups = self._group_rows_by_company(companies)
+            research_tasks = {}  # ключ компанії -> задача дослідження (одне дослідження на компанію)
+            await self._update_progress(0, total, f"Початок обробки ({len(company_groups)} унікальних компаній)...")
+
+            # Дати останньої відправки для всього файлу одним запитом
+            last_sent_map = await self.email_db.bulk_last_sent([c.get('email', '') for c in companies])
+            
+            prepared_emails = {}  # ключ листа -> HTML, згенерований через Batch API або комбінованим запитом
+            if self._use_batch(company_groups):
+                await self._batch_research(companies, company_groups, last_sent_map, research_tasks, self.template_fields)
+                prepared_emails = await self._batch_emails(companies, research_tasks, last_sent_map)
             
-            email_contents = []
-            company_researches = []
-            suitability_results = []  # List of {'is_suitable': bool, 'industry': str, 'rejection_reason': str}
+            # Результати записуються за індексом рядка, тому порядок не залежить від воркерів
+            email_contents = [""] * total
+            company_researches = [""] * total
+            suitability_results = [None] * total  # {'is_suitable': bool, 'industry': str, 'rejection_reason': str}
             
-            # Process each company
-            for i, company in enumerate(companies, 1):
+            async def process_row(i: int, company: dict) -> str:
                 company_name = company.get('company_name', '').strip()
                 
                 if not company_name:
-                    email_contents.append("")
-                    company_researches.append("")
-                    suitability_results.append({'is_suitable': False, 'industry': 'Unknown', 'rejection_reason': 'No company name'})
-                    await self._update_progress(i, total, f"Пропущено (немає назви)")
-                    continue
+                    suitability_results[i] = {'is_suitable': False, 'industry': 'Unknown', 'rejection_reason': 'No company name'}
+                    return "Пропущено (немає назви)"
                 
                 # Перевірити email перед обробкою
                 email = company.get('email', '').strip()
                 if email:
-                    can_send = await self.email_db.can_send_email(email)
+                    can_send = self.email_db.is_cooldown_passed(email, last_sent_map.get(email))
                     if not can_send:
-                        email_contents.append("")
-                        company_researches.append("")
-                        suitability_results.append({
+                        suitability_results[i] = {
                             'is_suitable': False,
                             'industry': 'Unknown',
                             'rejection_reason': f'Email відправлявся менше {EMAIL_RESEND_COOLDOWN_DAYS} днів тому',
-                        })
-                        await self._update_progress(i, total, f"Пропущено: {company_name} (email відправлявся нещодавно)")
+                        }
                         print(f"⏭️ Пропущено {company_name}: email {email} — cooldown {EMAIL_RESEND_COOLDOWN_DAYS} днів")
-                        continue
-                
-                await self._update_progress(i, total, f"Обробка: {company_name}")
+                        return f"Пропущено: {company_name} (email відправлявся нещодавно)"
                 
-                # Research company with template fields
-                company_research = await self.ai_service.research_company(
-                    company_name=company_name,
-                    company_info=company,
-                    required_fields=self.template_fields
+                # Research company with template fields (once per company in the file)
+                company_research = await self._research_once(
+                    research_tasks, company, company_name, self.template_fields, prepared_emails
                 )
                 
                 # Check if company is suitable
@@ -173,22 +509,24 @@ class EmailProcessor:
                 industry = company_research.get('industry', 'Unknown')
                 rejection_reason = company_research.get('rejection_reason', '')
                 
-                suitability_results.append({
+                suitability_results[i] = {
                     'is_suitable': is_suitable,
                     'industry': industry,
                     'rejection_reason': rejection_reason
-                })
+                }
                 
                 # Generate email content ONLY if company is suitable
                 if is_suitable:
-                    # Generate email content using template
-                    email_content = await self.ai_service.generate_email_content(
-                        company_name=company_name,
-                        company_research=company_research,
-                        job_title=company.get('title', ''),
-                        template_content=self.template_content,
-                        template_fields=self.template_fields
-                    )
+                    # Generate email content using template (unless the batch job already did)
+                    email_content = prepared_emails.get(self._email_key(company))
+                    if email_content is None:
+                        email_content = await self.ai_service.generate_email_content(
+                            company_name=company_name,
+                            company_research=company_research,
+                            job_title=company.get('title', ''),
+                            template_content=self.template_content,
+                            template_fields=self.template_fields
+                        )
                     
                     # Перевірка довжини HTML
                     if email_content:
@@ -202,17 +540,7 @@ class EmailProcessor:
                             print(f"  Expected ~{expected_length} chars, got {html_length} chars")
                             print(f"  Difference: {expected_length - html_length} chars")
                     
-                    email_contents.append(email_content)
-                    
-                    # Зберегти перший непустий HTML для перевірки
-                    if not self._first_html_saved and email_content and email_content.strip():
-                        try:
-                            with open('t1.html', 'w', encoding='utf-8') as f:
-                                f.write(email_content)
-                            print(f"✅ Збережено перший HTML в t1.html ({len(email_content)} chars) для {company_name}")
-                            self._first_html_saved = True
-                        except Exception as e:
-                            print(f"⚠️ Помилка збереження t1.html: {e}")
+                    email_contents[i] = email_content
                     
                     if email and email_content:
                         try:
@@ -223,19 +551,35 @@ class EmailProcessor:
                                 html_content=email_content,
                             )
                             print(f"Brevo send {company_name} ({email}): {result}")
-                            await self.email_db.record_sent_email(email, company_name, company.get('title', ''))
+                            await self._record_sent(last_sent_map, email, company_name, company.get('title', ''))
                         except Exception as e:
                             print(f"Brevo send failed {company_name} ({email}): {e}")
                 else:
-                    # Not suitable - don't generate email, just add empty string
-                    email_contents.append("")
+                    # Not suitable - don't generate email
                     print(f"Company {company_name} is not suitable: {rejection_reason}")
                 
                 # Store research text for the research column
                 research_text = company_research.get('_research_text', '')
                 if not research_text:
                     research_text = company_research.get('company_description', '')
-                company_researches.append(research_text)
+                company_researches[i] = research_text
+                return f"Обробка: {company_name}"
+            
+            await self._run_rows(companies, process_row)
+            for i, result in enumerate(suitability_results):
+                if result is None:  # рядок завершився помилкою
+                    suitability_results[i] = {'is_suitable': False, 'industry': 'Unknown', 'rejection_reason': 'Processing error'}
+            
+            # Зберегти перший (за порядком рядків) непустий HTML для перевірки
+            first_html = next((content for content in email_contents if content and content.strip()), None)
+            if not self._first_html_saved and first_html:
+                try:
+                    with open('t1.html', 'w', encoding='utf-8') as f:
+                        f.write(first_html)
+                    print(f"✅ Збережено перший HTML в t1.html ({len(first_html)} chars)")
+                    self._first_html_saved = True
+                except Exception as e:
+                    print(f"⚠️ Помилка збереження t1.html: {e}")
             
             await self._update_progress(total, total, "Збереження файлу...")
             
@@ -252,17 +596,13 @@ class EmailProcessor:
             
             return output_path
         finally:
-            # Закрити підключення до БД
-            if self.email_db and self.email_db.db_connector:
-                await self.email_db.db_connector.disconnect()
+            await self._flush_sent_records(final=True)
             await self.finish_process()
 
     async def process_file_filter_only(self, file_path: str) -> tuple[str, str, str]:
         """Повертає (загальний звіт, усі підходящі, лише підходящі з новими поштовими адресами)."""
-        db_connector = AsyncSQLiteConnector("sent_emails_db")
-        await db_connector.connect()
-        self.email_db = EmailDatabase(db_connector)
-        await self.email_db.init_table()
+        self.email_db = await EmailDBHandler.get_instance()
+        self.ai_service.research_cache = await EmailDBHandler.get_research_cache()
         try:
             processor = ExcelProcessor(file_path)
             await processor.load_file()
@@ -270,15 +610,15 @@ class EmailProcessor:
             total = len(companies)
             # Повна копія для загального звіту (усі рядки як у вхідному файлі)
             full_report_df = processor.df.copy()
-            await self._update_progress(0, total, "Початок обробки...")
-            # Temporary set concurrency to 1 for debugging
-            concurrency = 1
-            queue: asyncio.Queue = asyncio.Queue()
-
-            for idx, company in enumerate(companies):
-                await queue.put((idx, company))
-            for _ in range(concurrency):
-                await queue.put(None)  # sentinel
+            company_groups = self._group_rows_by_company(companies)
+            research_tasks = {}  # ключ компанії -> задача дослідження (одне дослідження на компанію)
+            await self._update_progress(0, total, f"Початок обробки ({len(company_groups)} унікальних компаній)...")
+            # Дати останньої відправки для всього файлу одним запитом
+            last_sent_map = await self.email_db.bulk_last_sent([str(c.get('email', '')) for c in companies])
+            if self._use_batch(company_groups):
+                await self._batch_research(companies, company_groups, last_sent_map, research_tasks, None)
+            elif self.classify_batch_size:
+                await self._classify_all(companies, company_groups, last_sent_map, research_tasks)
 
             suitable_mask = [False] * total
             suitable_researches: list[str | None] = [None] * total
@@ -290,91 +630,62 @@ class EmailProcessor:
             row_last_send: list[str] = ["new"] * total
             suitable_new_email: list[bool] = [False] * total
 
-            done_count = 0
-            progress_lock = asyncio.Lock()
-
-            async def worker():
-                nonlocal done_count
-                while True:
-                    item = await queue.get()
-                    if item is None:
-                        queue.task_done()
-                        break
-
-                    idx, company = item
-                    company_name = str(company.get('company_name', '')).strip()
-                    email = str(company.get('email', '')).strip()
-                    last_sent_dt = None
-                    last_send_display = "new"
+            async def process_row(idx: int, company: dict) -> str:
+                company_name = str(company.get('company_name', '')).strip()
+                email = str(company.get('email', '')).strip()
+                last_sent_dt = None
+                last_send_display = "new"
+                if email:
+                    last_sent_dt = last_sent_map.get(email)
+                    if last_sent_dt:
+                        last_send_display = last_sent_dt.strftime("%Y-%m-%d %H:%M:%S")
+                row_last_send[idx] = last_send_display
+
+                try:
+                    if not company_name:
+                        row_skip_reason[idx] = "Немає назви роботодавця"
+                        return "Пропущено (немає назви)"
+
                     if email:
-                        last_sent_dt = await self.email_db.get_last_sent_date(email)
-                        if last_sent_dt:
-                            last_send_display = last_sent_dt.strftime("%Y-%m-%d %H:%M:%S")
-                    row_last_send[idx] = last_send_display
-                    status_line = "Пропущено"
+                        can_send = self.email_db.is_cooldown_passed(email, last_sent_dt)
+                        if not can_send:
+                            row_skip_reason[idx] = (
+                                f"Email відправлявся менше {EMAIL_RESEND_COOLDOWN_DAYS} днів тому (не робимо AI)"
+                            )
+                            return f"Пропущено: {company_name} (email < {EMAIL_RESEND_COOLDOWN_DAYS} дн.)"
 
-                    try:
-                        if not company_name:
-                            status_line = "Пропущено (немає назви)"
-                            row_skip_reason[idx] = "Немає назви роботодавця"
-                        else:
-                            do_ai = True
-                            if email:
-                                can_send = await self.email_db.can_send_email(email)
-                                if not can_send:
-                                    do_ai = False
-                                    status_line = f"Пропущено: {company_name} (email < {EMAIL_RESEND_COOLDOWN_DAYS} дн.)"
-                                    row_skip_reason[idx] = (
-                                        f"Email відправлявся менше {EMAIL_RESEND_COOLDOWN_DAYS} днів тому (не робимо AI)"
-                                    )
-
-                            if do_ai:
-                                status_line = f"Обробка: {company_name}"
-                                company_research = await self.ai_service.research_company(
-                                    company_name=company_name,
-                                    company_info=company,
-                                    required_fields=None
-                                )
-                                is_suitable = company_research.get('is_suitable', False)
-                                industry = company_research.get('industry', 'Unknown')
-                                research_text = company_research.get('_research_text', '') or company_research.get('company_description', '')
-                                if isinstance(research_text, str):
-                                    research_text = research_text.strip()
-                                else:
-                                    research_text = str(research_text) if research_text is not None else ""
-                                ind_str = industry.strip() if isinstance(industry, str) else str(industry or "")
-                                row_industry_ai[idx] = ind_str
-                                row_research_ai[idx] = research_text
-
-                                if not is_suitable:
-                                    status_line = f"Пропущено: {company_name}"
-                                    rr = company_research.get('rejection_reason', '')
-                                    row_skip_reason[idx] = (str(rr).strip() if rr else "Не підходить за критеріями AI")
-                                else:
-                                    suitable_mask[idx] = True
-                                    suitable_researches[idx] = research_text
-                                    suitable_industries[idx] = ind_str
-                                    suitable_new_email[idx] = bool(email and last_sent_dt is None)
-                                    row_skip_reason[idx] = "Підходить"
-                                    if email:
-                                        await self.email_db.record_sent_email(
-                                            email,
-                                            company_name,
-                                            company.get('title', '')
-                                        )
-                                    status_line = f"Оброблено: {company_name}"
-                    except Exception as ex:
-                        status_line = f"Помилка: {company_name or 'unknown'}"
-                        row_skip_reason[idx] = f"Помилка обробки: {ex}"
-                    finally:
-                        async with progress_lock:
-                            done_count += 1
-                            await self._update_progress(done_count, total, status_line)
-                        queue.task_done()
-
-            workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
-            await queue.join()
-            await asyncio.gather(*workers, return_exceptions=True)
+                    company_research = await self._research_once(
+                        research_tasks, company, company_name, None
+                    )
+                    is_suitable = company_research.get('is_suitable', False)
+                    industry = company_research.get('industry', 'Unknown')
+                    research_text = company_research.get('_research_text', '') or company_research.get('company_description', '')
+                    if isinstance(research_text, str):
+                        research_text = research_text.strip()
+                    else:
+                        research_text = str(research_text) if research_text is not None else ""
+                    ind_str = industry.strip() if isinstance(industry, str) else str(industry or "")
+                    row_industry_ai[idx] = ind_str
+                    row_research_ai[idx] = research_text
+
+                    if not is_suitable:
+                        rr = company_research.get('rejection_reason', '')
+                        row_skip_reason[idx] = (str(rr).strip() if rr else "Не підходить за критеріями AI")
+                        return f"Пропущено: {company_name}"
+
+                    suitable_mask[idx] = True
+                    suitable_researches[idx] = research_text
+                    suitable_industries[idx] = ind_str
+                    suitable_new_email[idx] = bool(email and last_sent_dt is None)
+                    row_skip_reason[idx] = "Підходить"
+                    if email:
+                        await self._record_sent(last_sent_map, email, company_name, company.get('title', ''))
+                    return f"Оброблено: {company_name}"
+                except Exception as ex:
+                    row_skip_reason[idx] = f"Помилка обробки: {ex}"
+                    return f"Помилка: {company_name or 'unknown'}"
+
+            await self._run_rows(companies, process_row)
 
             suitable_indices = [i for i, ok in enumerate(suitable_mask) if ok]
             suitable_researches_filtered = [suitable_researches[i] for i in suitable_indices]
@@ -426,7 +737,6 @@ class EmailProcessor:
 
             return report_path, suitable_path, resend_path
         finally:
-            if self.email_db and self.email_db.db_connector:
-                await self.email_db.db_connector.disconnect()
+            await self._flush_sent_records(final=True)
             await self.finish_process()
 
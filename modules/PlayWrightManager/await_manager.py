@@ -1,5 +1,9 @@
 import os
+import json
+import time
 import random
+import hashlib
+import tempfile
 import logging
 from typing import Optional
 from bs4 import BeautifulSoup
@@ -8,9 +12,27 @@ from playwright.async_api import async_playwright, Page, Browser, BrowserContext
 
 
 class PWBrowserManager:
-    def __init__(self, proxy_file_path: Optional[str] = None, use_proxy: bool = True):
+    def __init__(
+        self,
+        proxy_file_path: Optional[str] = None,
+        use_proxy: bool = True,
+        state_dir: Optional[str] = "data/browser_state",
+        state_ttl: int = 12 * 60 * 60
+    ):
+        """
+        Args:
+            proxy_file_path: File with proxies, one per line.
+            use_proxy: Whether to pick a random proxy when none is given explicitly.
+            state_dir: Directory for saved context storage state (cookies, localStorage), keyed by proxy.
+                None disables persistence.
+            state_ttl: Seconds after which a saved storage state is considered expired.
+        """
         self.use_proxy = use_proxy
         self.proxy_list = self._load_proxies(proxy_file_path)
+        self.state_dir = state_dir
+        self.state_ttl = state_ttl
+        self.proxy_server: Optional[str] = None
+        self.state_restored = False  # True if the current context was seeded from a saved state
         self.playwright: Optional[Playwright] = None
         self.browser: Optional[Browser] = None
         self.context: Optional[BrowserContext] = None
@@ -54,11 +76,72 @@ class PWBrowserManager:
             logging.error(f"PWBrowserManager [_parse_proxy]: Invalid proxy format: {proxy}. Error: {e}")
             raise ValueError("Invalid proxy format. Expected format: username:password@host:port")
 
+    def _state_path(self, proxy_server: Optional[str]) -> Optional[str]:
+        """Path of the saved storage state for a proxy (one file per proxy, 'direct' without proxy)."""
+        if not self.state_dir:
+            return None
+        key = hashlib.sha1((proxy_server or "direct").encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.state_dir, f"{key}.json")
+
+    def _load_storage_state(self, proxy_server: Optional[str]) -> Optional[dict]:
+        """Load a non-expired saved state for the proxy, dropping expired or broken files."""
+        path = self._state_path(proxy_server)
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                saved = json.load(file)
+            if time.time() - saved.get("saved_at", 0) > self.state_ttl:
+                logging.info("PWBrowserManager [_load_storage_state]: Saved state expired.")
+                self._remove_state_file(path)
+                return None
+            return saved
+        except (OSError, ValueError) as e:
+            logging.warning(f"PWBrowserManager [_load_storage_state]: Could not read saved state: {e}")
+            return None
+
+    async def save_storage_state(self):
+        """Save cookies and localStorage of the current context for reuse by the next run with the same proxy."""
+        path = self._state_path(self.proxy_server)
+        if not path or not self.context:
+            return
+        try:
+            state = await self.context.storage_state()
+            user_agent = await self.page.evaluate("navigator.userAgent") if self.page else None
+            os.makedirs(self.state_dir, exist_ok=True)
+            # Scraper threads without a proxy share one state file, so every writer gets its own temp file
+            fd, tmp_path = tempfile.mkstemp(dir=self.state_dir, prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                    json.dump({"saved_at": time.time(), "user_agent": user_agent, "storage_state": state}, file)
+                os.replace(tmp_path, path)
+            except BaseException:
+                self._remove_state_file(tmp_path)
+                raise
+        except Exception as e:
+            logging.warning(f"PWBrowserManager [save_storage_state]: Could not save state: {e}")
+
+    @staticmethod
+    def _remove_state_file(path: str):
+        """Delete a state file; another scraper thread sharing it may have removed it already."""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def invalidate_storage_state(self):
+        """Remove the saved state for the current proxy (e.g. when a captcha appears again)."""
+        path = self._state_path(self.proxy_server)
+        if path:
+            self._remove_state_file(path)
+        self.state_restored = False
+
     async def initialize_browser(self, is_headless: bool = True, proxy_server: Optional[str] = None) -> Page:
-        """Launch the browser and initialize a page."""
+        """Launch the browser and initialize a page, seeding the context from a saved state if available."""
         self.playwright = await async_playwright().start()
 
         proxy_server = proxy_server or (self._get_random_proxy() if self.use_proxy else None)
+        self.proxy_server = proxy_server
         browser_options = {"headless": is_headless}
 
         if proxy_server:
@@ -68,10 +151,16 @@ class PWBrowserManager:
                 logging.warning("PWBrowserManager [initialize_browser]: Proxy configuration skipped due to error.")
 
         self.browser = await self.playwright.chromium.launch(**browser_options)
-        self.context = await self.browser.new_context(
-            user_agent=self._get_random_user_agent(),
-            viewport=None
-        )
+
+        # Reuse cookies (consent, solved captcha session) together with the user agent they were issued to
+        saved_state = self._load_storage_state(proxy_server)
+        self.state_restored = saved_state is not None
+        context_options = {"viewport": None}
+        if saved_state:
+            context_options["storage_state"] = saved_state["storage_state"]
+        context_options["user_agent"] = (saved_state or {}).get("user_agent") or self._get_random_user_agent()
+
+        self.context = await self.browser.new_context(**context_options)
         self.page = await self.create_new_page()
         return self.page
     
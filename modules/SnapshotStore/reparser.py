@@ -0,0 +1,142 @@
+"""
+Пакетний повторний розбір збережених знімків оголошень без браузера та мережі.
+
+Запуск: python -m modules.SnapshotStore.reparser data/snapshots adverts_reparsed.jsonl --workers 8
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional
+
+from bs4 import BeautifulSoup
+
+from modules.SnapshotStore.snapshot_store import SnapshotStore
+from modules.WebScraper.utils import extract_contacts_from_text, formated_phone_number, parse_german_date
+
+try:
+    import lxml  # noqa: F401 - швидкий парсер, якщо встановлений
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+# Ті самі селектори, що й у WebScraper.process_select_advert
+ADVERT_FIELDS_IDS = {
+    "title": "detail-kopfbereich-titel",
+    "job_title": "detail-kopfbereich-hauptberuf",
+    "posted_date_txt": "detail-kopfbereich-veroeffentlichungsdatum",
+    "address": "detail-arbeitsorte-arbeitsort-0",
+    "location": "detail-kopfbereich-arbeitsort",
+    "employer_company_name": "detail-kopfbereich-firma",
+    "description": "detail-beschreibung-beschreibung",
+    "mail": "detail-bewerbung-mail",
+    "contact": "detail-bewerbung-adresse",
+}
+PHONE_IDS = ["detail-bewerbung-telefon-Telefon", "detail-bewerbung-telefon-Mobil"]
+
+
+def _text_by_id(soup: BeautifulSoup, element_id: str) -> Optional[str]:
+    element = soup.find(id=element_id)
+    if not element:
+        return None
+    return element.get_text("\n", strip=True) or None
+
+
+def extract_advert_from_html(html: str, sid: str, link: Optional[str] = None) -> dict:
+    """
+    Витягує поля оголошення зі збереженого HTML сторінки.
+    :return: Словник з тими ж ключами, що й результат WebScraper.process_select_advert
+             (без time_getting та session_id). Email і телефони, як і в парсері, без повторів,
+             але в порядку появи на сторінці: парсер зводить їх через set(), тому його порядок довільний.
+    """
+    soup = BeautifulSoup(html, HTML_PARSER)
+    texts = {key: _text_by_id(soup, element_id) for key, element_id in ADVERT_FIELDS_IDS.items()}
+
+    type_offer_block = soup.select_one(".arbeitszeiten")
+    type_offer_tags = [tag.get_text(strip=True) for tag in type_offer_block.select("span.tag")] if type_offer_block else []
+
+    mails_list, description_phones = extract_contacts_from_text(texts["description"])
+    if texts["mail"]:
+        mails_list.append(texts["mail"])
+
+    tels_list = []
+    for phone_text in [*filter(None, (_text_by_id(soup, phone_id) for phone_id in PHONE_IDS)), *description_phones]:
+        tels_list.append(formated_phone_number(phone_text) or phone_text)
+
+    employer_contact_person = None
+    for line in (texts["contact"] or "").split("\n"):
+        if 'Frau' in line or 'Herr' in line:
+            employer_contact_person = line
+
+    return {
+        "sid": sid,
+        "title": texts["title"],
+        "job_title": texts["job_title"] if texts["job_title"] and texts["job_title"].strip() else "unknown",
+        "address": texts["address"],
+        "location": texts["location"],
+        "type_offer": ",".join(type_offer_tags) if type_offer_tags else None,
+        "posted_date": parse_german_date(texts["posted_date_txt"]),
+        "posted_date_txt": texts["posted_date_txt"],
+        "employer_company_name": texts["employer_company_name"],
+        "employer_contact_person": employer_contact_person,
+        "email": ", ".join(dict.fromkeys(mails_list)),
+        "phone": ", ".join(dict.fromkeys(tels_list)),
+        "description": texts["description"],
+        "link": link,
+    }
+
+
+def _reparse_one(args: tuple[str, str]) -> Optional[dict]:
+    """
+    Розбирає один знімок (виконується в процесі-воркері).
+    Будь-яка помилка (відсутній об'єкт, пошкоджений .gz, збій розбору) повертається рядком {"sid", "error"},
+    щоб один зіпсований знімок не зупиняв увесь розбір.
+    """
+    root_dir, sid = args
+    try:
+        snapshot = SnapshotStore(root_dir).get(sid)
+        if not snapshot:
+            return None
+        ref, content = snapshot
+        if ref.get("kind") != "html":
+            return None
+        return extract_advert_from_html(content, sid, ref.get("link"))
+    except Exception as e:
+        return {"sid": sid, "error": str(e)}
+
+
+def reparse_snapshots(root_dir: str, workers: Optional[int] = None, chunksize: int = 64) -> Iterator[dict]:
+    """
+    Повторно розбирає всі знімки сховища в пулі процесів.
+    :param root_dir: Директорія SnapshotStore.
+    :param workers: Кількість процесів (за замовчуванням - кількість ядер).
+    :param chunksize: Скільки знімків передається воркеру за раз.
+    :return: Генератор словників з полями оголошень.
+    """
+    store = SnapshotStore(root_dir)
+    tasks = ((root_dir, sid) for sid in store.iter_sids())
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(_reparse_one, tasks, chunksize=chunksize):
+            if result:
+                yield result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Повторний розбір збережених знімків оголошень.")
+    parser.add_argument("root_dir", help="Директорія SnapshotStore")
+    parser.add_argument("output", help="Файл результатів у форматі JSON Lines")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunksize", type=int, default=64)
+    args = parser.parse_args()
+
+    count = errors = 0
+    with open(args.output, "w", encoding="utf-8") as file:
+        for advert in reparse_snapshots(args.root_dir, args.workers, args.chunksize):
+            count += 1
+            errors += 1 if "error" in advert else 0
+            file.write(json.dumps(advert, ensure_ascii=False) + "\n")
+    print(f"Розібрано знімків: {count}, з помилками: {errors}. Результат: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
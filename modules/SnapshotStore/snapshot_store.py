@@ -0,0 +1,137 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import time
+from typing import Iterator, Optional
+
+
+class SnapshotStore:
+    """
+    Content-addressed сховище сирих сторінок оголошень.
+
+    Структура каталогу:
+    - objects/<перші 2 символи>/<sha256>.gz - стиснутий вміст (однаковий вміст зберігається один раз);
+    - refs/<sid>.json - посилання sid -> хеш вмісту, тип ("html" або "json"), посилання та час збереження.
+
+    Політика зберігання: знімки не потрібні довше, ніж для повторного розбору свіжих оголошень,
+    тому purge(max_age_days) видаляє посилання, старші за max_age_days, і об'єкти, на які більше
+    ніхто не посилається. У застосунку це робиться при кожному створенні парсера (initial.py,
+    SNAPSHOT_RETENTION_DAYS).
+    """
+
+    def __init__(self, root_dir: str = "data/snapshots", compress_level: int = 6):
+        """
+        :param root_dir: Коренева директорія сховища.
+        :param compress_level: Рівень стиснення gzip (1 - швидше, 9 - менше місця).
+        """
+        self.root_dir = root_dir
+        self.compress_level = compress_level
+        self.objects_dir = os.path.join(root_dir, "objects")
+        self.refs_dir = os.path.join(root_dir, "refs")
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}.gz")
+
+    def _ref_path(self, sid: str) -> str:
+        return os.path.join(self.refs_dir, f"{sid}.json")
+
+    def put(self, sid: str, content: str | bytes, kind: str = "html", link: Optional[str] = None) -> str:
+        """
+        Зберігає знімок оголошення.
+        :param sid: Ідентифікатор оголошення.
+        :param content: Сирий HTML сторінки або JSON відповіді.
+        :param kind: Тип вмісту - "html" або "json".
+        :param link: Посилання на оголошення (для довідки).
+        :return: sha256 вмісту.
+        """
+        data = content.encode("utf-8") if isinstance(content, str) else content
+        digest = hashlib.sha256(data).hexdigest()
+
+        object_path = self._object_path(digest)
+        if os.path.exists(object_path):
+            # Свіжий час зміни, щоб purge не видалив об'єкт, на який щойно з'явилося посилання
+            os.utime(object_path)
+        else:
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            tmp_path = f"{object_path}.tmp"
+            with open(tmp_path, "wb") as file:
+                file.write(gzip.compress(data, compresslevel=self.compress_level))
+            os.replace(tmp_path, object_path)
+
+        os.makedirs(self.refs_dir, exist_ok=True)
+        ref = {"sid": sid, "digest": digest, "kind": kind, "link": link, "saved_at": time.time()}
+        with open(self._ref_path(sid), "w", encoding="utf-8") as file:
+            json.dump(ref, file)
+        return digest
+
+    async def put_async(self, sid: str, content: str | bytes, kind: str = "html", link: Optional[str] = None) -> str:
+        """Те саме, що put, але стиснення і запис виконуються в окремому потоці."""
+        return await asyncio.to_thread(self.put, sid, content, kind, link)
+
+    def get_ref(self, sid: str) -> Optional[dict]:
+        """Повертає метадані знімка за sid або None."""
+        path = self._ref_path(sid)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+
+    def get(self, sid: str) -> Optional[tuple[dict, str]]:
+        """
+        Повертає (метадані, вміст) знімка за sid або None.
+        """
+        ref = self.get_ref(sid)
+        if not ref:
+            return None
+        with open(self._object_path(ref["digest"]), "rb") as file:
+            return ref, gzip.decompress(file.read()).decode("utf-8")
+
+    def iter_sids(self) -> Iterator[str]:
+        """Перебирає sid усіх збережених знімків."""
+        if not os.path.isdir(self.refs_dir):
+            return
+        with os.scandir(self.refs_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".json"):
+                    yield entry.name[:-len(".json")]
+
+    def purge(self, max_age_days: float) -> tuple[int, int]:
+        """
+        Видаляє знімки, збережені раніше ніж max_age_days днів тому,
+        та об'єкти без посилань, які не змінювалися за цей час.
+        :param max_age_days: Скільки днів зберігати знімки.
+        :return: (кількість видалених знімків, кількість видалених об'єктів).
+        """
+        cutoff = time.time() - max_age_days * 24 * 60 * 60
+        live_digests = set()
+        removed_refs = 0
+        for sid in list(self.iter_sids()):
+            try:
+                ref = self.get_ref(sid)
+            except (OSError, ValueError):
+                ref = None  # пошкоджене посилання видаляється разом зі старими
+            if ref and ref.get("saved_at", 0) >= cutoff:
+                live_digests.add(ref.get("digest"))
+                continue
+            try:
+                os.remove(self._ref_path(sid))
+                removed_refs += 1
+            except FileNotFoundError:
+                pass
+
+        removed_objects = 0
+        if os.path.isdir(self.objects_dir):
+            for directory, _, names in os.walk(self.objects_dir):
+                for name in names:
+                    path = os.path.join(directory, name)
+                    if name.endswith(".gz") and name[:-len(".gz")] in live_digests:
+                        continue
+                    try:
+                        if os.path.getmtime(path) < cutoff:
+                            os.remove(path)
+                            removed_objects += 1
+                    except FileNotFoundError:
+                        pass
+        return removed_refs, removed_objects
@@ -1,10 +1,11 @@
 import asyncio
 import csv
+import html
 import os
 import tempfile
 from typing import List
 from aiogram import Dispatcher
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram import types
 from aiogram.enums import ParseMode
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
@@ -247,9 +248,8 @@ async def create_and_send_csv(message: types.Message, max_old=None, session_id=N
             "Мобільний номер", "Ім’я та прізвище керівника", 
             "Поштова адреса", "Посилання на вакансію"
         ])
-        # Записуємо дані
-        ds = await db_controller.get_all_adverts(max_old=max_old, session_id=session_id)
-        for dl in ds:
+        # Записуємо дані по мірі читання з бази, не тримаючи всю вибірку в пам'яті
+        async for dl in db_controller.stream_adverts(max_old=max_old, session_id=session_id):
             writer.writerow([
                 clean_txt(dl["title"]), clean_txt(dl["location"]), dl["type_offer"], 
                 dl["posted_date"], dl["employer_company_name"], 
@@ -265,6 +265,57 @@ async def create_and_send_csv(message: types.Message, max_old=None, session_id=N
     except Exception as e:
         print("Помилка в відправці csv:", e)
 
+# Повнотекстовий пошук оголошень
+SEARCH_PAGE_SIZE = 10
+
+async def search_adverts_handler(message: Message, command: CommandObject, state: FSMContext):
+    """
+    /search <слова> - пошук оголошень за назвою, професією, роботодавцем, місцем та описом.
+    """
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer("Вкажіть слова для пошуку, наприклад: <code>/search Pflege Berlin</code>", parse_mode=ParseMode.HTML)
+        return
+    await state.update_data(search_query=query)
+    await send_search_page(message, query, page=0)
+
+async def send_search_page(message: Message, query: str, page: int = 0, is_new_mess: bool = True):
+    """
+    Надсилає одну сторінку результатів пошуку з кнопками пагінації.
+    """
+    _, db_controller = await services.initialize()
+    # Беремо на один результат більше, щоб знати, чи є наступна сторінка
+    adverts = await db_controller.search_adverts(query, limit=SEARCH_PAGE_SIZE + 1, offset=page * SEARCH_PAGE_SIZE)
+    has_next = len(adverts) > SEARCH_PAGE_SIZE
+    adverts = adverts[:SEARCH_PAGE_SIZE]
+
+    if not adverts:
+        txt = f"За запитом <b>{html.escape(query)}</b> нічого не знайдено."
+    else:
+        lines = [f"Результати за запитом <b>{html.escape(query)}</b> (сторінка {page + 1}):"]
+        for number, advert in enumerate(adverts, start=page * SEARCH_PAGE_SIZE + 1):
+            lines.append(
+                f"{number}. <a href=\"{html.escape(advert['link'] or '')}\">{html.escape(clean_txt(advert['title']) or '')}</a>\n"
+                f"    {html.escape(clean_txt(advert['employer_company_name']) or '-')}, {html.escape(clean_txt(advert['location']) or '-')}"
+                f" ({str(advert['time_getting'])[:10]})"
+            )
+        txt = "\n".join(lines)
+
+    nav_btns = []
+    if page > 0:
+        nav_btns.append(InlineKeyboardButton(text="⬅️", callback_data=f"searchPage_{page - 1}"))
+    if has_next:
+        nav_btns.append(InlineKeyboardButton(text="➡️", callback_data=f"searchPage_{page + 1}"))
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        *([nav_btns] if nav_btns else []),
+        [InlineKeyboardButton(text="Закрити", callback_data="closeElement")]
+    ])
+
+    if is_new_mess:
+        await message.answer(txt, parse_mode=ParseMode.HTML, reply_markup=keyboard, disable_web_page_preview=True)
+    else:
+        await message.edit_text(txt, parse_mode=ParseMode.HTML, reply_markup=keyboard, disable_web_page_preview=True)
+
 async def process_file_handler(message: types.Message):
     """
     Handle file upload - routes to template or email processor based on file type.
@@ -421,6 +472,7 @@ async def _run_email_file_processing(message: types.Message, file_name: str) ->
                 "🆕 Підходящі компанії лише з новими поштовими адресами (раніше не відправляли)."
             ),
         )
+        await _send_text_with_retry(email_processor.ai_service.metrics.format_summary())
 
         # Delete progress message
         if progress_msg:
@@ -526,6 +578,15 @@ async def procc_callback_handler(callback: CallbackQuery, state: FSMContext):
     elif code == "apply_filters":
         await launch_handler(callback.message)
 
+    elif code == "searchPage":
+        search_query = (await state.get_data()).get("search_query")
+        if search_query:
+            try:
+                page = max(int(callback_list[1]), 0)
+            except:
+                page = 0
+            await send_search_page(callback.message, search_query, page, False)
+
     elif code == "closeElement" :
         await callback.message.delete()
 
@@ -539,6 +600,7 @@ def register_handlers(dp: Dispatcher):
     dp.message.register(stop_handler, Command("stop"))
     dp.message.register(get_id_handler, Command("id"))
     dp.message.register(get_two_captcha_service_balance, Command("tcp"))
+    dp.message.register(search_adverts_handler, Command("search"))
     
     # Реєстрація обробника файлів (роутинг всередині)
     dp.message.register(process_file_handler, F.document)
\ No newline at end of file
@@ -4,12 +4,16 @@ from twocaptcha import TwoCaptcha
 from concurrent.futures import ThreadPoolExecutor
 
 class TwoCaptchaService:
-    def __init__(self, api_key: str = None):
+    name = "2captcha"
+
+    def __init__(self, api_key: str = None, cost_per_captcha: float = 0.001):
         """
         Ініціалізація сервісу для роботи з 2Captcha.
         :param api_key: API-ключ для доступу до 2Captcha.
+        :param cost_per_captcha: Орієнтовна вартість однієї текстової капчі в USD (для бюджету сесії).
         """
         self.api_key = api_key or os.getenv('APIKEY_2CAPTCHA', 'YOUR_API_KEY')
+        self.cost_per_captcha = cost_per_captcha
         self.solver = TwoCaptcha(self.api_key)
         self.executor = ThreadPoolExecutor()
         self.error_captcha_solver = 0
@@ -28,6 +32,17 @@ class TwoCaptchaService:
         except Exception as e:
             raise Exception(f"Помилка отримання балансу: {e}")
 
+    async def get_balance_value(self) -> float:
+        """
+        Отримує доступний баланс користувача у вигляді числа (USD).
+        :raises Exception: Якщо виникає помилка при запиті балансу.
+        """
+        loop = asyncio.get_event_loop()
+        try:
+            return float(await loop.run_in_executor(self.executor, self.solver.balance))
+        except Exception as e:
+            raise Exception(f"Помилка отримання балансу: {e}")
+
     async def solve_text_captcha(self, image_path: str):
         """
         Вирішує текстову капчу.
@@ -1,7 +1,30 @@
 import re
+from datetime import date, timedelta
+from functools import lru_cache
 import phonenumbers
 from phonenumbers import PhoneNumberFormat
 
+# Шаблони контактних даних
+_EMAIL_PATTERN = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
+_PHONE_PATTERN = r'\+?[1-9]\d{0,3}(?:[ \-\(\)]*\d){7,14}'  # Коректно враховує форматування
+_EMAIL_RE = re.compile(_EMAIL_PATTERN)
+_PHONE_RE = re.compile(_PHONE_PATTERN)
+_CONTACT_RE = re.compile(f'(?P<email>{_EMAIL_PATTERN})|(?P<phone>{_PHONE_PATTERN})')
+_PHONE_SEPARATORS = str.maketrans('', '', ' -()')
+
+# Формати дат, які використовує сайт ("Veröffentlicht: 12.03.2025", "Veröffentlicht: heute" тощо)
+_DATE_DMY_RE = re.compile(r'\b(\d{1,2})\.(\d{1,2})\.(\d{4}|\d{2})\b')
+_DATE_ISO_RE = re.compile(r'\b(\d{4})-(\d{2})-(\d{2})\b')
+_DATE_MONTH_NAME_RE = re.compile(r'\b(\d{1,2})\.?\s+([a-zäöü]+)\.?\s+(\d{4})\b')
+_DATE_RELATIVE_RE = re.compile(r'\bvor\s+(\d+|einem|einer)\s+(tag|tagen|woche|wochen)\b')
+_DATE_DAY_WORDS = {"vorgestern": 2, "gestern": 1, "heute": 0}
+_GERMAN_MONTHS = {
+    "januar": 1, "jan": 1, "jänner": 1, "februar": 2, "feb": 2, "märz": 3, "mär": 3, "maerz": 3,
+    "april": 4, "apr": 4, "mai": 5, "juni": 6, "jun": 6, "juli": 7, "jul": 7, "august": 8, "aug": 8,
+    "september": 9, "sep": 9, "sept": 9, "oktober": 10, "okt": 10, "november": 11, "nov": 11,
+    "dezember": 12, "dez": 12,
+}
+
 def extract_numberic_value(text: str) -> int:
     """
     Витягує перше числове значення з тексту, незалежно від його розташування.
@@ -20,12 +43,13 @@ def extract_email_from_text(text: str | None) -> list:
     Витягує всі адреси електронних пошт з тексту.
     :return - повертає список
     """
-    email_pattern = re.compile(
-        r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
-    )
-    emails_lsit = email_pattern.findall(str(text))
+    emails_lsit = _EMAIL_RE.findall(str(text))
     return emails_lsit
 
+def _clean_phone_number(number: str) -> str:
+    """Прибирає форматування (пробіли, дефіси, дужки), яке допускає _PHONE_RE."""
+    return number.translate(_PHONE_SEPARATORS)
+
 def extract_phone_numbers_from_text(text: str | None) -> list:
     """
     Витягує всі міжнародні номери телефонів з тексту.
@@ -35,22 +59,127 @@ def extract_phone_numbers_from_text(text: str | None) -> list:
     if not text:
         return []
 
-    phone_pattern = re.compile(
-        r'\+?[1-9]\d{0,3}(?:[ \-\(\)]*\d){7,14}'  # Коректно враховує форматування
-    )
-    phone_numbers_list = phone_pattern.findall(text)
     # Очищення від зайвих символів, таких як пробіли, дужки тощо
-    cleaned_numbers = [re.sub(r'[^\d+]', '', number) for number in phone_numbers_list]
-    return cleaned_numbers
+    return [_clean_phone_number(number) for number in _PHONE_RE.findall(text)]
+
+def extract_contacts_from_text(text: str | None) -> tuple[list, list]:
+    """
+    Витягує електронні пошти та номери телефонів з тексту за один прохід.
+    Цифри всередині email-адрес не розпізнаються як телефонні номери.
+    :param text: Текст опису оголошення.
+    :return: (список email, список очищених номерів телефонів)
+    """
+    if not text:
+        return [], []
+
+    emails, phones = [], []
+    for match in _CONTACT_RE.finditer(text):
+        if match.lastgroup == "email":
+            emails.append(match.group())
+        else:
+            phones.append(_clean_phone_number(match.group()))
+    return emails, phones
 
-def formated_phone_number(text:str) -> str|None:
+@lru_cache(maxsize=4096)
+def formated_phone_number(text:str, default_region: str = "DE") -> str|None:
     """
     Форматує номер телефону
+    Номери без міжнародного префікса розбираються як номери регіону default_region.
     :return - повертає відформатований номер, або None
     """
     try:
-        x = phonenumbers.parse(str(text) , None)
+        x = phonenumbers.parse(str(text), default_region)
         formatted_number = phonenumbers.format_number(x, PhoneNumberFormat.INTERNATIONAL)
         return formatted_number
     except phonenumbers.NumberParseException:
-        return None
\ No newline at end of file
+        return None
+
+def _safe_date(year: int, month: int, day: int) -> date | None:
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+@lru_cache(maxsize=4096)
+def _parse_german_date_cached(text: str, today_iso: str) -> str | None:
+    """
+    Розбирає дату з тексту відносно дати today_iso.
+    Дата "сьогодні" входить у ключ кешу, щоб відносні фрази ("heute", "gestern") не застарівали після півночі.
+    """
+    today = date.fromisoformat(today_iso)
+    txt = text.lower()
+
+    match = _DATE_DMY_RE.search(txt)
+    if match:
+        day, month, year = (int(x) for x in match.groups())
+        if year < 100:
+            year += 2000
+        parsed = _safe_date(year, month, day)
+        return parsed.isoformat() if parsed else None
+
+    match = _DATE_ISO_RE.search(txt)
+    if match:
+        parsed = _safe_date(*(int(x) for x in match.groups()))
+        return parsed.isoformat() if parsed else None
+
+    match = _DATE_MONTH_NAME_RE.search(txt)
+    if match and match.group(2) in _GERMAN_MONTHS:
+        parsed = _safe_date(int(match.group(3)), _GERMAN_MONTHS[match.group(2)], int(match.group(1)))
+        return parsed.isoformat() if parsed else None
+
+    for word, days_ago in _DATE_DAY_WORDS.items():
+        if word in txt:
+            return (today - timedelta(days=days_ago)).isoformat()
+
+    match = _DATE_RELATIVE_RE.search(txt)
+    if match:
+        amount = 1 if match.group(1) in ("einem", "einer") else int(match.group(1))
+        days = amount * 7 if match.group(2).startswith("woche") else amount
+        return (today - timedelta(days=days)).isoformat()
+
+    # Невідомий формат - повільний, але універсальний розбір
+    import dateparser
+    parsed = dateparser.parse(text, languages=["de"])
+    return parsed.strftime('%Y-%m-%d') if parsed else None
+
+def parse_german_date(text: str | None) -> str | None:
+    """
+    Перетворює дату публікації оголошення у формат 'YYYY-MM-DD'.
+    Відомі формати сайту розбираються попередньо скомпільованими шаблонами,
+    dateparser використовується лише для невідомих рядків.
+    :param text: Текст на кшталт "Veröffentlicht: 12.03.2025" або "Veröffentlicht: gestern".
+    :return: Дата у форматі 'YYYY-MM-DD' або None.
+    """
+    if not text or not str(text).strip():
+        return None
+    return _parse_german_date_cached(" ".join(str(text).split()), date.today().isoformat())
+
+
+if __name__ == "__main__":
+    # Мікробенчмарк: розбір дати публікації на одне оголошення (python -m modules.WebScraper.utils)
+    import timeit
+    import dateparser
+
+    samples = [
+        "Veröffentlicht: 12.03.2025", "Veröffentlicht: 01.04.2025", "Veröffentlicht: heute",
+        "Veröffentlicht: gestern", "Veröffentlicht: vor 3 Tagen", "Veröffentlicht: 7. März 2025",
+    ]
+    rounds = 200
+
+    def run_dateparser():
+        for sample in samples:
+            dateparser.parse(sample)
+
+    def run_fast_path():
+        _parse_german_date_cached.cache_clear()
+        for sample in samples:
+            parse_german_date(sample)
+
+    def run_cached():
+        for sample in samples:
+            parse_german_date(sample)
+
+    run_dateparser()  # прогрів (завантаження мовних даних dateparser)
+    for name, func in (("dateparser.parse", run_dateparser), ("parse_german_date (без кешу)", run_fast_path), ("parse_german_date (кеш)", run_cached)):
+        elapsed = timeit.timeit(func, number=rounds)
+        print(f"{name:32} {elapsed / (rounds * len(samples)) * 1e6:10.1f} мкс на оголошення")
@@ -10,14 +10,15 @@ from datetime import datetime
 from asyncio import Lock
 import multiprocessing
 import traceback
-import dateparser
 from config import WEB_SCRAPER_LOG_PATH
-from modules.DatabaceSQLiteController.async_sq_lite_connector import AsyncAdvertsDatabase
+from modules.DatabaceSQLiteController.async_sq_lite_connector import AsyncAdvertsDatabase, format_db_datetime
 from modules.MainLogger.logger import setup_logger_from_yaml
 from modules.PlayWrightManager.await_manager import PWBrowserManager
+from modules.SnapshotStore.snapshot_store import SnapshotStore
 
+from modules.CaptchaBroker.captcha_broker import CaptchaBroker, CaptchaBudgetExceeded
 from modules.TwoCaptchaSolver.two_captcha_solver import TwoCaptchaService
-from modules.WebScraper.utils import extract_email_from_text, extract_numberic_value, extract_phone_numbers_from_text, formated_phone_number
+from modules.WebScraper.utils import extract_contacts_from_text, extract_numberic_value, formated_phone_number, parse_german_date
 from typess import FiltrOption, JobParams, ScraperStatus
 
 lock = Lock()
@@ -33,7 +34,10 @@ class WebScraper:
         log_path: str = WEB_SCRAPER_LOG_PATH,
         start_url: str = "https://www.arbeitsagentur.de",
         work_url: str = None,
-        captcha_token:str = None
+        captcha_token:str = None,
+        captcha_providers: list | None = None,
+        captcha_session_budget: float | None = None,
+        snapshot_store: SnapshotStore | None = None
     ):
         
         self.filtr_params = filtr_params
@@ -45,8 +49,19 @@ class WebScraper:
         self.thread_id = thread_id
         self.browser_manager = PWBrowserManager()
         self.captcha_service = TwoCaptchaService(captcha_token) if captcha_token else None
+        # Брокер капч: за замовчуванням лише 2Captcha, додаткові провайдери передаються через captcha_providers
+        if captcha_providers is None:
+            captcha_providers = [self.captcha_service] if self.captcha_service else []
+        self.captcha_broker = CaptchaBroker(
+            captcha_providers,
+            max_session_spend=captcha_session_budget,
+            logger=logger
+        ) if captcha_providers else None
         self.browser_page = None
         self.browser_page_advert = None
+        # Сирий HTML оголошень для повторного розбору без мережі (modules/SnapshotStore/reparser.py);
+        # None - знімки не зберігаються (вмикаються в initial.py через SCRAPER_SNAPSHOTS=1)
+        self.snapshot_store = snapshot_store
         self.site_id = site_id
         self.logger = logger if logger else setup_logger_from_yaml(log_path=log_path)
 
@@ -90,7 +105,10 @@ class WebScraper:
                 self.filtr_params = f_params
             
             self.work_status = ScraperStatus.WORKING
-            self.session_id = datetime.now()
+            # Числовий ідентифікатор сесії (мс від epoch): однаково зберігається в SQLite INTEGER і MySQL BIGINT
+            self.session_id = time.time_ns() // 1_000_000
+            if self.captcha_broker:
+                await self.captcha_broker.start_session()
 
             self.logger.info(f"Thread {self.thread_id}: Starting scraper.")
             await self.get_existing_list_from_BD(1)
@@ -121,6 +139,10 @@ class WebScraper:
         """Завершує роботу парсера."""
         self.work_status = ScraperStatus.STOPED
         self.logger.info(f"Thread {self.thread_id}: Stopping scraper.")
+        try:
+            await self.db_controller.flush_adverts()
+        except Exception as e:
+            self.logger.critical(f"Web Scraper [_stop]. Не вдалося записати буфер оголошень у Базу Даних: {e}")
         if self.browser_page:
             await self.browser_manager.close_browser()
         if self.browser_page_advert:
@@ -133,7 +155,7 @@ class WebScraper:
 
     async def set_advert_to_BD(self, data:dict):
         try:
-            await self.db_controller.add_advert(**data)
+            await self.db_controller.add_advert_buffered(**data)
         except Exception as e:
             self.logger.critical(f"Web Scraper [set_advert_to_BD]. При передачі оголошення в Базу Даних сталася помилка: {e}")
             raise Exception(e)
@@ -142,8 +164,7 @@ class WebScraper:
         links = []
 
         if max_old and max_old>0:
-            results = await self.db_controller.get_all_adverts(max_old)
-            links = [row['link'] for row in results]
+            links = await self.db_controller.get_recent_links(max_old)
         self.existing_links = links
 
     async def process_select_advert(self, advert_item):
@@ -217,12 +238,7 @@ class WebScraper:
             return ",".join(tags_list) if tags_list else None
 
         async def get_data_posted(txt:str):
-            if txt: 
-                time_all = dateparser.parse(str(txt))
-                if time_all:
-                    formatted_date = time_all.strftime('%Y-%m-%d')
-                    return formatted_date
-            return None
+            return parse_german_date(txt)
 
         # При не відображенні контактної форми, перевіряємо на наявність каптчі і вирішуємо її
         contact_form = await self.get_visible_element(self.browser_page_advert, ".angebotskontakt")
@@ -252,8 +268,8 @@ class WebScraper:
         time_posted_block_text = await self.get_text_from_element(time_posted_block)
         time_posted_block_date = await get_data_posted(time_posted_block_text)
         employer_company_name_text = await self.get_text_from_element(employer_company_name_block)
-        mails_list = extract_email_from_text(await self.get_text_from_element(description_block))
-        add_tels_list = extract_phone_numbers_from_text(await self.get_text_from_element(description_block)) # список номерів з опису
+        description_text = await self.get_text_from_element(description_block)
+        mails_list, add_tels_list = extract_contacts_from_text(description_text) # пошти та номери з опису
         tels_list = [] # фінальний список телефонних номерів зі всієї сторінки
         contact_block_text = await self.get_text_from_element(contact_block)
         employer_contact_person_text = None
@@ -297,12 +313,28 @@ class WebScraper:
             "email" : ", ".join(mails_list),
             "phone": ", ".join(tels_list),
             "link" : self._extrack_clean_url(advert_href),
-            "time_getting" : str(datetime.now().isoformat()),
-            "session_id" : self.session_id
+            "time_getting" : format_db_datetime(datetime.now()),
+            "session_id" : self.session_id,
+            "description" : description_text
         }
 
+        await self.save_advert_snapshot(adverts_result_dict["sid"], adverts_result_dict["link"])
+
         return adverts_result_dict
 
+    async def save_advert_snapshot(self, sid: str, link: str):
+        """
+        Зберігає сирий HTML сторінки оголошення у сховище знімків, якщо його передано.
+        Помилка збереження не перериває обробку оголошення.
+        """
+        if not self.snapshot_store:
+            return
+        try:
+            html = await self.browser_page_advert.content()
+            await self.snapshot_store.put_async(sid, html, kind="html", link=link)
+        except Exception as e:
+            self.logger.error(f"Не вдалося зберегти знімок оголошення {sid}: {e}")
+
     async def process_adverts_list(self):
         """
         Обробляє оголошення на сторінці:
@@ -427,7 +459,16 @@ class WebScraper:
         """
 
         modeal_id_name = "#bahf-cookie-disclaimer-modal"
-        await self.browser_page.wait_for_selector(modeal_id_name, timeout=10000)
+        # Зі збереженою сесією згода вже надана, тому модальне вікно довго не чекаємо
+        timeout = 2000 if self.browser_manager.state_restored else 10000
+        try:
+            await self.browser_page.wait_for_selector(modeal_id_name, timeout=timeout)
+        except Exception:
+            if not self.browser_manager.state_restored:
+                raise
+            self.logger.info("Модальне вікно cookie не з'явилося, використовується збережена сесія.")
+            return
+
         modal_container = self.browser_page.locator(modeal_id_name)
         
         if await modal_container.count() > 0:
@@ -436,6 +477,7 @@ class WebScraper:
             modal_comfirm_btn = modal_container.locator('button[data-testid="bahf-cookie-disclaimer-btn-alle"]')
             await modal_comfirm_btn.click(force=True)
             await self.browser_page.wait_for_timeout(2000)
+            await self.browser_manager.save_storage_state()
 
     async def get_visible_element(self, select_page, selector, timeout=2000):
         """
@@ -478,6 +520,12 @@ class WebScraper:
         captcha_block = await self.is_have_captcha(self.browser_page_advert)
         if captcha_block:
             print("Виявлено каптчу! -------")
+            # Збережена сесія більше не звільняє від каптчі
+            self.browser_manager.invalidate_storage_state()
+            if not self.captcha_broker:
+                self.logger.error("Не налаштовано жодного сервісу для розв'язання каптчі.")
+                return
+
             for i in range(3):
                 print(f"Проходження каптчі спроба #{i}")
                 captcha_image_path = self.browser_page_advert.locator("#kontaktdaten-captcha-image")
@@ -491,7 +539,7 @@ class WebScraper:
                 print("Посилання на зображення каптчі", captcha_image_path)
             
                 try:
-                    result = await self.captcha_service.solve_text_captcha(captcha_image_path)
+                    result = await self.captcha_broker.solve(captcha_image_path)
 
                     if await captcha_result_input.count()>0:
                         await captcha_result_input.first.fill(result["code"])
@@ -501,17 +549,21 @@ class WebScraper:
                     error_captcha_block = await self.get_visible_element(self.browser_page_advert, "p#kontaktdaten-captcha-input-fehler:has-text('Die von Ihnen eingegebenen Zeichen waren nicht korrekt')", 2000)
 
                     if error_captcha_block:
-                        self.logger.warning(f"Каптча id#{result['captchaId']} НЕ ПРИЙНЯТО!")
+                        self.logger.warning(f"Каптча id#{result['captchaId']} ({result['provider']}) НЕ ПРИЙНЯТО!")
                     else:
-                        self.logger.info(f"Каптча id#{result['captchaId']} УСПІШНО!")
+                        self.logger.info(f"Каптча id#{result['captchaId']} ({result['provider']}) УСПІШНО!")
 
-                    await self.captcha_service.report_result(result['captchaId'], False if error_captcha_block else True)
+                    await self.captcha_broker.report(result, False if error_captcha_block else True)
                     if not error_captcha_block:
+                        await self.browser_manager.save_storage_state()
                         break
+                except CaptchaBudgetExceeded as e:
+                    self.logger.error(f"{e} Каптча не розв'язуватиметься до наступної сесії.")
+                    break
                 except Exception as e:
-                    self.logger.error(f"Cервіс 2Captcha повернув помилку - {e} .")
-
-                await asyncio.sleep(3)
+                    self.logger.error(f"Сервіс розв'язання каптчі повернув помилку - {e} .")
+                    # Пауза лише після помилки сервісу; відхилена відповідь одразу йде на нове зображення
+                    await asyncio.sleep(1 + i)
 
         else:
             print("Каптчі немає! -------")
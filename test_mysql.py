@@ -0,0 +1,508 @@
+"""
+Заміна пулу aiomysql для перевірки MySQL-шляху без сервера.
+
+    python test_mysql.py
+
+MySQLStubPool передається в AsyncMySQLConnector(pool=...). Запити виконуються у файлі SQLite,
+але так, як їх побачив би MySQL у strict mode:
+- параметри підставляються за правилами pymysql ('%s', '%%'; інші '%' - помилка форматування);
+- DDL з migrations.py (AUTO_INCREMENT, ENGINE, INDEX у CREATE TABLE, FULLTEXT) перекладається на SQLite;
+- значення в INSERT перевіряються за типами колонок MySQL (ціле, DATETIME, DATE, довжина VARCHAR/TEXT)
+  і відхиляються з тими самими кодами помилок, що й у сервера;
+- ON DUPLICATE KEY UPDATE, information_schema.tables/statistics та MATCH ... AGAINST (BOOLEAN MODE) емулюються;
+- повторне створення індексу відхиляється з кодом 1061 (Duplicate key name), як у сервера;
+- колонки DATETIME/TIMESTAMP/DATE повертаються як datetime/date, як це робить aiomysql.
+"""
+
+import asyncio
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+_INT_TYPES = {"TINYINT", "SMALLINT", "MEDIUMINT", "INT", "INTEGER", "BIGINT"}
+_DATETIME_TYPES = {"DATETIME", "TIMESTAMP"}
+_TEXT_LIMITS = {"TINYTEXT": 255, "TEXT": 65535, "MEDIUMTEXT": 16777215, "LONGTEXT": 4294967295}
+
+_INT_VALUE_RE = re.compile(r"^\s*[+-]?\d+\s*$")
+_DATETIME_VALUE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}:\d{2}(\.\d{1,6})?)?$")
+_DATE_VALUE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}")
+_FORMAT_RE = re.compile(r"%(.)", re.DOTALL)
+
+_CREATE_TABLE_RE = re.compile(
+    r"^\s*CREATE\s+TABLE\s+(IF\s+NOT\s+EXISTS\s+)?(\w+)\s*\((.*)\)\s*([^)]*)$", re.IGNORECASE | re.DOTALL
+)
+_CREATE_FULLTEXT_RE = re.compile(r"^\s*CREATE\s+FULLTEXT\s+INDEX\s+(\w+)\s+ON\s+(\w+)\s*\(([^)]*)\)\s*$", re.IGNORECASE)
+_INSERT_RE = re.compile(r"^\s*INSERT\s+INTO\s+(\w+)\s*\(([^)]*)\)\s*VALUES\s*\((.*?)\)(\s+ON\s+|\s*$)", re.IGNORECASE | re.DOTALL)
+_MATCH_RE = re.compile(r"MATCH\s*\(([^)]*)\)\s*AGAINST\s*\(\s*\?\s+IN\s+BOOLEAN\s+MODE\s*\)", re.IGNORECASE)
+_FROM_RE = re.compile(r"\bFROM\s+(\w+)", re.IGNORECASE)
+_WORD_RE = re.compile(r"\w+")
+
+# innodb_ft_min_token_size: коротші слова FULLTEXT не індексує і в запиті ігнорує
+_FT_MIN_TOKEN_SIZE = 3
+
+
+class MySQLStubError(Exception):
+    """Помилка сервера у форматі pymysql: args = (код, повідомлення)."""
+
+
+def _split_top_level(text: str) -> List[str]:
+    """Ділить текст за комами верхнього рівня (коми в дужках не враховуються)."""
+    parts, depth, current = [], 0, []
+    for char in text:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        if char == "," and depth == 0:
+            parts.append("".join(current).strip())
+            current = []
+        else:
+            current.append(char)
+    if "".join(current).strip():
+        parts.append("".join(current).strip())
+    return parts
+
+
+def _columns(text: str) -> List[str]:
+    return [column.strip().strip("`") for column in text.split(",") if column.strip()]
+
+
+def _boolean_match(query: str, *values) -> float:
+    """
+    Релевантність MATCH ... AGAINST (... IN BOOLEAN MODE): '+слово' обов'язкове, 'слово*' - префікс.
+    Повертає 0, якщо рядок не відповідає запиту.
+    """
+    tokens = _WORD_RE.findall(" ".join(str(value) for value in values if value is not None).lower())
+    score = 0.0
+    for term in query.split():
+        required = term.startswith("+")
+        prefix = term.endswith("*")
+        word = term.strip('+-*"').lower()
+        if len(word) < _FT_MIN_TOKEN_SIZE:
+            continue
+        hits = sum(1 for token in tokens if token == word or (prefix and token.startswith(word)))
+        if required and not hits:
+            return 0.0
+        score += hits
+    return score
+
+
+class _StubCursor:
+    """Курсор у стилі aiomysql поверх курсора sqlite3."""
+
+    def __init__(self, connection: "_StubConnection"):
+        self._connection = connection
+        self._cursor = connection.sqlite.cursor()
+        self._table: Optional[str] = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        self._cursor.close()
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    async def execute(self, query: str, args=None):
+        await self._run(query, [args])
+
+    async def executemany(self, query: str, args):
+        await self._run(query, list(args))
+
+    async def _run(self, query: str, args_list: list):
+        pool = self._connection.pool
+        if args_list == [None]:
+            # pymysql форматує запит лише за наявності аргументів
+            sqlite_query, params_list = query, [()]
+        else:
+            sqlite_query = None
+            params_list = []
+            for args in args_list:
+                sqlite_query, params = pool.format_query(query, tuple(args))
+                params_list.append(params)
+
+        statements, params_list = pool.translate(sqlite_query, params_list)
+        self._table = (_FROM_RE.search(sqlite_query) or [None, None])[1]
+        try:
+            for statement in statements:
+                if len(params_list) == 1:
+                    self._cursor.execute(statement, params_list[0])
+                else:
+                    self._cursor.executemany(statement, params_list)
+        except sqlite3.IntegrityError as err:
+            raise MySQLStubError(1062 if "UNIQUE" in str(err) else 1048, str(err)) from err
+        except sqlite3.Error as err:
+            if re.match(r"index \w+ already exists", str(err)):
+                raise MySQLStubError(1061, f"Duplicate key name: {err}") from err
+            raise MySQLStubError(1064, f"{err}: {sqlite_query}") from err
+
+    def _convert(self, rows):
+        return [self._connection.pool.convert_row(self._table, self.description, row) for row in rows]
+
+    async def fetchall(self):
+        return self._convert(self._cursor.fetchall())
+
+    async def fetchone(self):
+        row = self._cursor.fetchone()
+        return self._convert([row])[0] if row is not None else None
+
+    async def fetchmany(self, size: int = 1):
+        return self._convert(self._cursor.fetchmany(size))
+
+
+class _StubConnection:
+    """Підключення у стилі aiomysql (autocommit=False): одне підключення sqlite3 на підключення пулу."""
+
+    def __init__(self, pool: "MySQLStubPool"):
+        self.pool = pool
+        self.sqlite = sqlite3.connect(pool.path, timeout=5)
+        self.sqlite.create_function("mysql_match", -1, _boolean_match, deterministic=True)
+        self.sqlite.create_function("DATABASE", 0, lambda: "main", deterministic=True)
+
+    def cursor(self, *cursor_class):
+        return _StubCursor(self)
+
+    async def begin(self):
+        self.sqlite.commit()
+
+    async def commit(self):
+        self.sqlite.commit()
+
+    async def rollback(self):
+        self.sqlite.rollback()
+
+    def close(self):
+        self.sqlite.close()
+
+
+class MySQLStubPool:
+    """
+    Пул підключень з інтерфейсом aiomysql (acquire/release/close/wait_closed),
+    що виконує MySQL-запити у файлі SQLite з перевірками strict mode.
+    """
+
+    def __init__(self, path: Optional[str] = None, maxsize: int = 10):
+        """
+        :param path: Файл бази SQLite (за замовчуванням - тимчасовий, видаляється в wait_closed).
+        :param maxsize: Максимальна кількість одночасно виданих підключень.
+        """
+        self._temporary = path is None
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="mysql_stub_", suffix=".db")
+            os.close(fd)
+        self.path = path
+        self.maxsize = maxsize
+        # table -> column -> (тип MySQL, довжина або None)
+        self.schema: Dict[str, Dict[str, Tuple[str, Optional[int]]]] = {}
+        # table -> набори колонок FULLTEXT-індексів
+        self.fulltext: Dict[str, List[frozenset]] = {}
+        # назва FULLTEXT-індексу -> table (для information_schema.statistics)
+        self.fulltext_names: Dict[str, str] = {}
+        self._free: List[_StubConnection] = []
+        self._all: List[_StubConnection] = []
+        self._semaphore = asyncio.Semaphore(maxsize)
+        with sqlite3.connect(self.path) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+
+    async def acquire(self) -> _StubConnection:
+        await self._semaphore.acquire()
+        if self._free:
+            return self._free.pop()
+        connection = _StubConnection(self)
+        self._all.append(connection)
+        return connection
+
+    def release(self, connection: _StubConnection):
+        connection.sqlite.rollback()
+        self._free.append(connection)
+        self._semaphore.release()
+
+    def close(self):
+        for connection in self._all:
+            connection.close()
+        self._all, self._free = [], []
+
+    async def wait_closed(self):
+        if self._temporary:
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    os.remove(self.path + suffix)
+                except FileNotFoundError:
+                    pass
+
+    @staticmethod
+    def format_query(query: str, args: tuple) -> Tuple[str, tuple]:
+        """
+        Підстановка параметрів як у pymysql (query % args): '%s' - параметр, '%%' - знак '%'.
+        Повертає запит з '?' для sqlite3 і параметри.
+        """
+        params = list(args)
+        used = 0
+
+        def replace(match):
+            nonlocal used
+            code = match.group(1)
+            if code == "%":
+                return "%"
+            if code != "s":
+                raise ValueError(f"unsupported format character {code!r} in query")
+            used += 1
+            return "?"
+
+        formatted = _FORMAT_RE.sub(replace, query)
+        if used > len(params):
+            raise TypeError("not enough arguments for format string")
+        if used < len(params):
+            raise TypeError("not all arguments converted during string formatting")
+        return formatted, tuple(params)
+
+    def translate(self, query: str, params_list: List[tuple]) -> Tuple[List[str], List[tuple]]:
+        """Перекладає запит MySQL на SQLite, перевіряючи значення INSERT за схемою."""
+        create_table = _CREATE_TABLE_RE.match(query)
+        if create_table:
+            return self._translate_create_table(create_table), params_list
+
+        fulltext = _CREATE_FULLTEXT_RE.match(query)
+        if fulltext:
+            name, table, columns = fulltext.groups()
+            if name in self.fulltext_names:
+                raise MySQLStubError(1061, f"Duplicate key name '{name}'")
+            self.fulltext_names[name] = table
+            self.fulltext.setdefault(table, []).append(frozenset(_columns(columns)))
+            return [], params_list
+
+        insert = _INSERT_RE.match(query)
+        if insert:
+            params_list = self._check_insert(insert, params_list)
+
+        query = query.replace("ON DUPLICATE KEY UPDATE", "ON CONFLICT DO UPDATE SET")
+        query = re.sub(r"VALUES\((\w+)\)", r"excluded.\1", query)
+        query = query.replace("CURRENT_TIMESTAMP", "(datetime('now', 'localtime'))")
+        query = query.replace(
+            "information_schema.tables",
+            "(SELECT name AS table_name, 'main' AS table_schema FROM sqlite_master WHERE type = 'table')"
+        )
+        query = query.replace("information_schema.statistics", self._statistics_subquery())
+        query = _MATCH_RE.sub(lambda match: self._translate_match(query, match), query)
+        return [query], params_list
+
+    def _statistics_subquery(self) -> str:
+        """information_schema.statistics: індекси SQLite та емульовані FULLTEXT-індекси."""
+        fulltext = "".join(
+            f" UNION ALL SELECT '{name}', '{table}', 'main'" for name, table in self.fulltext_names.items()
+        )
+        return (
+            "(SELECT name AS index_name, tbl_name AS table_name, 'main' AS table_schema "
+            f"FROM sqlite_master WHERE type = 'index'{fulltext})"
+        )
+
+    def _translate_create_table(self, match) -> List[str]:
+        if_not_exists, table, body, _options = match.groups()
+        columns, definitions, indexes = {}, [], []
+        for part in _split_top_level(body):
+            first = part.split()[0].upper()
+            if first in ("INDEX", "KEY"):
+                name, index_columns = re.match(r"\w+\s+(\w+)\s*\(([^)]*)\)", part).groups()
+                indexes.append(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({index_columns})")
+                continue
+            if first not in ("PRIMARY", "UNIQUE", "CONSTRAINT", "FULLTEXT"):
+                name, column_type = part.split()[:2]
+                length = re.search(r"\((\d+)\)", column_type)
+                columns[name.strip("`")] = (column_type.split("(")[0].upper(), int(length.group(1)) if length else None)
+                part = re.sub(r"\bBIGINT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY", "INTEGER PRIMARY KEY AUTOINCREMENT", part, flags=re.IGNORECASE)
+                part = part.replace("CURRENT_TIMESTAMP", "(datetime('now', 'localtime'))")
+            definitions.append(part)
+        if table not in self.schema or not if_not_exists:
+            self.schema[table] = columns
+        create = f"CREATE TABLE {if_not_exists or ''}{table} ({', '.join(definitions)})"
+        return [create, *indexes]
+
+    def _translate_match(self, query: str, match) -> str:
+        columns = _columns(match.group(1))
+        table = (_FROM_RE.search(query) or [None, None])[1]
+        if frozenset(columns) not in self.fulltext.get(table, []):
+            raise MySQLStubError(1191, "Can't find FULLTEXT index matching the column list")
+        return f"mysql_match(?, {', '.join(columns)})"
+
+    def _check_insert(self, match, params_list: List[tuple]) -> List[tuple]:
+        """Strict mode: значення, які MySQL не прийняв би, відхиляють увесь запит."""
+        table = match.group(1)
+        columns = _columns(match.group(2))
+        values = _split_top_level(match.group(3))
+        placeholder_columns = [column for column, value in zip(columns, values) if value.strip() == "?"]
+        types = self.schema.get(table, {})
+        checked = []
+        for row_number, params in enumerate(params_list, start=1):
+            row = list(params)
+            for index, column in enumerate(placeholder_columns[:len(row)]):
+                if column in types:
+                    row[index] = self._check_value(types[column], column, row[index], row_number)
+            checked.append(tuple(row))
+        return checked
+
+    @staticmethod
+    def _check_value(column_type: Tuple[str, Optional[int]], column: str, value, row_number: int):
+        kind, length = column_type
+        if value is None:
+            return None
+        if kind in _INT_TYPES:
+            if isinstance(value, (bool, int)):
+                return int(value)
+            if isinstance(value, float):
+                return round(value)
+            if isinstance(value, str) and _INT_VALUE_RE.match(value):
+                return int(value)
+            raise MySQLStubError(1366, f"Incorrect integer value: '{value}' for column '{column}' at row {row_number}")
+        if kind in _DATETIME_TYPES:
+            if isinstance(value, datetime):
+                return value.strftime("%Y-%m-%d %H:%M:%S")
+            if isinstance(value, date):
+                return value.strftime("%Y-%m-%d 00:00:00")
+            if isinstance(value, str) and _DATETIME_VALUE_RE.match(value):
+                return value.replace("T", " ")[:19]
+            raise MySQLStubError(1292, f"Incorrect datetime value: '{value}' for column '{column}' at row {row_number}")
+        if kind == "DATE":
+            if isinstance(value, (date, datetime)):
+                return value.strftime("%Y-%m-%d")
+            if isinstance(value, str) and _DATE_VALUE_RE.match(value):
+                return value[:10]
+            raise MySQLStubError(1292, f"Incorrect date value: '{value}' for column '{column}' at row {row_number}")
+        limit = length if kind in ("VARCHAR", "CHAR") else _TEXT_LIMITS.get(kind)
+        if limit is not None:
+            text = str(value)
+            size = len(text) if kind in ("VARCHAR", "CHAR") else len(text.encode("utf-8"))
+            if size > limit:
+                raise MySQLStubError(1406, f"Data too long for column '{column}' at row {row_number}")
+            return text
+        return value
+
+    def convert_row(self, table: Optional[str], description, row: tuple) -> tuple:
+        """DATETIME/TIMESTAMP -> datetime, DATE -> date, як повертає aiomysql."""
+        types = self.schema.get(table or "", {})
+        converted = list(row)
+        for index, column in enumerate(description or ()):
+            kind = types.get(column[0], (None, None))[0]
+            value = converted[index]
+            if not isinstance(value, str):
+                continue
+            try:
+                if kind in _DATETIME_TYPES:
+                    converted[index] = datetime.strptime(value[:19], "%Y-%m-%d %H:%M:%S")
+                elif kind == "DATE":
+                    converted[index] = date.fromisoformat(value[:10])
+            except ValueError:
+                pass
+        return tuple(converted)
+
+
+async def run_smoke_check() -> bool:
+    """
+    Проходить MySQL-шлях від початку до кінця: міграції, пакетний upsert оголошень у форматі парсера,
+    повторний upsert, фільтри звітів, потокове читання, FULLTEXT-пошук, sent_emails та кеш досліджень.
+    :return: True, якщо всі перевірки пройшли.
+    """
+    from modules.AIService.research_cache import ResearchCache
+    from modules.DatabaceSQLiteController.async_sq_lite_connector import AsyncAdvertsDatabase, EmailDatabase, format_db_datetime
+    from modules.DatabaseController.async_mysql_connector import AsyncMySQLConnector
+
+    pool = MySQLStubPool()
+    connector = AsyncMySQLConnector("stub", "stub", "", "stub", pool=pool)
+    failures = []
+
+    def check(name: str, condition: bool):
+        print(f"{'OK  ' if condition else 'FAIL'} {name}")
+        if not condition:
+            failures.append(name)
+
+    try:
+        await connector.connect()
+        adverts = AsyncAdvertsDatabase(connector, database_table="adverts", batch_size=100)
+        await adverts.table_check()
+        await adverts.table_check()  # повторний старт не застосовує міграції вдруге
+        check("таблиця adverts існує", await adverts.table_exists("adverts"))
+        duplicate = False
+        try:
+            await connector.execute_transaction([("CREATE INDEX idx_adverts_session_time ON adverts (session_id)", None)])
+        except MySQLStubError as err:
+            duplicate = err.args[0] == 1061
+        check("повторний CREATE INDEX відхиляється (1061)", duplicate)
+        # Старт після збою між DDL і записом у schema_migrations: індекси вже є, версій немає
+        await connector.execute_query("DELETE FROM schema_migrations WHERE component = ? AND version >= ?", ("adverts", 2))
+        await adverts.table_check()
+        version = await connector.fetch_one("SELECT MAX(version) AS version FROM schema_migrations WHERE component = ?", ("adverts",))
+        check("перервані міграції індексів позначаються застосованими", version["version"] == 4)
+
+        session_id = 1_700_000_000_000
+        now = format_db_datetime(datetime.now())
+        for number in range(3):
+            await adverts.add_advert_buffered(
+                sid=f"sid-{number}", title=f"Maurer {number}", job_title="Maurer (m/w/d)", location="Berlin",
+                posted_date="2024-05-01", employer_company_name="Müller Bau GmbH", email="info@mueller-bau.de",
+                link=f"https://example.org/{number}", time_getting=now, session_id=session_id,
+                description="Wir suchen einen Maurer für 100% Einsatz",
+            )
+        await adverts.flush_adverts()
+        await adverts.add_advert_buffered(
+            sid="sid-0", title="Maurer 0 (aktualisiert)", job_title="Maurer (m/w/d)", link="https://example.org/0",
+            time_getting=now, session_id=session_id,
+        )
+        await adverts.flush_adverts()
+        rows = await adverts.get_all_adverts(session_id=session_id)
+        check("пакетний upsert і фільтр session_id", len(rows) == 3)
+        check("повторний sid оновлює рядок", any(row["title"] == "Maurer 0 (aktualisiert)" for row in rows))
+        check("time_getting повертається як datetime", isinstance(rows[0]["time_getting"], datetime))
+        check("фільтр max_old", len(await adverts.get_all_adverts(max_old=1)) == 3)
+        check("get_recent_links", len(await adverts.get_recent_links(1)) == 3)
+        streamed = [row async for row in adverts.stream_adverts(session_id=session_id, batch_size=2)]
+        check("stream_adverts", len(streamed) == 3)
+        # sid-0 перезаписано без роботодавця, тому "müller" знаходить лише два оголошення
+        found = await adverts.search_adverts("müller mau")
+        check("FULLTEXT-пошук з префіксом", sorted(row["sid"] for row in found) == ["sid-1", "sid-2"])
+        check("FULLTEXT-пошук без збігів", await adverts.search_adverts("Bäckerei") == [])
+
+        rejected = False
+        await adverts.add_advert_buffered(
+            sid="sid-bad", title="x", job_title="x", link="x", time_getting=now, session_id=datetime.now(),
+        )
+        try:
+            await adverts.flush_adverts()
+        except MySQLStubError as err:
+            rejected = err.args[0] == 1366
+        adverts._pending_adverts.clear()
+        check("strict mode відхиляє datetime у session_id", rejected)
+
+        emails = EmailDatabase(connector)
+        await emails.init_table()
+        await emails.record_sent_emails([("a@example.org", "A", "Maurer"), ("b@example.org", "B", "Maler")])
+        await emails.record_sent_emails([("a@example.org", "A2", "Maurer")])
+        last_sent = await emails.bulk_last_sent(["a@example.org", "b@example.org", "c@example.org"])
+        check("sent_emails upsert і bulk_last_sent", sorted(last_sent) == ["a@example.org", "b@example.org"])
+        check("cooldown ще не минув", not await emails.can_send_email("a@example.org"))
+
+        cache = ResearchCache(connector)
+        await cache.init_table()
+        await connector.execute_query("DELETE FROM schema_migrations WHERE component = ? AND version = ?", (cache.table_name, 2))
+        await cache.init_table()
+        await cache.purge_expired()
+        check("міграції кешу досліджень", await adverts.table_exists(cache.table_name))
+    except Exception as err:
+        failures.append(repr(err))
+        print(f"FAIL {err!r}")
+    finally:
+        await connector.disconnect()
+        pool.close()
+        await pool.wait_closed()
+    return not failures
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(run_smoke_check()) else 1)